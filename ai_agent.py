@@ -2,148 +2,592 @@
 AI Agent for understanding UI elements and extracting structured data
 Uses OpenAI GPT-4 for intelligent HTML analysis and data extraction
 """
+import asyncio
 import json
 import os
 import re
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
-from config import OPENAI_CONFIG
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIConnectionError
+from config import OPENAI_CONFIG, SETTINGS
+from html_preprocessor import HTMLPreprocessor
+from table_extractor import TableExtractor
+from llm_cache import LLMResponseCache
+from rate_limiter import OpenAIRateGovernor, PRIORITY_BULK, PRIORITY_INTERACTIVE
 import logging
 
+_shared_governor: Optional[OpenAIRateGovernor] = None
+_shared_governor_lock = threading.Lock()
+
+
+def shared_governor() -> OpenAIRateGovernor:
+    """The process-wide rate governor used by every AIAgent that isn't given its own"""
+    global _shared_governor
+    with _shared_governor_lock:
+        if _shared_governor is None:
+            _shared_governor = OpenAIRateGovernor(
+                requests_per_minute=OPENAI_CONFIG["requests_per_minute"],
+                tokens_per_minute=OPENAI_CONFIG["tokens_per_minute"],
+                chars_per_token=OPENAI_CONFIG["chars_per_token"],
+                max_retries=OPENAI_CONFIG["max_retries"],
+                backoff_seconds=OPENAI_CONFIG["retry_backoff"],
+                max_backoff_seconds=OPENAI_CONFIG["retry_max_backoff"],
+                retry_exceptions=(APIConnectionError,)
+            )
+        return _shared_governor
+
+
 class AIAgent:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key="")
+    def __init__(self, api_key: str, governor: Optional[OpenAIRateGovernor] = None):
+        self.client = self._create_client(api_key)
+        # Admission control and retries for every OpenAI request
+        self.governor = governor or shared_governor()
         self.logger = logging.getLogger(__name__)
+        self.preprocessor = HTMLPreprocessor()
+        self.table_extractor = TableExtractor()
+        # Which path (table fast path, llm, llm_chunked) the last extraction took
+        self.last_extraction: Dict[str, Any] = {}
+        self.extractions_by_saas: Dict[str, Dict[str, Any]] = {}
+        # Every extraction per SaaS since the last summarize_extractions() call
+        self.extraction_log: Dict[str, List[Dict[str, Any]]] = {}
+        # LLM extraction requests (pages or chunks) that failed, per SaaS, since the same call
+        self.extraction_failures: Dict[str, int] = {}
+        self._failures_lock = threading.Lock()
+        self.cache = self._create_cache()
+
+    def _create_client(self, api_key: str):
+        # Retries are left to the governor so they respect the shared limits
+        return OpenAI(api_key="", max_retries=0)
+
+    def _create_cache(self) -> Optional[LLMResponseCache]:
+        """Open the persistent LLM response cache, or run uncached if it is disabled/unavailable"""
+        if not OPENAI_CONFIG["response_cache"]:
+            return None
+        try:
+            return LLMResponseCache(
+                os.path.join(SETTINGS["data_output_dir"], "llm_cache.sqlite3"),
+                ttl_seconds=OPENAI_CONFIG["response_cache_ttl"],
+                max_entries=OPENAI_CONFIG["response_cache_max_entries"]
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to open LLM response cache, continuing without it: {str(e)}")
+            return None
+
+    def _cache_key(self, method: str, temperature: float, html_content: str, prompt: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return LLMResponseCache.make_key(method, OPENAI_CONFIG["model"], temperature, html_content, prompt)
+
+    def _cache_get(self, key: Optional[str]) -> Optional[Any]:
+        if key is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            self.logger.warning(f"LLM cache read failed: {str(e)}")
+            return None
+
+    def _cache_set(self, key: Optional[str], value: Any, method: str):
+        if key is None:
+            return
+        try:
+            self.cache.set(key, value, method)
+        except Exception as e:
+            self.logger.warning(f"LLM cache write failed: {str(e)}")
+
+    def _cache_delete(self, key: Optional[str]):
+        if key is None:
+            return
+        try:
+            self.cache.delete(key)
+        except Exception as e:
+            self.logger.warning(f"LLM cache delete failed: {str(e)}")
 
-    def extract_users_from_html(self, html_content: str, saas_name: str) -> List[Dict[str, Any]]:
+    def _ui_elements_cache_key(self, pruned_html: str, task_description: str) -> Optional[str]:
+        """
+        find_ui_elements answers are keyed on the page's structure rather than its full HTML,
+        so a member list that changed between visits still hits the cache
+        """
+        if self.cache is None:
+            return None
+        return self._cache_key(
+            "find_ui_elements", 0.1, self.preprocessor.structure_signature(pruned_html), task_description
+        )
+
+    def forget_ui_elements(self, html_content: str, task_description: str, root_selector: Optional[str] = None):
+        """Invalidate the cached find_ui_elements answer for this page and task (e.g. its selectors failed)"""
+        html_content = self.prepare_html(html_content, root_selector)[:10000]
+        self._cache_delete(self._ui_elements_cache_key(html_content, task_description))
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the LLM response cache"""
+        return self.cache.get_stats() if self.cache else {}
+
+    def prepare_html(self, html_content: str, root_selector: Optional[str] = None) -> str:
+        """
+        Run the shared pruning pipeline on HTML before it is put into a prompt
+        """
+        if not OPENAI_CONFIG["prune_html"]:
+            return html_content
+        return self.preprocessor.process(html_content, root_selector)
+
+    def extract_users_from_html(
+        self, html_content: str, saas_name: str, root_selector: Optional[str] = None,
+        prepruned: bool = False
+    ) -> List[Dict[str, Any]]:
         """
         Extract user data from HTML using AI
+
+        Plain header-plus-rows tables are parsed locally first; the LLM is only
+        called when the table extractor's confidence is below the threshold.
+        Pages larger than a single chunk are split into row-aligned chunks
+        that are extracted concurrently and merged by email.
+        Pass prepruned=True when the HTML already went through prepare_html.
+        """
+        started = time.perf_counter()
+        if not prepruned:
+            html_content = self.prepare_html(html_content, root_selector)
+
+        users, confidence = self._table_fast_path(html_content, saas_name, started)
+        if users:
+            return users
+
+        if self._needs_chunking(html_content):
+            users = self.extract_users_chunked(html_content, saas_name)
+            self._record_extraction("llm_chunked", saas_name, users, confidence, started)
+        else:
+            # Without chunking the page has to fit one request
+            users = self._extract_users_from_chunk(
+                html_content[:OPENAI_CONFIG["extraction_chunk_size"]], saas_name
+            )
+            self._record_extraction("llm", saas_name, users, confidence, started)
+        return users
+
+    def _table_fast_path(
+        self, html_content: str, saas_name: str, started: float
+    ) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+        """Try the LLM-free table extractor; returns no users if its confidence is too low"""
+        if not OPENAI_CONFIG["table_fast_path"]:
+            return [], None
+        users, confidence = self.table_extractor.extract(html_content)
+        if users and confidence >= OPENAI_CONFIG["table_fast_path_min_confidence"]:
+            self._record_extraction("table", saas_name, users, confidence, started)
+            return users, confidence
+        return [], confidence
+
+    @staticmethod
+    def _needs_chunking(html_content: str) -> bool:
+        return OPENAI_CONFIG["chunked_extraction"] and len(html_content) > OPENAI_CONFIG["extraction_chunk_size"]
+
+    def _record_extraction(
+        self, path: str, saas_name: str, users: List[Dict[str, Any]],
+        table_confidence: Optional[float], started: float
+    ):
+        """Remember how the last extraction was performed"""
+        self.last_extraction = {
+            "path": path,
+            "saas_name": saas_name,
+            "users": len(users),
+            "table_confidence": table_confidence,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        # Concurrent scrapes overwrite last_extraction, so also keep it per SaaS
+        self.extractions_by_saas[saas_name] = self.last_extraction
+        self.extraction_log.setdefault(saas_name, []).append(self.last_extraction)
+        self.logger.info(
+            f"Extraction for {saas_name} took path '{path}' "
+            f"({len(users)} users, {self.last_extraction['duration_ms']} ms)"
+        )
+
+    def _record_extraction_failure(self, saas_name: str):
+        """Count a failed extraction request so callers can tell a failure from an empty page"""
+        with self._failures_lock:
+            self.extraction_failures[saas_name] = self.extraction_failures.get(saas_name, 0) + 1
+
+    def reset_extractions(self, saas_name: str):
+        """Forget logged extractions and failures of a SaaS (at the start of a scrape)"""
+        self.extraction_log.pop(saas_name, None)
+        with self._failures_lock:
+            self.extraction_failures.pop(saas_name, None)
+
+    def summarize_extractions(self, saas_name: str) -> Dict[str, Any]:
+        """
+        Aggregate (and clear) the extractions logged for a SaaS, e.g. one per harvested page:
+        "path" is the single path taken or "mixed", "paths" counts pages per path,
+        "failed_requests" counts failed LLM requests (pages or chunks) and "empty_pages"
+        pages that yielded no users
+        """
+        log = self.extraction_log.pop(saas_name, [])
+        with self._failures_lock:
+            failed_requests = self.extraction_failures.pop(saas_name, 0)
+        if not log:
+            return {"failed_requests": failed_requests} if failed_requests else {}
+        paths: Dict[str, int] = {}
+        for extraction in log:
+            paths[extraction["path"]] = paths.get(extraction["path"], 0) + 1
+        confidences = [e["table_confidence"] for e in log if e["table_confidence"] is not None]
+        return {
+            "path": next(iter(paths)) if len(paths) == 1 else "mixed",
+            "paths": paths,
+            "saas_name": saas_name,
+            "pages": len(log),
+            "users": sum(extraction["users"] for extraction in log),
+            "min_table_confidence": min(confidences) if confidences else None,
+            "failed_requests": failed_requests,
+            "empty_pages": sum(1 for extraction in log if not extraction["users"]),
+            "duration_ms": round(sum(extraction["duration_ms"] for extraction in log), 1)
+        }
+
+    def extract_users_chunked(
+        self, html_content: str, saas_name: str,
+        chunk_size: Optional[int] = None, max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Map-reduce extraction: split the user table into row-aligned chunks,
+        extract each chunk in parallel and merge the results by email
         """
         try:
-            # Create a function schema for structured output
-            function_schema = {
-                "name": "extract_user_data",
-                "description": "Extract user information from SaaS admin portal HTML",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "users": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "name": {"type": "string", "description": "User's full name"},
-                                    "email": {"type": "string", "description": "User's email address"},
-                                    "role": {"type": "string", "description": "User's role or permission level"},
-                                    "last_login": {"type": "string", "description": "Last login date/time"},
-                                    "status": {"type": "string", "description": "Account status (active/inactive/pending)"}
-                                },
-                                "required": ["email"]
-                            }
-                        }
-                    },
-                    "required": ["users"]
-                }
-            }
+            chunk_size = chunk_size or OPENAI_CONFIG["extraction_chunk_size"]
+            max_concurrency = max_concurrency or OPENAI_CONFIG["extraction_max_concurrency"]
 
-            # Prepare the prompt
-            prompt = f"""
-            Analyze the following HTML content from a {saas_name} admin portal and extract user information.
-            Look for tables, lists, or other structures containing user data.
-
-            HTML Content (truncated if too long):
-            {html_content[:15000]}  # Limit to avoid token limits
-
-            Extract all users you can find with their details. If some information is not available, 
-            set it to null or "Unknown". Focus on finding:
-            - User names
-            - Email addresses  
-            - Roles/permissions
-            - Last login dates
-            - Account status
-            """
-
-            response = self.client.chat.completions.create(
-                model=OPENAI_CONFIG["model"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at analyzing HTML and extracting structured user data from SaaS admin portals."},
-                    {"role": "user", "content": prompt}
-                ],
-                functions=[function_schema],
-                function_call={"name": "extract_user_data"},
-                temperature=OPENAI_CONFIG["temperature"],
-                max_tokens=OPENAI_CONFIG["max_tokens"]
+            chunks = self.split_html_into_chunks(html_content, chunk_size)
+            self.logger.info(
+                f"Extracting users from {saas_name} in {len(chunks)} chunks "
+                f"(concurrency {max_concurrency})"
             )
 
-            # Parse the function call result
-            function_call = response.choices[0].message.function_call
-            if function_call and function_call.name == "extract_user_data":
-                result = json.loads(function_call.arguments)
-                users = result.get("users", [])
-                self.logger.info(f"Extracted {len(users)} users from {saas_name}")
-                return users
-            else:
-                self.logger.error("AI failed to extract user data")
-                return []
+            with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+                results = list(executor.map(
+                    lambda chunk: self._extract_users_from_chunk(chunk, saas_name), chunks
+                ))
+
+            users = self.merge_user_lists(results)
+            self.logger.info(f"Merged {len(users)} unique users from {len(chunks)} chunks of {saas_name}")
+            return users
 
         except Exception as e:
-            self.logger.error(f"Error in AI user extraction: {str(e)}")
+            self.logger.error(f"Error in chunked user extraction: {str(e)}")
+            self._record_extraction_failure(saas_name)
             return []
 
-    def find_ui_elements(self, html_content: str, task_description: str) -> Dict[str, str]:
+    @staticmethod
+    def split_html_into_chunks(html_content: str, chunk_size: int) -> List[str]:
         """
-        Use AI to find UI elements for specific tasks (like finding add user button)
+        Split HTML into chunks of at most chunk_size characters (including the <table> wrapper)
+        without cutting table rows. The table header is repeated at the top of every chunk so
+        column meaning is preserved. A single row (plus header) larger than chunk_size becomes
+        its own oversized chunk rather than being cut.
         """
-        try:
-            function_schema = {
-                "name": "find_ui_elements",
-                "description": "Find UI elements for specified task",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "elements": {
+        rows = list(re.finditer(r"<tr\b.*?</tr\s*>", html_content, re.IGNORECASE | re.DOTALL))
+        if not rows:
+            # No table rows to align on, fall back to splitting on tag boundaries
+            chunks = []
+            start = 0
+            while start < len(html_content):
+                end = min(start + chunk_size, len(html_content))
+                if end < len(html_content):
+                    boundary = html_content.rfind(">", start, end)
+                    if boundary > start:
+                        end = boundary + 1
+                chunks.append(html_content[start:end])
+                start = end
+            return chunks
+
+        header = ""
+        body_rows = [row.group(0) for row in rows]
+        if re.search(r"<th\b", body_rows[0], re.IGNORECASE):
+            header = body_rows.pop(0)
+
+        chunks = []
+        current: List[str] = []
+        base_size = len("<table>") + len(header) + len("</table>")
+        current_size = base_size
+        for row in body_rows:
+            if current and current_size + len(row) > chunk_size:
+                chunks.append("<table>" + header + "".join(current) + "</table>")
+                current = []
+                current_size = base_size
+            current.append(row)
+            current_size += len(row)
+        if current or not chunks:
+            chunks.append("<table>" + header + "".join(current) + "</table>")
+
+        oversized = sum(1 for chunk in chunks if len(chunk) > chunk_size)
+        if oversized:
+            logging.getLogger(__name__).warning(
+                f"{oversized} chunk(s) exceed {chunk_size} characters because of a large header or row"
+            )
+        return chunks
+
+    @staticmethod
+    def merge_user_lists(user_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Merge per-chunk extraction results, deduplicating by (case-insensitive) email.
+        Missing fields on the first occurrence are filled from later duplicates.
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        for users in user_lists:
+            for user in users:
+                email = (user.get("email") or "").strip().lower()
+                if not email:
+                    continue
+                if email not in merged:
+                    merged[email] = dict(user)
+                    continue
+                existing = merged[email]
+                for key, value in user.items():
+                    if existing.get(key) in (None, "", "Unknown", "null") and value not in (None, ""):
+                        existing[key] = value
+        return list(merged.values())
+
+    # Request builders and response parsers are shared by the sync and async agents
+
+    @staticmethod
+    def _extract_users_request(html_content: str, saas_name: str) -> Dict[str, Any]:
+        # Create a function schema for structured output
+        function_schema = {
+            "name": "extract_user_data",
+            "description": "Extract user information from SaaS admin portal HTML",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "users": {
+                        "type": "array",
+                        "items": {
                             "type": "object",
                             "properties": {
-                                "primary_selector": {"type": "string", "description": "Main CSS selector for the element"},
-                                "alternative_selectors": {
-                                    "type": "array",
-                                    "items": {"type": "string"},
-                                    "description": "Alternative selectors if primary fails"
-                                },
-                                "element_type": {"type": "string", "description": "Type of element (button, link, input, etc.)"},
-                                "confidence": {"type": "number", "description": "Confidence level 0-1"}
-                            }
+                                "name": {"type": "string", "description": "User's full name"},
+                                "email": {"type": "string", "description": "User's email address"},
+                                "role": {"type": "string", "description": "User's role or permission level"},
+                                "last_login": {"type": "string", "description": "Last login date/time"},
+                                "status": {"type": "string", "description": "Account status (active/inactive/pending)"}
+                            },
+                            "required": ["email"]
+                        }
+                    }
+                },
+                "required": ["users"]
+            }
+        }
+
+        # Prepare the prompt
+        prompt = f"""
+        Analyze the following HTML content from a {saas_name} admin portal and extract user information.
+        Look for tables, lists, or other structures containing user data.
+
+        HTML Content (truncated if too long):
+        {html_content}  # Limit to avoid token limits
+
+        Extract all users you can find with their details. If some information is not available, 
+        set it to null or "Unknown". Focus on finding:
+        - User names
+        - Email addresses  
+        - Roles/permissions
+        - Last login dates
+        - Account status
+        """
+
+        return dict(
+            model=OPENAI_CONFIG["model"],
+            messages=[
+                {"role": "system", "content": "You are an expert at analyzing HTML and extracting structured user data from SaaS admin portals."},
+                {"role": "user", "content": prompt}
+            ],
+            functions=[function_schema],
+            function_call={"name": "extract_user_data"},
+            temperature=OPENAI_CONFIG["temperature"],
+            max_tokens=OPENAI_CONFIG["max_tokens"]
+        )
+
+    def _parse_extract_users_response(self, response, saas_name: str, cache_key: Optional[str]) -> List[Dict[str, Any]]:
+        # Parse the function call result
+        function_call = response.choices[0].message.function_call
+        if function_call and function_call.name == "extract_user_data":
+            result = json.loads(function_call.arguments)
+            users = result.get("users", [])
+            self.logger.info(f"Extracted {len(users)} users from {saas_name}")
+            if users:
+                self._cache_set(cache_key, users, "extract_users")
+            return users
+        else:
+            self.logger.error("AI failed to extract user data")
+            self._record_extraction_failure(saas_name)
+            return []
+
+    @staticmethod
+    def _find_ui_elements_request(html_content: str, task_description: str) -> Dict[str, Any]:
+        function_schema = {
+            "name": "find_ui_elements",
+            "description": "Find UI elements for specified task",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "elements": {
+                        "type": "object",
+                        "properties": {
+                            "primary_selector": {"type": "string", "description": "Main CSS selector for the element"},
+                            "alternative_selectors": {
+                                "type": "array",
+                                "items": {"type": "string"},
+                                "description": "Alternative selectors if primary fails"
+                            },
+                            "element_type": {"type": "string", "description": "Type of element (button, link, input, etc.)"},
+                            "confidence": {"type": "number", "description": "Confidence level 0-1"}
                         }
                     }
                 }
             }
+        }
 
-            prompt = f"""
-            Analyze this HTML and find the UI element for: {task_description}
+        prompt = f"""
+        Analyze this HTML and find the UI element for: {task_description}
 
-            HTML Content:
-            {html_content[:10000]}
+        HTML Content:
+        {html_content}
 
-            Provide the best CSS selector to interact with this element.
-            """
+        Provide the best CSS selector to interact with this element.
+        """
 
-            response = self.client.chat.completions.create(
-                model=OPENAI_CONFIG["model"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at analyzing HTML and finding UI elements with CSS selectors."},
-                    {"role": "user", "content": prompt}
-                ],
-                functions=[function_schema],
-                function_call={"name": "find_ui_elements"},
-                temperature=0.1
+        return dict(
+            model=OPENAI_CONFIG["model"],
+            messages=[
+                {"role": "system", "content": "You are an expert at analyzing HTML and finding UI elements with CSS selectors."},
+                {"role": "user", "content": prompt}
+            ],
+            functions=[function_schema],
+            function_call={"name": "find_ui_elements"},
+            temperature=0.1
+        )
+
+    def _parse_find_ui_elements_response(self, response, cache_key: Optional[str]) -> Dict[str, str]:
+        function_call = response.choices[0].message.function_call
+        if function_call:
+            result = json.loads(function_call.arguments)
+            elements = result.get("elements", {})
+            if elements:
+                self._cache_set(cache_key, elements, "find_ui_elements")
+            return elements
+
+        return {}
+
+    @staticmethod
+    def _analyze_ui_changes_request(old_html: str, new_html: str) -> Dict[str, Any]:
+        prompt = f"""
+        Compare these two HTML snippets and identify significant changes in UI structure:
+
+        OLD HTML:
+        {old_html}
+
+        NEW HTML:
+        {new_html}
+
+        Identify:
+        1. Structural changes
+        2. New elements
+        3. Removed elements
+        4. Changed selectors/IDs/classes
+        """
+
+        return dict(
+            model=OPENAI_CONFIG["model"],
+            messages=[
+                {"role": "system", "content": "You are an expert at analyzing HTML changes and UI modifications."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=1000
+        )
+
+    def _parse_analyze_ui_changes_response(self, response, cache_key: Optional[str]) -> Dict[str, Any]:
+        changes_analysis = response.choices[0].message.content
+
+        analysis = {
+            "has_changes": "changes detected" in changes_analysis.lower(),
+            "analysis": changes_analysis,
+            "confidence": 0.8  # Basic confidence scoring
+        }
+        self._cache_set(cache_key, analysis, "analyze_ui_changes")
+        return analysis
+
+    @staticmethod
+    def _validate_action_request(before_html: str, after_html: str, action_type: str) -> Dict[str, Any]:
+        prompt = f"""
+        Determine if the following action was successful by comparing before and after HTML:
+
+        Action Type: {action_type}
+
+        BEFORE:
+        {before_html}
+
+        AFTER:
+        {after_html}
+
+        Was the action successful? Respond with only "SUCCESS" or "FAILED".
+        """
+
+        return dict(
+            model=OPENAI_CONFIG["model"],
+            messages=[
+                {"role": "system", "content": "You are an expert at validating UI changes and action results."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=100
+        )
+
+    def _parse_validate_action_response(self, response, cache_key: Optional[str]) -> bool:
+        result = response.choices[0].message.content.strip().upper()
+        success = "SUCCESS" in result
+        # A failed validation may just mean the page hadn't updated yet, so only success is cached
+        if success:
+            self._cache_set(cache_key, success, "validate_action_success")
+        return success
+
+    def _extract_users_from_chunk(self, html_content: str, saas_name: str) -> List[Dict[str, Any]]:
+        """
+        Run a single LLM extraction over one piece of HTML
+        """
+        try:
+            cache_key = self._cache_key("extract_users", OPENAI_CONFIG["temperature"], html_content, saas_name)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Using cached extraction of {len(cached)} users from {saas_name}")
+                return cached
+
+            response = self.governor.call(
+                self.client.chat.completions.create,
+                self._extract_users_request(html_content, saas_name),
+                PRIORITY_BULK
             )
+            return self._parse_extract_users_response(response, saas_name, cache_key)
 
-            function_call = response.choices[0].message.function_call
-            if function_call:
-                result = json.loads(function_call.arguments)
-                return result.get("elements", {})
+        except Exception as e:
+            self.logger.error(f"Error in AI user extraction: {str(e)}")
+            self._record_extraction_failure(saas_name)
+            return []
 
-            return {}
+    def find_ui_elements(
+        self, html_content: str, task_description: str, root_selector: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Use AI to find UI elements for specific tasks (like finding add user button)
+        """
+        try:
+            html_content = self.prepare_html(html_content, root_selector)[:10000]
+            cache_key = self._ui_elements_cache_key(html_content, task_description)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = self.governor.call(
+                self.client.chat.completions.create,
+                self._find_ui_elements_request(html_content, task_description),
+                PRIORITY_INTERACTIVE
+            )
+            return self._parse_find_ui_elements_response(response, cache_key)
 
         except Exception as e:
             self.logger.error(f"Error finding UI elements: {str(e)}")
@@ -179,39 +623,19 @@ class AIAgent:
         Analyze changes in UI to adapt selectors
         """
         try:
-            prompt = f"""
-            Compare these two HTML snippets and identify significant changes in UI structure:
-
-            OLD HTML:
-            {old_html[:5000]}
-
-            NEW HTML:
-            {new_html[:5000]}
-
-            Identify:
-            1. Structural changes
-            2. New elements
-            3. Removed elements
-            4. Changed selectors/IDs/classes
-            """
-
-            response = self.client.chat.completions.create(
-                model=OPENAI_CONFIG["model"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at analyzing HTML changes and UI modifications."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1000
+            old_html = self.prepare_html(old_html)[:5000]
+            new_html = self.prepare_html(new_html)[:5000]
+            cache_key = self._cache_key("analyze_ui_changes", 0.1, old_html + "\n" + new_html, "")
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = self.governor.call(
+                self.client.chat.completions.create,
+                self._analyze_ui_changes_request(old_html, new_html),
+                PRIORITY_INTERACTIVE
             )
-
-            changes_analysis = response.choices[0].message.content
-
-            return {
-                "has_changes": "changes detected" in changes_analysis.lower(),
-                "analysis": changes_analysis,
-                "confidence": 0.8  # Basic confidence scoring
-            }
+            return self._parse_analyze_ui_changes_response(response, cache_key)
 
         except Exception as e:
             self.logger.error(f"Error analyzing UI changes: {str(e)}")
@@ -222,32 +646,205 @@ class AIAgent:
         Validate if an action (like adding/removing user) was successful
         """
         try:
-            prompt = f"""
-            Determine if the following action was successful by comparing before and after HTML:
+            before_html = self.prepare_html(before_html)[:5000]
+            after_html = self.prepare_html(after_html)[:5000]
+            cache_key = self._cache_key("validate_action_success", 0.1, before_html + "\n" + after_html, action_type)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = self.governor.call(
+                self.client.chat.completions.create,
+                self._validate_action_request(before_html, after_html, action_type),
+                PRIORITY_INTERACTIVE
+            )
+            return self._parse_validate_action_response(response, cache_key)
+
+        except Exception as e:
+            self.logger.error(f"Error validating action: {str(e)}")
+            return False
+
+
+class AsyncAIAgent(AIAgent):
+    """
+    Async variant of AIAgent backed by AsyncOpenAI, so LLM calls don't block the event loop.
+    All requests share one pooled HTTP client; call aclose() when done.
+    """
+
+    def __init__(
+        self, api_key: str, http_client: Optional[httpx.AsyncClient] = None,
+        governor: Optional[OpenAIRateGovernor] = None
+    ):
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_CONFIG["max_connections"],
+                max_keepalive_connections=OPENAI_CONFIG["max_connections"]
+            ),
+            timeout=httpx.Timeout(OPENAI_CONFIG["request_timeout"])
+        )
+        super().__init__(api_key, governor)
+
+    def _create_client(self, api_key: str):
+        return AsyncOpenAI(api_key=api_key, http_client=self.http_client, max_retries=0)
+
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        if self._owns_http_client:
+            await self.http_client.aclose()
+
+    async def extract_users_from_html(
+        self, html_content: str, saas_name: str, root_selector: Optional[str] = None,
+        prepruned: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract user data from HTML using AI (see AIAgent.extract_users_from_html). Pruning
+        and the table parser are CPU-bound, so they run in a worker thread.
+        """
+        started = time.perf_counter()
+        if not prepruned:
+            html_content = await asyncio.to_thread(self.prepare_html, html_content, root_selector)
+
+        users, confidence = await asyncio.to_thread(self._table_fast_path, html_content, saas_name, started)
+        if users:
+            return users
+
+        if self._needs_chunking(html_content):
+            users = await self.extract_users_chunked(html_content, saas_name)
+            self._record_extraction("llm_chunked", saas_name, users, confidence, started)
+        else:
+            # Without chunking the page has to fit one request
+            users = await self._extract_users_from_chunk(
+                html_content[:OPENAI_CONFIG["extraction_chunk_size"]], saas_name
+            )
+            self._record_extraction("llm", saas_name, users, confidence, started)
+        return users
+
+    async def extract_users_chunked(
+        self, html_content: str, saas_name: str,
+        chunk_size: Optional[int] = None, max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Map-reduce extraction with chunks extracted concurrently on the event loop
+        """
+        try:
+            chunk_size = chunk_size or OPENAI_CONFIG["extraction_chunk_size"]
+            max_concurrency = max_concurrency or OPENAI_CONFIG["extraction_max_concurrency"]
+
+            chunks = await asyncio.to_thread(self.split_html_into_chunks, html_content, chunk_size)
+            self.logger.info(
+                f"Extracting users from {saas_name} in {len(chunks)} chunks "
+                f"(concurrency {max_concurrency})"
+            )
+
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+            async def extract_chunk(chunk: str) -> List[Dict[str, Any]]:
+                async with semaphore:
+                    return await self._extract_users_from_chunk(chunk, saas_name)
+
+            results = await asyncio.gather(*(extract_chunk(chunk) for chunk in chunks))
+
+            users = self.merge_user_lists(results)
+            self.logger.info(f"Merged {len(users)} unique users from {len(chunks)} chunks of {saas_name}")
+            return users
+
+        except Exception as e:
+            self.logger.error(f"Error in chunked user extraction: {str(e)}")
+            self._record_extraction_failure(saas_name)
+            return []
+
+    async def _extract_users_from_chunk(self, html_content: str, saas_name: str) -> List[Dict[str, Any]]:
+        try:
+            cache_key = self._cache_key("extract_users", OPENAI_CONFIG["temperature"], html_content, saas_name)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Using cached extraction of {len(cached)} users from {saas_name}")
+                return cached
+
+            response = await self.governor.call_async(
+                self.client.chat.completions.create,
+                self._extract_users_request(html_content, saas_name),
+                PRIORITY_BULK
+            )
+            return self._parse_extract_users_response(response, saas_name, cache_key)
 
-            Action Type: {action_type}
+        except Exception as e:
+            self.logger.error(f"Error in AI user extraction: {str(e)}")
+            self._record_extraction_failure(saas_name)
+            return []
 
-            BEFORE:
-            {before_html[:5000]}
+    async def find_ui_elements(
+        self, html_content: str, task_description: str, root_selector: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Use AI to find UI elements for specific tasks (like finding add user button)
+        """
+        try:
+            html_content = (await asyncio.to_thread(self.prepare_html, html_content, root_selector))[:10000]
+            cache_key = await asyncio.to_thread(self._ui_elements_cache_key, html_content, task_description)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await self.governor.call_async(
+                self.client.chat.completions.create,
+                self._find_ui_elements_request(html_content, task_description),
+                PRIORITY_INTERACTIVE
+            )
+            return self._parse_find_ui_elements_response(response, cache_key)
 
-            AFTER:
-            {after_html[:5000]}
+        except Exception as e:
+            self.logger.error(f"Error finding UI elements: {str(e)}")
+            return {}
 
-            Was the action successful? Respond with only "SUCCESS" or "FAILED".
-            """
+    async def generate_user_form_data(self, user_details: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Generate form data for user provisioning
+        """
+        return super().generate_user_form_data(user_details)
 
-            response = self.client.chat.completions.create(
-                model=OPENAI_CONFIG["model"],
-                messages=[
-                    {"role": "system", "content": "You are an expert at validating UI changes and action results."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=100
+    async def analyze_ui_changes(self, old_html: str, new_html: str) -> Dict[str, Any]:
+        """
+        Analyze changes in UI to adapt selectors
+        """
+        try:
+            old_html = (await asyncio.to_thread(self.prepare_html, old_html))[:5000]
+            new_html = (await asyncio.to_thread(self.prepare_html, new_html))[:5000]
+            cache_key = self._cache_key("analyze_ui_changes", 0.1, old_html + "\n" + new_html, "")
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await self.governor.call_async(
+                self.client.chat.completions.create,
+                self._analyze_ui_changes_request(old_html, new_html),
+                PRIORITY_INTERACTIVE
             )
+            return self._parse_analyze_ui_changes_response(response, cache_key)
+
+        except Exception as e:
+            self.logger.error(f"Error analyzing UI changes: {str(e)}")
+            return {"has_changes": False, "analysis": "", "confidence": 0.0}
 
-            result = response.choices[0].message.content.strip().upper()
-            return "SUCCESS" in result
+    async def validate_action_success(self, before_html: str, after_html: str, action_type: str) -> bool:
+        """
+        Validate if an action (like adding/removing user) was successful
+        """
+        try:
+            before_html = (await asyncio.to_thread(self.prepare_html, before_html))[:5000]
+            after_html = (await asyncio.to_thread(self.prepare_html, after_html))[:5000]
+            cache_key = self._cache_key("validate_action_success", 0.1, before_html + "\n" + after_html, action_type)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            response = await self.governor.call_async(
+                self.client.chat.completions.create,
+                self._validate_action_request(before_html, after_html, action_type),
+                PRIORITY_INTERACTIVE
+            )
+            return self._parse_validate_action_response(response, cache_key)
 
         except Exception as e:
             self.logger.error(f"Error validating action: {str(e)}")
@@ -0,0 +1,112 @@
+"""
+API Response Mapper for admin portal JSON endpoints
+Turns the member-list payloads that a portal fetches for itself into user dicts
+using a per-SaaS mapping spec, so neither the rendered HTML nor the LLM is needed
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+USER_FIELDS = ("email", "name", "role", "status", "last_login")
+
+# Numeric values above this are treated as epoch timestamps (milliseconds above the second bound)
+EPOCH_SECONDS_MIN = 1_000_000_000
+EPOCH_MILLIS_MIN = 1_000_000_000_000
+
+
+def resolve_path(payload: Any, path: str) -> Any:
+    """
+    Look up a dotted path such as ``"data.members"`` or ``"profile.emails.0"`` in a JSON payload.
+    An empty path returns the payload itself; missing keys return None.
+    """
+    if not path:
+        return payload
+    current = payload
+    for part in path.split("."):
+        if isinstance(current, dict):
+            current = current.get(part)
+        elif isinstance(current, list) and part.lstrip("-").isdigit():
+            index = int(part)
+            current = current[index] if -len(current) <= index < len(current) else None
+        else:
+            return None
+        if current is None:
+            return None
+    return current
+
+
+class APIResponseMapper:
+    """
+    Maps captured JSON payloads to user dicts. A mapping spec looks like::
+
+        {
+            "records": "members",                    # dotted path to the list of users
+            "fields": {                              # UserRecord field -> path(s) within a record
+                "email": "profile.email",
+                "name": ["profile.display_name", "profile.given_name"],
+                "role": "role.label",
+                "status": "status",
+                "last_login": "last_active_ts"
+            },
+            "value_maps": {"status": {"1": "Active", "2": "Invited"}}
+        }
+
+    When a field lists several paths, the first non-empty value wins.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def map_payloads(self, payloads: List[Any], mapping: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Map every captured payload and return all users found (not yet deduplicated)"""
+        users = []
+        for payload in payloads:
+            users.extend(self.map_payload(payload, mapping))
+        self.logger.info(f"Mapped {len(users)} users from {len(payloads)} API payload(s)")
+        return users
+
+    def map_payload(self, payload: Any, mapping: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Map one JSON payload to user dicts; records without an email are skipped"""
+        records = resolve_path(payload, mapping.get("records", ""))
+        if isinstance(records, dict):
+            # Some endpoints key members by id
+            records = list(records.values())
+        if not isinstance(records, list):
+            return []
+
+        fields = mapping.get("fields", {})
+        value_maps = mapping.get("value_maps", {})
+        users = []
+        for record in records:
+            user = {}
+            for field in USER_FIELDS:
+                value = self._first_value(record, fields.get(field, field))
+                if value is None:
+                    continue
+                user[field] = self._normalize(field, value, value_maps.get(field))
+            if isinstance(user.get("email"), str) and "@" in user["email"]:
+                users.append(user)
+        return users
+
+    @staticmethod
+    def _first_value(record: Any, paths: Any) -> Any:
+        for path in ([paths] if isinstance(paths, str) else paths):
+            value = resolve_path(record, path)
+            if value not in (None, "", [], {}):
+                return value
+        return None
+
+    @staticmethod
+    def _normalize(field: str, value: Any, value_map: Optional[Dict[str, str]]) -> Any:
+        if value_map is not None:
+            value = value_map.get(str(value), value)
+        if field == "last_login" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            if value >= EPOCH_MILLIS_MIN:
+                value = value / 1000
+            if value >= EPOCH_SECONDS_MIN:
+                return datetime.fromtimestamp(value, tz=timezone.utc).isoformat()
+        if isinstance(value, list):
+            return ", ".join(str(item) for item in value)
+        if isinstance(value, bool) and field == "status":
+            return "Active" if value else "Inactive"
+        return value if isinstance(value, str) else str(value)
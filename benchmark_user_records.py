@@ -0,0 +1,81 @@
+"""
+Benchmark for the in-memory size of user records
+Compares the old plain dataclass with the slotted/interned UserRecord and the columnar
+UserBatch on records loaded from JSON (where every string is a separate object)
+"""
+import argparse
+import json
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Callable
+
+from data_processor import UserRecord, UserBatch
+
+
+@dataclass
+class LegacyUserRecord:
+    """The previous UserRecord definition (per-instance __dict__, no interning)"""
+    email: str
+    name: Optional[str] = None
+    role: Optional[str] = None
+    last_login: Optional[str] = None
+    status: Optional[str] = None
+    extracted_at: Optional[str] = None
+    source_saas: Optional[str] = None
+
+
+def sample_export(count: int) -> str:
+    """Realistic JSON export: unique emails/names/logins, few roles/statuses, one batch timestamp"""
+    roles = ["Admin", "Member", "Viewer", "Billing Admin"]
+    statuses = ["Active", "Invited", "Suspended"]
+    users = [
+        {
+            "email": f"user{i}@example.com",
+            "name": f"User Number {i}",
+            "role": roles[i % len(roles)],
+            "last_login": f"2024-05-{i % 28 + 1:02d}T10:{i % 60:02d}:00",
+            "status": statuses[i % len(statuses)],
+            "extracted_at": "2024-06-01T12:00:00.000000",
+            "source_saas": "Dropbox Business"
+        }
+        for i in range(count)
+    ]
+    return json.dumps(users)
+
+
+def measure(build: Callable[[List[Dict[str, Any]]], Any], export: str) -> int:
+    """Bytes still held by a collection built from a freshly parsed export"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Parsing gives every record its own string objects, as when loading exports
+    users = json.loads(export)
+    collection = build(users)
+    del users
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del collection
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per user record, before and after")
+    parser.add_argument("--count", type=int, default=100000, help="Number of records")
+    args = parser.parse_args()
+
+    variants = {
+        "legacy dataclass": lambda users: [LegacyUserRecord(**user) for user in users],
+        "slotted + interned UserRecord": lambda users: [UserRecord.compact(**user) for user in users],
+        "columnar UserBatch": lambda users: UserBatch(UserRecord(**user) for user in users)
+    }
+
+    export = sample_export(args.count)
+    baseline = None
+    print(f"Memory per record ({args.count} records):")
+    for label, build in variants.items():
+        per_record = measure(build, export) / args.count
+        baseline = baseline or per_record
+        print(f"  {label:<32} {per_record:8.1f} bytes/record  ({per_record / baseline:.0%} of legacy)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,18 +5,263 @@ Handles all browser operations including login, navigation, and element interact
 import asyncio
 import json
 import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright, Browser, Page, BrowserContext
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from config import SaaSConfig, SETTINGS
+from session_store import SessionStore
 import logging
 
+# Counts the rows of a table or ARIA grid matched by a selector
+ROW_COUNT_JS = """
+(selector) => {
+    const root = document.querySelector(selector);
+    if (!root) return -1;
+    return root.querySelectorAll("tr, [role='row']").length;
+}
+"""
+
+# Resolves once no DOM mutation has been seen for quietMs (or after timeoutMs)
+DOM_QUIET_JS = """
+([quietMs, timeoutMs]) => new Promise((resolve) => {
+    let timer = setTimeout(done, quietMs);
+    const deadline = setTimeout(() => { observer.disconnect(); resolve(false); }, timeoutMs);
+    const observer = new MutationObserver(() => {
+        clearTimeout(timer);
+        timer = setTimeout(done, quietMs);
+    });
+    function done() {
+        observer.disconnect();
+        clearTimeout(deadline);
+        resolve(true);
+    }
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})
+"""
+
+# Returns the user table's header rows plus its data rows from index `start` (wrapped in a shallow
+# clone of the table element so root selectors still match), the data row count and a signature
+# of the first data row that changes when a new page replaces the rows
+TABLE_ROWS_JS = """
+([selector, start]) => {
+    const root = document.querySelector(selector);
+    if (!root) return null;
+    const rows = Array.from(root.querySelectorAll("tr, [role='row']"));
+    const isHeader = (row) => row.querySelector("th, [role='columnheader']") !== null;
+    const headers = rows.filter(isHeader);
+    const data = rows.filter((row) => !isHeader(row));
+    const fragment = root.cloneNode(false);
+    for (const row of headers.concat(data.slice(start))) fragment.appendChild(row.cloneNode(true));
+    return {
+        html: fragment.outerHTML,
+        count: data.length,
+        signature: data.length ? data[0].textContent.trim().slice(0, 200) + "|" + data.length : ""
+    };
+}
+"""
+
+# Same signature as TABLE_ROWS_JS, for waiting until a page change has rendered
+TABLE_SIGNATURE_JS = """
+(selector) => {
+    const root = document.querySelector(selector);
+    if (!root) return "";
+    const data = Array.from(root.querySelectorAll("tr, [role='row']"))
+        .filter((row) => row.querySelector("th, [role='columnheader']") === null);
+    return data.length ? data[0].textContent.trim().slice(0, 200) + "|" + data.length : "";
+}
+"""
+
+# Scrolls the last row of the table (and its scrollable ancestors) into view to trigger lazy loading
+SCROLL_TABLE_JS = """
+(selector) => {
+    const root = document.querySelector(selector);
+    if (!root) return false;
+    const rows = root.querySelectorAll("tr, [role='row']");
+    if (rows.length) rows[rows.length - 1].scrollIntoView({block: "end"});
+    for (let node = root; node; node = node.parentElement) {
+        if (node.scrollHeight > node.clientHeight) node.scrollTop = node.scrollHeight;
+    }
+    window.scrollTo(0, document.body.scrollHeight);
+    return true;
+}
+"""
+
+# Extracts the requested properties of every element matching a selector in one round trip
+FIND_ELEMENTS_JS = """
+([selector, fields, attributes, limit]) => {
+    const elements = Array.from(document.querySelectorAll(selector));
+    const selected = limit > 0 ? elements.slice(0, limit) : elements;
+    return selected.map((element) => {
+        const data = {};
+        if (fields.includes("text")) data.text = element.textContent;
+        if (fields.includes("inner_html")) data.inner_html = element.innerHTML;
+        if (fields.includes("attributes")) {
+            data.attributes = {};
+            for (const name of attributes) {
+                const value = element.getAttribute(name);
+                if (value) data.attributes[name] = value;
+            }
+        }
+        if (fields.includes("cells")) {
+            data.cells = Array.from(element.querySelectorAll("td, th, [role='cell'], [role='gridcell']"))
+                .map((cell) => cell.innerText !== undefined ? cell.innerText.trim() : cell.textContent.trim());
+        }
+        return data;
+    });
+}
+"""
+
+DEFAULT_ELEMENT_FIELDS = ("text", "inner_html", "attributes")
+DEFAULT_ELEMENT_ATTRIBUTES = ("id", "class", "data-testid", "role")
+
+DIALOG_SELECTOR = "[role='dialog'], [role='alertdialog'], dialog[open]"
+
+
+class ReadinessTracker:
+    """
+    Per-step adaptive timeouts for readiness waits. The timeout for a step is a multiple of the
+    slowest recently observed wait, bounded by min/default, and every wait's duration is recorded.
+    """
+
+    def __init__(self, default_timeout_ms: int, min_timeout_ms: int = 1000,
+                 multiplier: float = 3.0, history: int = 20):
+        self.default_timeout_ms = default_timeout_ms
+        self.min_timeout_ms = min_timeout_ms
+        self.multiplier = multiplier
+        self.durations: Dict[str, deque] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self.history = history
+
+    def timeout_for(self, step: str) -> int:
+        durations = self.durations.get(step)
+        if not durations:
+            return self.default_timeout_ms
+        adaptive = int(max(durations) * self.multiplier)
+        return max(self.min_timeout_ms, min(adaptive, self.default_timeout_ms))
+
+    def record(self, step: str, duration_ms: float, ready: bool):
+        stats = self.stats.setdefault(
+            step, {"waits": 0, "timeouts": 0, "total_ms": 0.0, "last_ms": 0.0, "max_ms": 0.0}
+        )
+        stats["waits"] += 1
+        stats["total_ms"] = round(stats["total_ms"] + duration_ms, 1)
+        stats["last_ms"] = round(duration_ms, 1)
+        stats["max_ms"] = round(max(stats["max_ms"], duration_ms), 1)
+        if ready:
+            # Only successful waits shape the adaptive timeout
+            self.durations.setdefault(step, deque(maxlen=self.history)).append(duration_ms)
+        else:
+            stats["timeouts"] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            step: {**stats, "avg_ms": round(stats["total_ms"] / stats["waits"], 1), "timeout_ms": self.timeout_for(step)}
+            for step, stats in self.stats.items()
+        }
+
+
+class ResourceBlocker:
+    """
+    Decides which requests to abort (by resource type and domain, per SaaS) and keeps counters
+    of what was blocked. Blocked bytes are estimated from the average size of allowed responses
+    of the same type, falling back to typical sizes.
+    """
+
+    # Rough per-type sizes used until real responses of that type have been seen
+    TYPICAL_SIZES = {"image": 30000, "font": 40000, "media": 500000, "stylesheet": 20000, "script": 60000}
+
+    def __init__(self):
+        self.stats: Dict[str, Any] = {
+            "blocked_requests": 0,
+            "blocked_by_type": {},
+            "blocked_by_domain": 0,
+            "estimated_blocked_bytes": 0,
+            "allowed_requests": 0,
+            "allowed_bytes": 0
+        }
+        self._seen_sizes: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def policy_for(config: Optional[SaaSConfig]) -> Dict[str, Any]:
+        """Effective allow/deny lists for a SaaS (SETTINGS defaults when the config sets none)"""
+        blocked_types = SETTINGS["blocked_resource_types"]
+        blocked_domains = SETTINGS["blocked_domains"]
+        allowed_domains: List[str] = []
+        if config:
+            if config.blocked_resource_types is not None:
+                blocked_types = config.blocked_resource_types
+            blocked_domains = list(blocked_domains) + list(config.blocked_domains or [])
+            allowed_domains = list(config.allowed_domains or [])
+        return {"types": set(blocked_types), "deny": blocked_domains, "allow": allowed_domains}
+
+    @staticmethod
+    def _domain_matches(host: str, domains: List[str]) -> bool:
+        return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+    def block_reason(self, resource_type: str, url: str, policy: Dict[str, Any]) -> Optional[str]:
+        """Return why a request should be blocked ("type" or "domain"), or None to let it through"""
+        if resource_type == "document":
+            return None
+        host = (urlparse(url).hostname or "").lower()
+        if self._domain_matches(host, policy["allow"]):
+            return None
+        if self._domain_matches(host, policy["deny"]):
+            return "domain"
+        if resource_type in policy["types"]:
+            return "type"
+        return None
+
+    def record_blocked(self, resource_type: str, reason: str):
+        self.stats["blocked_requests"] += 1
+        by_type = self.stats["blocked_by_type"]
+        by_type[resource_type] = by_type.get(resource_type, 0) + 1
+        if reason == "domain":
+            self.stats["blocked_by_domain"] += 1
+        seen = self._seen_sizes.get(resource_type)
+        estimate = sum(seen) // len(seen) if seen else self.TYPICAL_SIZES.get(resource_type, 5000)
+        self.stats["estimated_blocked_bytes"] += estimate
+
+    def record_response(self, response):
+        """Response listener: track sizes of what was allowed through"""
+        try:
+            size = int(response.headers.get("content-length", 0))
+        except (TypeError, ValueError):
+            size = 0
+        self.stats["allowed_requests"] += 1
+        self.stats["allowed_bytes"] += size
+        if size:
+            sizes = self._seen_sizes.setdefault(response.request.resource_type, [])
+            if len(sizes) < 200:
+                sizes.append(size)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
 class BrowserAutomationHandler:
     def __init__(self):
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.playwright = None
+        # Handlers created with new_context_handler share the browser but not its lifetime
+        self.owns_browser = True
+        self.pool: Optional["BrowserContextPool"] = None
+        self.session_store: Optional[SessionStore] = None
+        self.resource_blocker = ResourceBlocker()
+        self.resource_policy = ResourceBlocker.policy_for(None)
+        self._api_capture: Optional[Dict[str, Any]] = None
+        self.readiness = ReadinessTracker(
+            SETTINGS["readiness_default_timeout"],
+            min_timeout_ms=SETTINGS["readiness_min_timeout"],
+            multiplier=SETTINGS["readiness_timeout_multiplier"]
+        )
         self.setup_logging()
 
     def setup_logging(self):
@@ -39,17 +284,102 @@ class BrowserAutomationHandler:
             self.browser = await self.playwright.chromium.launch(
                 headless=SETTINGS["browser_headless"]
             )
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080}
-            )
-            self.page = await self.context.new_page()
-            self.page.set_default_timeout(SETTINGS["page_timeout"])
+            if SETTINGS["reuse_sessions"]:
+                try:
+                    self.session_store = SessionStore(
+                        SETTINGS["session_dir"], max_age_hours=SETTINGS["session_max_age_hours"],
+                        key_path=SETTINGS["session_key_path"]
+                    )
+                except Exception as e:
+                    self.logger.error(f"Session store unavailable, sessions won't be reused: {str(e)}")
+            if SETTINGS["context_pool_size"] > 0:
+                # Workflows borrow pooled contexts, so this handler doesn't need one of its own
+                self.pool = BrowserContextPool(
+                    self,
+                    max_size=SETTINGS["context_pool_size"],
+                    max_uses=SETTINGS["context_max_uses"]
+                )
+            else:
+                await self.open_context()
             self.logger.info("Browser initialized successfully")
             return True
         except Exception as e:
             self.logger.error(f"Failed to initialize browser: {str(e)}")
             return False
 
+    async def open_context(self):
+        """Open a fresh browser context and page on the launched browser"""
+        self.context = await self.browser.new_context(
+            viewport={'width': 1920, 'height': 1080}
+        )
+        if SETTINGS["block_resources"]:
+            await self.context.route("**/*", self._route_request)
+            self.context.on("response", self.resource_blocker.record_response)
+        self.page = await self.context.new_page()
+        self.page.set_default_timeout(SETTINGS["page_timeout"])
+
+    def set_resource_policy(self, config: Optional[SaaSConfig]):
+        """Use the SaaS-specific allow/deny lists for requests made by this handler's context"""
+        self.resource_policy = ResourceBlocker.policy_for(config)
+
+    async def _route_request(self, route):
+        request = route.request
+        reason = self.resource_blocker.block_reason(request.resource_type, request.url, self.resource_policy)
+        if reason:
+            self.resource_blocker.record_blocked(request.resource_type, reason)
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    async def new_context_handler(self) -> "BrowserAutomationHandler":
+        """
+        Create a handler with its own isolated BrowserContext (cookies, storage) on this
+        handler's browser process. Its cleanup closes only the context, not the browser.
+        """
+        handler = BrowserAutomationHandler()
+        handler.browser = self.browser
+        handler.owns_browser = False
+        handler.session_store = self.session_store
+        handler.readiness = self.readiness
+        handler.resource_blocker = self.resource_blocker
+        await handler.open_context()
+        return handler
+
+    @asynccontextmanager
+    async def borrow(self) -> AsyncIterator["BrowserAutomationHandler"]:
+        """
+        Borrow a handler with its own warm context/page from the pool for one workflow.
+        Falls back to this handler itself when no pool is available.
+        """
+        if self.pool is None:
+            yield self
+            return
+        async with self.pool.borrow() as handler:
+            yield handler
+
+    async def is_healthy(self) -> bool:
+        """Cheap liveness check of this handler's page"""
+        try:
+            if self.page is None or self.page.is_closed():
+                return False
+            await asyncio.wait_for(self.page.evaluate("1"), timeout=5)
+            return True
+        except Exception:
+            return False
+
+    async def reset(self):
+        """
+        Clear per-workflow state before a pooled handler is handed to the next workflow.
+        Cookies, local/session storage, IndexedDB and the init scripts added by
+        apply_storage_state all belong to the BrowserContext, so it is replaced with a fresh
+        one on the same browser rather than cleared piecemeal.
+        """
+        old_context = self.context
+        await self.open_context()
+        self.resource_policy = ResourceBlocker.policy_for(None)
+        self._api_capture = None
+        await old_context.close()
+
     async def login_to_saas(self, config: SaaSConfig, username: str, password: str) -> bool:
         """
         Login to SaaS application using provided credentials
@@ -59,7 +389,7 @@ class BrowserAutomationHandler:
 
             # Navigate to login page
             await self.page.goto(config.login_url)
-            await self.page.wait_for_load_state('networkidle')
+            await self.wait_for_page_ready(config, next_selector=config.username_selector)
 
             # Fill login credentials
             await self.page.fill(config.username_selector, username)
@@ -67,7 +397,7 @@ class BrowserAutomationHandler:
 
             # Click login button
             await self.page.click(config.login_button_selector)
-            await self.page.wait_for_load_state('networkidle')
+            await self.wait_for_page_ready(config, url_predicate=lambda url: "login" not in url.lower())
 
             # Check if login was successful (basic check)
             current_url = self.page.url
@@ -84,17 +414,152 @@ class BrowserAutomationHandler:
             await self.take_screenshot("login_error")
             return False
 
-    async def navigate_to_users_page(self, config: SaaSConfig) -> bool:
-        """Navigate to the users management page"""
+    async def apply_storage_state(self, storage_state: Dict[str, Any]):
+        """Load cookies and localStorage from a saved storage_state into the current context"""
+        cookies = storage_state.get("cookies") or []
+        if cookies:
+            await self.context.add_cookies(cookies)
+
+        for origin in storage_state.get("origins") or []:
+            items = {entry["name"]: entry["value"] for entry in origin.get("localStorage", [])}
+            if not items:
+                continue
+            # localStorage can only be written from a page of the same origin
+            await self.context.add_init_script(script=f"""
+                (() => {{
+                    if (window.location.origin !== {json.dumps(origin["origin"])}) return;
+                    const items = {json.dumps(items)};
+                    for (const [key, value] of Object.entries(items)) {{
+                        window.localStorage.setItem(key, value);
+                    }}
+                }})();
+            """)
+
+    async def restore_session(self, saas_id: str, config: SaaSConfig, username: str) -> bool:
+        """
+        Restore a saved session and verify it cheaply by loading the users page.
+        Returns False (forgetting the session and starting a fresh context) if the portal
+        sends us back to login.
+        """
+        if self.session_store is None:
+            return False
+
+        storage_state = self.session_store.load(saas_id, username)
+        if not storage_state:
+            return False
+
         try:
+            await self.apply_storage_state(storage_state)
             await self.page.goto(config.users_page_url)
-            await self.page.wait_for_load_state('networkidle')
+            # Either the user table or the login form shows which way the session went
+            await self.wait_for_page_ready(
+                config, next_selector=f"{config.user_table_selector}, {config.username_selector}"
+            )
+
+            if "login" not in self.page.url.lower():
+                self.logger.info(f"Reused saved session for {config.name}")
+                return True
+
+            self.logger.info(f"Saved session for {config.name} has expired, logging in again")
+            self.session_store.delete(saas_id, username)
+            await self._discard_restored_state(config)
+            return False
+
+        except Exception as e:
+            self.logger.error(f"Failed to restore session for {config.name}: {str(e)}")
+            try:
+                await self._discard_restored_state(config)
+            except Exception as reset_error:
+                self.logger.warning(f"Failed to reset context after session restore: {str(reset_error)}")
+            return False
+
+    async def _discard_restored_state(self, config: SaaSConfig):
+        """
+        Drop everything apply_storage_state put into the context before logging in again.
+        Clearing cookies would leave the localStorage init scripts behind, so the context is
+        replaced (keeping this SaaS's resource policy).
+        """
+        await self.reset()
+        self.set_resource_policy(config)
+
+    async def ensure_logged_in(self, saas_id: str, config: SaaSConfig, username: str, password: str) -> bool:
+        """
+        Reuse a saved session when it is still valid, otherwise log in and save the new session
+        """
+        self.set_resource_policy(config)
+        if await self.restore_session(saas_id, config, username):
+            return True
+
+        if not await self.login_to_saas(config, username, password):
+            return False
+
+        if self.session_store is not None:
+            try:
+                self.session_store.save(saas_id, username, await self.context.storage_state())
+            except Exception as e:
+                self.logger.error(f"Failed to save session for {config.name}: {str(e)}")
+        return True
+
+    async def navigate_to_users_page(self, config: SaaSConfig, reload: bool = False) -> bool:
+        """Navigate to the users management page (reload=True navigates even if already there)"""
+        try:
+            if not reload and self.page.url.rstrip("/") == config.users_page_url.rstrip("/"):
+                # Already there, e.g. after verifying a restored session
+                await self.wait_for_page_ready(config, next_selector=config.user_table_selector)
+                self.logger.info(f"Already on users page for {config.name}")
+                return True
+            await self.page.goto(config.users_page_url)
+            await self.wait_for_page_ready(config, next_selector=config.user_table_selector)
             self.logger.info(f"Navigated to users page for {config.name}")
             return True
         except Exception as e:
             self.logger.error(f"Failed to navigate to users page: {str(e)}")
             return False
 
+    async def wait_for_page_ready(
+        self,
+        config: Optional[SaaSConfig],
+        next_selector: Optional[str] = None,
+        url_predicate: Optional[Callable[[str], bool]] = None
+    ):
+        """
+        Wait after a navigation or click using the SaaS load strategy, as cheaply as possible
+        while still guaranteeing the next step's selector (or URL) is there:
+          networkidle      - legacy behaviour, wait for the network to go quiet
+          domcontentloaded - only wait for DOMContentLoaded
+          selector         - DOMContentLoaded, then the next step's selector if known
+          url              - wait for config.ready_url_pattern, then as selector
+        url_predicate, if given, is awaited for every strategy except networkidle.
+        If the expected URL or selector does not show up in time, a warning is logged and
+        DOMContentLoaded is used instead, leaving the next step to fail with its own error.
+        """
+        strategy = config.load_strategy if config else SETTINGS["default_load_strategy"]
+
+        if strategy == "networkidle":
+            await self.page.wait_for_load_state('networkidle')
+            return
+
+        if url_predicate is not None:
+            try:
+                await self.page.wait_for_url(url_predicate)
+            except Exception as e:
+                self.logger.warning(f"URL did not reach the expected state: {str(e)}")
+        elif strategy == "url" and config and config.ready_url_pattern:
+            try:
+                await self.page.wait_for_url(re.compile(config.ready_url_pattern))
+            except PlaywrightTimeoutError:
+                self.logger.warning(
+                    f"URL did not match {config.ready_url_pattern}, falling back to domcontentloaded"
+                )
+
+        await self.page.wait_for_load_state('domcontentloaded')
+
+        if strategy in ("selector", "url") and next_selector:
+            try:
+                await self.page.wait_for_selector(next_selector)
+            except PlaywrightTimeoutError:
+                self.logger.warning(f"Selector {next_selector} not found, falling back to domcontentloaded")
+
     async def extract_page_content(self) -> str:
         """Extract HTML content from current page"""
         try:
@@ -104,37 +569,38 @@ class BrowserAutomationHandler:
             self.logger.error(f"Failed to extract page content: {str(e)}")
             return ""
 
-    async def find_elements(self, selector: str) -> List[Dict[str, Any]]:
-        """Find elements on page and extract their properties"""
+    async def find_elements(
+        self,
+        selector: str,
+        fields: Optional[List[str]] = None,
+        attributes: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find elements on page and extract their properties in a single evaluate call.
+        fields limits what is returned per element ("text", "inner_html", "attributes" and
+        "cells" - the trimmed text of each table cell within the element, e.g. for rows);
+        attributes lists which attributes to read and limit caps the number of elements.
+        """
         try:
-            elements = await self.page.query_selector_all(selector)
-            element_data = []
-
-            for element in elements:
-                data = {
-                    "text": await element.text_content(),
-                    "inner_html": await element.inner_html(),
-                    "attributes": {}
-                }
-
-                # Get common attributes
-                for attr in ["id", "class", "data-testid", "role"]:
-                    value = await element.get_attribute(attr)
-                    if value:
-                        data["attributes"][attr] = value
-
-                element_data.append(data)
-
-            return element_data
+            return await self.page.evaluate(FIND_ELEMENTS_JS, [
+                selector,
+                list(fields or DEFAULT_ELEMENT_FIELDS),
+                list(attributes or DEFAULT_ELEMENT_ATTRIBUTES),
+                limit or 0
+            ])
         except Exception as e:
             self.logger.error(f"Failed to find elements with selector {selector}: {str(e)}")
             return []
 
-    async def click_element(self, selector: str) -> bool:
-        """Click an element by selector"""
+    async def click_element(
+        self, selector: str, config: Optional[SaaSConfig] = None, next_selector: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> bool:
+        """Click an element by selector (timeout in ms overrides the page default)"""
         try:
-            await self.page.click(selector)
-            await self.page.wait_for_load_state('networkidle')
+            await self.page.click(selector, timeout=timeout)
+            await self.wait_for_page_ready(config, next_selector=next_selector)
             return True
         except Exception as e:
             self.logger.error(f"Failed to click element {selector}: {str(e)}")
@@ -173,17 +639,358 @@ class BrowserAutomationHandler:
             self.logger.error(f"Element {selector} not found within timeout: {str(e)}")
             return False
 
+    async def is_visible(self, selector: str) -> bool:
+        """Whether an element matching selector is currently visible (no waiting)"""
+        try:
+            return await self.page.locator(selector).first.is_visible()
+        except Exception:
+            return False
+
+    async def count_rows(self, table_selector: str) -> int:
+        """Number of rows currently in the user table (-1 if the table isn't on the page)"""
+        try:
+            return await self.page.evaluate(ROW_COUNT_JS, table_selector)
+        except Exception as e:
+            self.logger.warning(f"Failed to count rows in {table_selector}: {str(e)}")
+            return -1
+
+    def watch_response(self, url_pattern: str) -> asyncio.Future:
+        """
+        Start watching for a response whose URL matches url_pattern (a regex).
+        Call before the action that triggers it and pass the future to wait_for_ready.
+        """
+        future = asyncio.get_running_loop().create_future()
+        pattern = re.compile(url_pattern)
+
+        def on_response(response):
+            if not future.done() and pattern.search(response.url):
+                future.set_result(response.status)
+
+        self.page.on("response", on_response)
+        future.add_done_callback(lambda _: self.page.remove_listener("response", on_response))
+        return future
+
+    async def wait_for_ready(
+        self,
+        step: str,
+        selector: Optional[str] = None,
+        table_selector: Optional[str] = None,
+        previous_row_count: Optional[int] = None,
+        response_future: Optional[asyncio.Future] = None,
+        dom_quiet: bool = False,
+        previous_signature: Optional[str] = None
+    ) -> bool:
+        """
+        Wait until the page is ready for the next step, on whichever concrete signal comes first:
+        selector visible, row count in table_selector changed from previous_row_count, first row of
+        table_selector changed from previous_signature, the watched response arrived, or
+        (if dom_quiet or no other signal is given) DOM mutations settled.
+        The timeout adapts per step and every wait's duration is recorded.
+        """
+        timeout = self.readiness.timeout_for(step)
+        started = time.perf_counter()
+        signals = []
+
+        if selector:
+            signals.append(self.page.wait_for_selector(selector, state="visible", timeout=timeout))
+        if table_selector and previous_row_count is not None and previous_row_count >= 0:
+            signals.append(self.page.wait_for_function(
+                f"([selector, previous]) => ({ROW_COUNT_JS})(selector) !== previous",
+                arg=[table_selector, previous_row_count],
+                timeout=timeout
+            ))
+        if table_selector and previous_signature:
+            signals.append(self.page.wait_for_function(
+                f"([selector, previous]) => ({TABLE_SIGNATURE_JS})(selector) !== previous",
+                arg=[table_selector, previous_signature],
+                timeout=timeout
+            ))
+        if response_future is not None:
+            signals.append(response_future)
+        if dom_quiet or not signals:
+            signals.append(self._wait_for_dom_quiet(timeout))
+
+        tasks = [asyncio.ensure_future(signal) for signal in signals]
+        ready = False
+        try:
+            pending = set(tasks)
+            deadline = started + timeout / 1000
+            while pending and not ready:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and task.result() is not False:
+                        ready = True
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.readiness.record(step, duration_ms, ready)
+        if ready:
+            self.logger.info(f"Ready for '{step}' after {duration_ms:.0f} ms")
+        else:
+            self.logger.warning(f"No readiness signal for '{step}' within {timeout} ms, continuing")
+        return ready
+
+    async def _wait_for_dom_quiet(self, timeout: int) -> bool:
+        return await self.page.evaluate(DOM_QUIET_JS, [SETTINGS["dom_quiet_ms"], timeout])
+
+    def start_api_capture(self, url_pattern: str):
+        """
+        Start collecting JSON bodies of responses whose URL matches url_pattern (a regex),
+        e.g. the portal's own member-list endpoint. Start before navigating; collect with
+        stop_api_capture.
+        """
+        pattern = re.compile(url_pattern)
+        capture: Dict[str, Any] = {"payloads": [], "tasks": []}
+
+        async def read_json(response):
+            try:
+                capture["payloads"].append(await response.json())
+            except Exception as e:
+                self.logger.warning(f"Could not read JSON from {response.url}: {str(e)}")
+
+        def on_response(response):
+            content_type = response.headers.get("content-type", "")
+            if response.ok and "json" in content_type and pattern.search(response.url):
+                capture["tasks"].append(asyncio.ensure_future(read_json(response)))
+
+        capture["listener"] = on_response
+        self.page.on("response", on_response)
+        self._api_capture = capture
+
+    async def stop_api_capture(self) -> List[Any]:
+        """Stop capturing and return the JSON payloads collected since start_api_capture"""
+        capture, self._api_capture = self._api_capture, None
+        if capture is None:
+            return []
+        self.page.remove_listener("response", capture["listener"])
+        if capture["tasks"]:
+            await asyncio.gather(*capture["tasks"], return_exceptions=True)
+        self.logger.info(f"Captured {len(capture['payloads'])} API payload(s)")
+        return capture["payloads"]
+
+    async def harvest_pages(self, config: SaaSConfig) -> AsyncIterator[str]:
+        """
+        Yield the user table one page at a time, driving "next page" controls or scroll-to-bottom
+        lazy loading according to config.pagination ("auto", "next", "scroll" or "none").
+        Scrolling yields only newly loaded rows. Stops when there is no usable next control or the
+        row count stays the same for SETTINGS["pagination_stable_rounds"] scrolls.
+        Falls back to a single full-page snapshot when the table can't be found or has no
+        recognizable rows (e.g. member lists built from plain divs or cards).
+        """
+        table_selector = config.user_table_selector
+        snapshot = await self._table_snapshot(table_selector, 0)
+        if config.pagination == "none" or snapshot is None or not snapshot["count"]:
+            yield await self.extract_page_content()
+            return
+
+        yield snapshot["html"]
+        mode = config.pagination
+        pages = 1
+        stable_rounds = 0
+        while pages < SETTINGS["max_pages"]:
+            next_control = None
+            if mode in ("auto", "next"):
+                next_control = await self._find_next_control(config)
+                if next_control is None and mode == "next":
+                    break
+
+            if next_control is not None:
+                mode = "next"
+                await next_control.click()
+                changed = await self.wait_for_ready(
+                    "next_page", table_selector=table_selector, previous_signature=snapshot["signature"]
+                )
+                if not changed:
+                    break
+                snapshot = await self._table_snapshot(table_selector, 0)
+            else:
+                await self.page.evaluate(SCROLL_TABLE_JS, table_selector)
+                grew = await self.wait_for_ready(
+                    "scroll_page", table_selector=table_selector, previous_row_count=snapshot["count"]
+                )
+                if not grew:
+                    stable_rounds += 1
+                    if mode == "auto" or stable_rounds >= SETTINGS["pagination_stable_rounds"]:
+                        break
+                    continue
+                mode = "scroll"
+                stable_rounds = 0
+                previous = snapshot
+                snapshot = await self._table_snapshot(table_selector, previous["count"])
+                if snapshot and snapshot["signature"].split("|")[0] != previous["signature"].split("|")[0]:
+                    # Virtualized list recycled its rows, so the first rows are not the old ones
+                    snapshot = await self._table_snapshot(table_selector, 0)
+
+            if snapshot is None:
+                break
+            pages += 1
+            self.logger.info(f"Harvested page {pages} of {config.name} ({snapshot['count']} rows loaded)")
+            yield snapshot["html"]
+
+        self.logger.info(f"Finished harvesting {config.name}: {pages} page(s)")
+
+    async def _table_snapshot(self, table_selector: str, start: int) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.page.evaluate(TABLE_ROWS_JS, [table_selector, start])
+        except Exception as e:
+            self.logger.warning(f"Failed to read rows of {table_selector}: {str(e)}")
+            return None
+
+    async def _find_next_control(self, config: SaaSConfig):
+        """First visible, enabled "next page" control, or None"""
+        candidates = [config.next_page_selector] if config.next_page_selector else SETTINGS["next_page_selectors"]
+        for selector in candidates:
+            try:
+                locator = self.page.locator(selector).first
+                if await locator.count() == 0 or not await locator.is_visible():
+                    continue
+                if not await locator.is_enabled() or await locator.get_attribute("aria-disabled") == "true":
+                    continue
+                return locator
+            except Exception:
+                continue
+        return None
+
     async def cleanup(self):
         """Clean up browser resources"""
         try:
+            if self.pool:
+                await self.pool.close()
             if self.page:
                 await self.page.close()
             if self.context:
                 await self.context.close()
-            if self.browser:
-                await self.browser.close()
-            if self.playwright:
-                await self.playwright.stop()
+            if self.owns_browser:
+                if self.browser:
+                    await self.browser.close()
+                if self.playwright:
+                    await self.playwright.stop()
             self.logger.info("Browser cleanup completed")
         except Exception as e:
             self.logger.error(f"Error during cleanup: {str(e)}")
+
+
+class BrowserContextPool:
+    """
+    Pool of BrowserContext/Page handlers over one launched browser.
+    Handlers are health-checked on acquire, get a fresh context on release so no session
+    state leaks between workflows, and are discarded after max_uses workflows. The condition
+    only guards the idle list and size; browser calls (health checks, resets, closing) are
+    made without it so one slow context doesn't hold up every other acquire/release.
+    """
+
+    def __init__(self, owner: BrowserAutomationHandler, max_size: int = 4, max_uses: int = 20):
+        self.owner = owner
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.logger = logging.getLogger(__name__)
+        self._idle: List[BrowserAutomationHandler] = []
+        self._uses: Dict[int, int] = {}
+        self._size = 0
+        self._condition = asyncio.Condition()
+        self._closed = False
+        self.stats = {"created": 0, "reused": 0, "recycled": 0, "unhealthy": 0, "waits": 0}
+
+    async def _discard(self, handler: BrowserAutomationHandler):
+        """Close a handler's context (outside the lock), then free its slot"""
+        self._uses.pop(id(handler), None)
+        try:
+            await handler.cleanup()
+        finally:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+
+    async def _take_idle_or_slot(self) -> Optional[BrowserAutomationHandler]:
+        """An idle handler, or None once a slot for a new one has been reserved"""
+        async with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser context pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+                self.stats["waits"] += 1
+                await self._condition.wait()
+
+    async def acquire(self) -> BrowserAutomationHandler:
+        """Get a healthy handler, creating one if the pool isn't full, otherwise wait"""
+        while True:
+            handler = await self._take_idle_or_slot()
+            if handler is None:
+                break
+            if await handler.is_healthy():
+                self.stats["reused"] += 1
+                return handler
+            self.stats["unhealthy"] += 1
+            await self._discard(handler)
+
+        try:
+            handler = await self.owner.new_context_handler()
+        except Exception:
+            async with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._uses[id(handler)] = 0
+        self.stats["created"] += 1
+        return handler
+
+    async def release(self, handler: BrowserAutomationHandler, healthy: bool = True):
+        """Return a handler to the pool, recycling it if it is worn out or broken"""
+        uses = self._uses.get(id(handler), 0) + 1
+        self._uses[id(handler)] = uses
+        if self._closed or not healthy or uses >= self.max_uses:
+            if uses >= self.max_uses:
+                self.stats["recycled"] += 1
+            await self._discard(handler)
+            return
+
+        try:
+            await handler.reset()
+        except Exception as e:
+            self.logger.warning(f"Failed to reset pooled context, discarding it: {str(e)}")
+            await self._discard(handler)
+            return
+
+        async with self._condition:
+            # The pool may have been closed while the context was being reset
+            if not self._closed:
+                self._idle.append(handler)
+                self._condition.notify()
+                return
+        await self._discard(handler)
+
+    @asynccontextmanager
+    async def borrow(self) -> AsyncIterator[BrowserAutomationHandler]:
+        """async with pool.borrow() as handler: ..."""
+        handler = await self.acquire()
+        healthy = True
+        try:
+            yield handler
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            await self.release(handler, healthy=healthy)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+    async def close(self):
+        """Close all idle contexts; borrowed ones are closed when released"""
+        async with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for handler in idle:
+            await self._discard(handler)
@@ -2,8 +2,8 @@
 Configuration file for AI-driven SaaS User Management System
 """
 import os
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
 
 @dataclass
 class SaaSConfig:
@@ -17,6 +17,27 @@ class SaaSConfig:
     user_table_selector: str
     add_user_button: str
     user_form_selectors: Dict[str, str]
+    # Regex for the portal's own API call that confirms a user was added/removed
+    # (used as a readiness signal after submitting)
+    user_mutation_response_pattern: Optional[str] = None
+    # How to decide a page is ready after navigation/clicks:
+    # "domcontentloaded", "selector" (next step's selector), "url" (ready_url_pattern) or "networkidle"
+    load_strategy: str = "selector"
+    ready_url_pattern: Optional[str] = None
+    # Request blocking: None keeps SETTINGS["blocked_resource_types"]; domains add to / override
+    # SETTINGS["blocked_domains"] (allowed_domains always wins)
+    blocked_resource_types: Optional[List[str]] = None
+    blocked_domains: List[str] = field(default_factory=list)
+    allowed_domains: List[str] = field(default_factory=list)
+    # How the member list loads beyond its first screen: "auto" (detect), "next" (next-page
+    # control), "scroll" (infinite scroll) or "none"; next_page_selector overrides the defaults
+    pagination: str = "auto"
+    next_page_selector: Optional[str] = None
+    # Regex for the portal's own member-list JSON endpoint; when set with user_api_mapping
+    # (see api_response_mapper.APIResponseMapper) users are read from those responses
+    # instead of the rendered HTML
+    user_api_response_pattern: Optional[str] = None
+    user_api_mapping: Optional[Dict[str, Any]] = None
 
 # Predefined SaaS configurations
 SAAS_CONFIGS = {
@@ -55,15 +76,94 @@ SAAS_CONFIGS = {
 SETTINGS = {
     "browser_headless": True,
     "page_timeout": 30000,
+    # How long a learned or AI-suggested selector gets to become clickable before the next is tried
+    "selector_probe_timeout": 3000,
     "max_retries": 3,
     "screenshot_on_error": True,
+    # Load strategy used when no SaaS config is at hand (see SaaSConfig.load_strategy)
+    "default_load_strategy": "domcontentloaded",
     "data_output_dir": "./scraped_data/",
-    "logs_dir": "./logs/"
+    # Indexed SQLite database of every scrape (users, snapshots, sources)
+    "user_store_path": "./scraped_data/users.db",
+    # JSON Lines feed (in data_output_dir) of added/removed/modified users between scrapes
+    "access_change_feed": "access_changes.jsonl",
+    # Compressed base + delta history of every scrape, re-based every N entries per SaaS
+    "snapshot_archive_path": "./scraped_data/snapshot_archive.db",
+    "archive_rebase_every": 30,
+    # Domains treated as the same organisation when joining users across SaaS apps
+    # (e.g. {"acme.io": "acme.com"})
+    "domain_aliases": {},
+    "logs_dir": "./logs/",
+    # Number of SaaS targets scraped at once by --action scrape-all
+    "max_concurrent_scrapes": 3,
+    # Warm BrowserContext/Page pool shared by concurrent workflows (0 disables it, and every
+    # workflow then runs in the launching handler's own context)
+    "context_pool_size": 4,
+    "context_max_uses": 20,
+    # Encrypted storage_state per (saas_id, username) so later runs can skip login
+    "reuse_sessions": True,
+    "session_dir": "./sessions/",
+    # Key file used only when SESSION_ENCRYPTION_KEY is unset (kept outside session_dir)
+    "session_key_path": "~/.config/saas-automation/session.key",
+    "session_max_age_hours": 12,
+    # Event-driven readiness waits (replacing fixed sleeps); timeouts adapt per step
+    "readiness_default_timeout": 10000,
+    "readiness_min_timeout": 1000,
+    "readiness_timeout_multiplier": 3.0,
+    "dom_quiet_ms": 300,
+    # Abort requests that don't matter for DOM scraping (per-SaaS overrides in SaaSConfig)
+    "block_resources": True,
+    "blocked_resource_types": ["image", "media", "font"],
+    "blocked_domains": [
+        "google-analytics.com", "googletagmanager.com", "doubleclick.net", "segment.io",
+        "segment.com", "mixpanel.com", "amplitude.com", "hotjar.com", "fullstory.com",
+        "newrelic.com", "nr-data.net", "facebook.net", "bat.bing.com", "clarity.ms"
+    ],
+    # Pagination / infinite-scroll harvesting in scrape_users
+    "max_pages": 200,
+    "pagination_stable_rounds": 2,
+    "next_page_selectors": [
+        "a[rel='next']",
+        "button[aria-label*='next page' i]",
+        "[aria-label='Next']",
+        "button:has-text('Next')",
+        "a:has-text('Next')"
+    ],
+    # Scrape pipeline (fetch -> prune -> extract -> normalize -> persist): items waiting
+    # between stages, and how many pages are pruned / extracted at once
+    "harvest_queue_size": 4,
+    "pipeline_prune_workers": 1,
+    "harvest_extract_workers": 2
 }
 
 # OpenAI Configuration
 OPENAI_CONFIG = {
     "model": "gpt-4",
     "temperature": 0.1,
-    "max_tokens": 2000
+    "max_tokens": 2000,
+    # Strip scripts, styles, SVGs and non-semantic attributes before any LLM call
+    "prune_html": True,
+    # Parse plain tables locally and only fall back to the LLM below this confidence
+    "table_fast_path": True,
+    "table_fast_path_min_confidence": 0.75,
+    # Pages larger than one chunk are split on table rows and extracted in parallel
+    "chunked_extraction": True,
+    "extraction_chunk_size": 15000,
+    "extraction_max_concurrency": 4,
+    # Persistent SQLite cache of LLM results under SETTINGS["data_output_dir"]
+    "response_cache": True,
+    "response_cache_ttl": 86400,
+    "response_cache_max_entries": 5000,
+    # Connection pool shared by all requests of the async agent
+    "max_connections": 10,
+    "request_timeout": 120,
+    # Shared rate governor for every OpenAI request; set to the account's limits (0 = unlimited).
+    # Token use is estimated from prompt length (chars_per_token) plus max_tokens.
+    "requests_per_minute": 500,
+    "tokens_per_minute": 40000,
+    "chars_per_token": 4,
+    # Retries of 429s (honoring retry-after) and transient errors, with exponential backoff
+    "max_retries": 5,
+    "retry_backoff": 1.0,
+    "retry_max_backoff": 60
 }
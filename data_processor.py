@@ -4,14 +4,40 @@ Data Processor for handling extracted user data and managing operations
 import json
 import csv
 import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from array import array
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from operator import attrgetter
+from typing import Dict, List, Any, Optional, Iterable, Iterator, AsyncIterable, Tuple, Union
 from dataclasses import dataclass, asdict
 import logging
+from report_engine import UserReportEngine, RecordColumns, DORMANCY_FIELD
+from diff_engine import DiffEngine
+from identity_index import IdentityIndex
 
-@dataclass
+USER_FIELDNAMES = ["email", "name", "role", "last_login", "status", "extracted_at", "source_saas"]
+
+# Default generate_report breakdowns and their report keys
+DEFAULT_REPORT_GROUP_BY = ["source_saas", "role", "status"]
+REPORT_BREAKDOWN_NAMES = {"source_saas": "by_saas"}
+
+# Serialized output is flushed to disk once this many characters are buffered
+DEFAULT_WRITE_BUFFER = 64 * 1024
+
+# Low-cardinality fields (the whole batch usually shares one extracted_at) that are interned
+# on records and dictionary-encoded in UserBatch
+SHARED_FIELDS = ("role", "status", "extracted_at", "source_saas")
+
+# Serializes appends to the access-change feed; snapshots of several SaaS targets are
+# persisted from worker threads at the same time
+_CHANGE_FEED_LOCK = threading.Lock()
+
+
+@dataclass(slots=True)
 class UserRecord:
-    """Data class for user records"""
+    """Data class for user records (slotted: no per-instance __dict__)"""
     email: str
     name: Optional[str] = None
     role: Optional[str] = None
@@ -20,6 +46,282 @@ class UserRecord:
     extracted_at: Optional[str] = None
     source_saas: Optional[str] = None
 
+    @classmethod
+    def compact(cls, **fields) -> "UserRecord":
+        """Build a record whose low-cardinality strings are interned, so equal values share one object"""
+        for name in SHARED_FIELDS:
+            value = fields.get(name)
+            if isinstance(value, str):
+                fields[name] = sys.intern(value)
+        return cls(**fields)
+
+
+class UserBatch:
+    """
+    Columnar container for large collections of users. email, name and last_login are kept
+    as plain lists; role, status, extracted_at and source_saas are dictionary-encoded into
+    compact integer arrays. Indexing and iteration yield UserRecords, so a batch can be passed
+    anywhere a List[UserRecord] is only read (save_to_json, save_to_csv, generate_report, ...).
+    """
+
+    def __init__(self, records: Iterable[UserRecord] = ()):
+        self._emails: List[str] = []
+        self._names: List[Optional[str]] = []
+        self._last_logins: List[Optional[str]] = []
+        self._codes: Dict[str, array] = {name: array('I') for name in SHARED_FIELDS}
+        self._values: Dict[str, List[Optional[str]]] = {name: [] for name in SHARED_FIELDS}
+        self._lookup: Dict[str, Dict[Optional[str], int]] = {name: {} for name in SHARED_FIELDS}
+        self.extend(records)
+
+    def _encode(self, field: str, value: Optional[str]) -> int:
+        lookup = self._lookup[field]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self._values[field])
+            lookup[value] = code
+            self._values[field].append(value)
+        return code
+
+    def append(self, record: UserRecord):
+        self._emails.append(record.email)
+        self._names.append(record.name)
+        self._last_logins.append(record.last_login)
+        for name in SHARED_FIELDS:
+            self._codes[name].append(self._encode(name, getattr(record, name)))
+
+    def extend(self, records: Iterable[UserRecord]):
+        """Append many records column by column (map/attrgetter, no per-record Python loop)"""
+        records = records if isinstance(records, (list, tuple)) else list(records)
+        self._emails.extend(map(attrgetter("email"), records))
+        self._names.extend(map(attrgetter("name"), records))
+        self._last_logins.extend(map(attrgetter("last_login"), records))
+        for name in SHARED_FIELDS:
+            column = list(map(attrgetter(name), records))
+            lookup = self._lookup[name]
+            for value in dict.fromkeys(column):
+                if value not in lookup:
+                    lookup[value] = len(self._values[name])
+                    self._values[name].append(value)
+            self._codes[name].extend(map(lookup.__getitem__, column))
+
+    def __len__(self) -> int:
+        return len(self._emails)
+
+    def _record(self, index: int) -> UserRecord:
+        values = self._values
+        codes = self._codes
+        return UserRecord(
+            email=self._emails[index],
+            name=self._names[index],
+            role=values["role"][codes["role"][index]],
+            last_login=self._last_logins[index],
+            status=values["status"][codes["status"][index]],
+            extracted_at=values["extracted_at"][codes["extracted_at"][index]],
+            source_saas=values["source_saas"][codes["source_saas"][index]]
+        )
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[UserRecord, List[UserRecord]]:
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("UserBatch index out of range")
+        return self._record(index)
+
+    def __iter__(self) -> Iterator[UserRecord]:
+        for index in range(len(self)):
+            yield self._record(index)
+
+    def column(self, field: str) -> List[Optional[str]]:
+        """All values of one field, in record order"""
+        if field not in self._codes:
+            return list(self._plain_column(field))
+        values = self._values[field]
+        return [values[code] for code in self._codes[field]]
+
+    def encoded(self, field: str) -> Tuple[array, List[Optional[str]]]:
+        """
+        Dictionary encoding of a field: an integer code per record and the value of each code.
+        Stored as-is for the low-cardinality fields, built on demand for the others.
+        """
+        if field in self._codes:
+            return self._codes[field], self._values[field]
+        column = self._plain_column(field)
+        values = list(dict.fromkeys(column))
+        index = {value: code for code, value in enumerate(values)}
+        return array('I', map(index.__getitem__, column)), values
+
+    def distinct_values(self, field: str) -> set:
+        """Set of distinct values of a field (including None if present)"""
+        if field in self._values:
+            return set(self._values[field])
+        return set(self._plain_column(field))
+
+    def _plain_column(self, field: str) -> List[Optional[str]]:
+        return {"email": self._emails, "name": self._names, "last_login": self._last_logins}[field]
+
+    def value_counts(self, field: str) -> Dict[Optional[str], int]:
+        """Occurrences of each value of a low-cardinality field, counted on the codes"""
+        counts = [0] * len(self._values[field])
+        for code in self._codes[field]:
+            counts[code] += 1
+        return dict(zip(self._values[field], counts))
+
+
+class StreamingUserWriter(ABC):
+    """
+    Base class for writers that stream user records to disk in bounded buffers, so exports never
+    hold the whole dataset in memory. Accepts UserRecords or plain dicts, one at a time or from
+    (async) iterators. Metadata such as total_users is only known at the end, so it is written
+    in a trailer or a "<file>.meta.json" sidecar on close. Use as a context manager.
+    """
+
+    def __init__(self, filepath: str, extra_metadata: Optional[Dict[str, Any]] = None,
+                 buffer_size: int = DEFAULT_WRITE_BUFFER):
+        self.filepath = filepath
+        self.extra_metadata = extra_metadata or {}
+        self.buffer_size = buffer_size
+        self.count = 0
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._file = open(filepath, 'w', newline='', encoding='utf-8')
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def _to_dict(record: Union["UserRecord", Dict[str, Any]]) -> Dict[str, Any]:
+        return record if isinstance(record, dict) else asdict(record)
+
+    def _emit(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer.clear()
+            self._buffered = 0
+
+    def write(self, record: Union["UserRecord", Dict[str, Any]]):
+        self._write_record(self._to_dict(record))
+        self.count += 1
+
+    def write_all(self, records: Iterable[Union["UserRecord", Dict[str, Any]]]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    async def write_all_async(self, records: AsyncIterable[Union["UserRecord", Dict[str, Any]]]) -> int:
+        async for record in records:
+            self.write(record)
+        return self.count
+
+    def metadata(self) -> Dict[str, Any]:
+        metadata = {
+            "total_users": self.count,
+            "extracted_at": datetime.now().isoformat(),
+            "format_version": "1.0"
+        }
+        metadata.update(self.extra_metadata)
+        return metadata
+
+    def write_sidecar(self) -> str:
+        sidecar_path = self.filepath + ".meta.json"
+        with open(sidecar_path, 'w', encoding='utf-8') as f:
+            json.dump(self.metadata(), f, indent=2, ensure_ascii=False)
+        return sidecar_path
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            self._write_footer()
+            self.flush()
+        finally:
+            self._file.close()
+
+    def _write_header(self):
+        pass
+
+    @abstractmethod
+    def _write_record(self, user: Dict[str, Any]):
+        """Emit one user (already converted to a dict)"""
+
+    def _write_footer(self):
+        self.write_sidecar()
+
+
+class JSONLinesWriter(StreamingUserWriter):
+    """
+    One JSON object per line. Metadata goes to a sidecar file, or with trailer=True into a final
+    {"_metadata": {...}} line.
+    """
+
+    def __init__(self, filepath: str, extra_metadata: Optional[Dict[str, Any]] = None,
+                 buffer_size: int = DEFAULT_WRITE_BUFFER, trailer: bool = False):
+        self.trailer = trailer
+        super().__init__(filepath, extra_metadata, buffer_size)
+
+    def _write_record(self, user: Dict[str, Any]):
+        self._emit(json.dumps(user, ensure_ascii=False) + "\n")
+
+    def _write_footer(self):
+        if self.trailer:
+            self._emit(json.dumps({"_metadata": self.metadata()}, ensure_ascii=False) + "\n")
+        else:
+            self.write_sidecar()
+
+
+class _BufferSink:
+    """File-like adapter so csv writers append to a StreamingUserWriter buffer"""
+
+    def __init__(self, emit):
+        self.write = emit
+
+
+class CSVStreamWriter(StreamingUserWriter):
+    """CSV with the standard user columns; metadata goes to a sidecar file"""
+
+    def _write_header(self):
+        self._writer = csv.DictWriter(_BufferSink(self._emit), fieldnames=USER_FIELDNAMES, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write_record(self, user: Dict[str, Any]):
+        self._writer.writerow(user)
+
+
+class JSONArrayWriter(StreamingUserWriter):
+    """
+    Compact single-document JSON ({"users": [...], "metadata": {...}}) with the same keys as
+    save_to_json; metadata is written after the users since it is only known at the end
+    """
+
+    def _write_header(self):
+        self._emit('{"users":[')
+
+    def _write_record(self, user: Dict[str, Any]):
+        separator = "," if self.count else ""
+        self._emit(separator + json.dumps(user, ensure_ascii=False, separators=(",", ":")))
+
+    def _write_footer(self):
+        self._emit('],"metadata":' + json.dumps(self.metadata(), ensure_ascii=False, separators=(",", ":")) + "}")
+
+
+STREAM_WRITERS = {
+    "jsonl": JSONLinesWriter,
+    "csv": CSVStreamWriter,
+    "json": JSONArrayWriter
+}
+
+
 class DataProcessor:
     def __init__(self, output_dir: str = "./scraped_data/"):
         self.output_dir = output_dir
@@ -47,7 +349,7 @@ class DataProcessor:
                     continue
 
                 # Create user record
-                user_record = UserRecord(
+                user_record = UserRecord.compact(
                     email=email,
                     name=self.clean_text(user_data.get("name")),
                     role=self.clean_text(user_data.get("role")),
@@ -80,7 +382,9 @@ class DataProcessor:
 
         return str(text).strip() if str(text).strip() else None
 
-    def save_to_json(self, users: List[UserRecord], filename: str = None) -> str:
+    def save_to_json(
+        self, users: List[UserRecord], filename: str = None, extra_metadata: Optional[Dict[str, Any]] = None
+    ) -> str:
         """Save user data to JSON file"""
         try:
             if filename is None:
@@ -92,13 +396,17 @@ class DataProcessor:
             # Convert to dictionaries for JSON serialization
             users_dict = [asdict(user) for user in users]
 
+            metadata = {
+                "total_users": len(users),
+                "extracted_at": datetime.now().isoformat(),
+                "format_version": "1.0"
+            }
+            if extra_metadata:
+                metadata.update(extra_metadata)
+
             with open(filepath, 'w', encoding='utf-8') as f:
                 json.dump({
-                    "metadata": {
-                        "total_users": len(users),
-                        "extracted_at": datetime.now().isoformat(),
-                        "format_version": "1.0"
-                    },
+                    "metadata": metadata,
                     "users": users_dict
                 }, f, indent=2, ensure_ascii=False)
 
@@ -122,10 +430,8 @@ class DataProcessor:
                 self.logger.warning("No users to save to CSV")
                 return ""
 
-            fieldnames = ["email", "name", "role", "last_login", "status", "extracted_at", "source_saas"]
-
             with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.DictWriter(csvfile, fieldnames=USER_FIELDNAMES)
                 writer.writeheader()
 
                 for user in users:
@@ -138,6 +444,73 @@ class DataProcessor:
             self.logger.error(f"Error saving to CSV: {str(e)}")
             return ""
 
+    def open_writer(
+        self, fmt: str, filename: str = None, extra_metadata: Optional[Dict[str, Any]] = None, **options
+    ) -> StreamingUserWriter:
+        """
+        Open a streaming writer ("jsonl", "csv" or "json") in the output directory.
+        Use it as a context manager and call write / write_all / write_all_async.
+        """
+        if fmt not in STREAM_WRITERS:
+            raise ValueError(f"Unsupported stream format: {fmt}")
+        if filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"users_data_{timestamp}.{fmt}"
+        return STREAM_WRITERS[fmt](os.path.join(self.output_dir, filename), extra_metadata, **options)
+
+    def stream_users(
+        self, users: Iterable[Union[UserRecord, Dict[str, Any]]], fmt: str = "jsonl",
+        filename: str = None, extra_metadata: Optional[Dict[str, Any]] = None, **options
+    ) -> str:
+        """Stream users from any iterable to a file without materializing them"""
+        try:
+            with self.open_writer(fmt, filename, extra_metadata, **options) as writer:
+                writer.write_all(users)
+            self.logger.info(f"Streamed {writer.count} users to {fmt.upper()}: {writer.filepath}")
+            return writer.filepath
+        except Exception as e:
+            self.logger.error(f"Error streaming users to {fmt}: {str(e)}")
+            return ""
+
+    def publish_output(self, temp_filename: str, filename: str) -> str:
+        """
+        Move a finished stream (and its .meta.json sidecar) from temp_filename to filename in
+        the output directory with os.replace, so the previous file stays intact until the new
+        one is complete. Returns the new path, or "" if there is nothing to publish.
+        """
+        temp_path = os.path.join(self.output_dir, temp_filename)
+        if not os.path.exists(temp_path):
+            return ""
+        filepath = os.path.join(self.output_dir, filename)
+        os.replace(temp_path, filepath)
+        if os.path.exists(temp_path + ".meta.json"):
+            os.replace(temp_path + ".meta.json", filepath + ".meta.json")
+        self.logger.info(f"Published {filepath}")
+        return filepath
+
+    def discard_output(self, temp_filename: str):
+        """Remove an unpublished stream and its sidecar"""
+        temp_path = os.path.join(self.output_dir, temp_filename)
+        for path in (temp_path, temp_path + ".meta.json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def stream_users_async(
+        self, users: AsyncIterable[Union[UserRecord, Dict[str, Any]]], fmt: str = "jsonl",
+        filename: str = None, extra_metadata: Optional[Dict[str, Any]] = None, **options
+    ) -> str:
+        """Stream users from an async iterator (e.g. a scraping pipeline) to a file"""
+        try:
+            with self.open_writer(fmt, filename, extra_metadata, **options) as writer:
+                await writer.write_all_async(users)
+            self.logger.info(f"Streamed {writer.count} users to {fmt.upper()}: {writer.filepath}")
+            return writer.filepath
+        except Exception as e:
+            self.logger.error(f"Error streaming users to {fmt}: {str(e)}")
+            return ""
+
     def load_existing_data(self, filepath: str) -> List[UserRecord]:
         """Load existing user data from file"""
         try:
@@ -149,7 +522,14 @@ class DataProcessor:
                     users_data = data.get('users', [])
 
                     for user_dict in users_data:
-                        users.append(UserRecord(**user_dict))
+                        users.append(UserRecord.compact(**user_dict))
+
+            elif filepath.endswith('.jsonl'):
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        user_dict = json.loads(line) if line.strip() else None
+                        if user_dict and "_metadata" not in user_dict:
+                            users.append(UserRecord.compact(**user_dict))
 
             elif filepath.endswith('.csv'):
                 with open(filepath, 'r', encoding='utf-8') as csvfile:
@@ -159,7 +539,7 @@ class DataProcessor:
                         for key, value in row.items():
                             if value == '' or value == 'None':
                                 row[key] = None
-                        users.append(UserRecord(**row))
+                        users.append(UserRecord.compact(**row))
 
             self.logger.info(f"Loaded {len(users)} users from {filepath}")
             return users
@@ -168,43 +548,129 @@ class DataProcessor:
             self.logger.error(f"Error loading data from {filepath}: {str(e)}")
             return []
 
-    def generate_report(self, users: List[UserRecord]) -> Dict[str, Any]:
-        """Generate summary report of user data"""
+    def load_user_requests(self, filepath: str) -> List[Dict[str, Any]]:
+        """
+        Load users to provision/deprovision from a CSV (email,name,role columns)
+        or JSON file (a list of objects, or {"users": [...]}). A UTF-8 BOM, as written by
+        Excel's "CSV UTF-8" export, is skipped rather than glued onto the first column name.
+        """
         try:
-            if not users:
-                return {"error": "No user data available"}
+            users = []
+
+            if filepath.endswith('.json'):
+                with open(filepath, 'r', encoding='utf-8-sig') as f:
+                    data = json.load(f)
+                    users_data = data.get('users', []) if isinstance(data, dict) else data
+
+            elif filepath.endswith('.csv'):
+                with open(filepath, 'r', newline='', encoding='utf-8-sig') as csvfile:
+                    users_data = list(csv.DictReader(csvfile))
+
+            else:
+                self.logger.error(f"Unsupported input file type: {filepath}")
+                return []
+
+            for user_data in users_data:
+                user = {key: self.clean_text(value) for key, value in user_data.items() if key}
+                user = {key: value for key, value in user.items() if value is not None}
+                if not user.get("email") or "@" not in user["email"]:
+                    self.logger.warning(f"Skipping input row without a valid email: {user_data}")
+                    continue
+                users.append(user)
+
+            self.logger.info(f"Loaded {len(users)} user requests from {filepath}")
+            return users
+
+        except Exception as e:
+            self.logger.error(f"Error loading user requests from {filepath}: {str(e)}")
+            return []
+
+    def save_batch_report(self, results: List[Dict[str, Any]], filename: str = None) -> str:
+        """Save a per-user success/failure/latency report for a batch run (JSON plus CSV)"""
+        try:
+            if filename is None:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"batch_report_{timestamp}.json"
+
+            filepath = os.path.join(self.output_dir, filename)
+            latencies = [result["latency_seconds"] for result in results]
+            succeeded = sum(1 for result in results if result["success"])
+
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "metadata": {
+                        "total_users": len(results),
+                        "succeeded": succeeded,
+                        "failed": len(results) - succeeded,
+                        "total_latency_seconds": round(sum(latencies), 2),
+                        "avg_latency_seconds": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                        "generated_at": datetime.now().isoformat(),
+                        "format_version": "1.0"
+                    },
+                    "results": results
+                }, f, indent=2, ensure_ascii=False)
 
-            # Count by SaaS source
-            saas_counts = {}
-            role_counts = {}
-            status_counts = {}
+            if results:
+                csv_path = os.path.splitext(filepath)[0] + ".csv"
+                fieldnames = ["email", "action", "source_saas", "success", "latency_seconds", "error"]
+                with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+                    writer.writeheader()
+                    writer.writerows(results)
+
+            self.logger.info(f"Saved batch report for {len(results)} users: {filepath}")
+            return filepath
+
+        except Exception as e:
+            self.logger.error(f"Error saving batch report: {str(e)}")
+            return ""
 
-            for user in users:
-                # SaaS source counts
-                saas = user.source_saas or "Unknown"
-                saas_counts[saas] = saas_counts.get(saas, 0) + 1
+    def generate_report(
+        self,
+        users: Union[List[UserRecord], UserBatch],
+        group_by: Optional[List[str]] = None,
+        cross_tabs: Optional[List[List[str]]] = None,
+        distinct: Optional[List[str]] = None,
+        include_dormancy: bool = True,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate summary report of user data.
+        group_by lists the fields broken down individually (default: SaaS, role, status),
+        cross_tabs lists field combinations counted together (e.g. ["source_saas", "role", "status"]),
+        distinct lists fields whose distinct values are counted, and include_dormancy adds
+        last_login age buckets. "dormancy" can also be used as a field in group_by/cross_tabs.
+        Counting runs over the columnar UserBatch encoding; for a list, only the fields the
+        report uses are encoded (see report_engine.RecordColumns).
+        """
+        try:
+            if not users:
+                return {"error": "No user data available"}
 
-                # Role counts
-                role = user.role or "Unknown"
-                role_counts[role] = role_counts.get(role, 0) + 1
+            batch = users if isinstance(users, UserBatch) else RecordColumns(users)
+            engine = UserReportEngine(now=now)
 
-                # Status counts
-                status = user.status or "Unknown"
-                status_counts[status] = status_counts.get(status, 0) + 1
+            breakdown = {}
+            for field in group_by or DEFAULT_REPORT_GROUP_BY:
+                breakdown[REPORT_BREAKDOWN_NAMES.get(field, f"by_{field}")] = engine.group_counts(batch, [field])
 
             report = {
                 "summary": {
-                    "total_users": len(users),
-                    "unique_emails": len(set(user.email for user in users)),
+                    "total_users": len(batch),
+                    "unique_emails": engine.distinct_count(batch, "email"),
                     "report_generated_at": datetime.now().isoformat()
                 },
-                "breakdown": {
-                    "by_saas": saas_counts,
-                    "by_role": role_counts,
-                    "by_status": status_counts
-                },
-                "sample_users": [asdict(user) for user in users[:5]]  # First 5 users as sample
+                "breakdown": breakdown
             }
+            if cross_tabs:
+                report["cross_tabs"] = {
+                    " x ".join(fields): engine.group_counts(batch, fields) for fields in cross_tabs
+                }
+            if distinct:
+                report["distinct_counts"] = {field: engine.distinct_count(batch, field) for field in distinct}
+            if include_dormancy:
+                report["dormancy"] = engine.group_counts(batch, [DORMANCY_FIELD])
+            report["sample_users"] = [asdict(user) for user in batch[:5]]  # First 5 users as sample
 
             return report
 
@@ -212,23 +678,37 @@ class DataProcessor:
             self.logger.error(f"Error generating report: {str(e)}")
             return {"error": f"Report generation failed: {str(e)}"}
 
+    def build_identity_index(
+        self, users: Iterable[UserRecord], roster_emails: Optional[Iterable[str]] = None,
+        domain_aliases: Optional[Dict[str, str]] = None, roster_name: str = "HR roster"
+    ) -> IdentityIndex:
+        """
+        Join users from all SaaS sources into identities by canonical email, optionally adding
+        an HR roster as its own source (for queries like "in SaaS A but not in the roster")
+        """
+        index = IdentityIndex(domain_aliases)
+        index.add_records(users)
+        if roster_emails is not None:
+            index.add_emails(roster_emails, roster_name)
+        self.logger.info(f"Built identity index: {index.get_stats()}")
+        return index
+
     def compare_datasets(self, dataset1: List[UserRecord], dataset2: List[UserRecord]) -> Dict[str, Any]:
-        """Compare two datasets and identify differences"""
+        """
+        Compare two datasets keyed by (source_saas, normalized email): added, removed and
+        users whose name/role/status changed
+        """
         try:
-            emails1 = set(user.email for user in dataset1)
-            emails2 = set(user.email for user in dataset2)
-
-            added_users = emails2 - emails1
-            removed_users = emails1 - emails2
-            common_users = emails1 & emails2
+            diff = DiffEngine().diff(dataset1, dataset2)
 
             comparison = {
                 "dataset1_count": len(dataset1),
                 "dataset2_count": len(dataset2),
-                "added_users": list(added_users),
-                "removed_users": list(removed_users),
-                "common_users_count": len(common_users),
-                "comparison_date": datetime.now().isoformat()
+                "added_users": [user.email for user in diff.added],
+                "removed_users": [user.email for user in diff.removed],
+                "modified_users": diff.modified,
+                "common_users_count": diff.unchanged_count + len(diff.modified),
+                "comparison_date": diff.compared_at
             }
 
             return comparison
@@ -236,3 +716,20 @@ class DataProcessor:
         except Exception as e:
             self.logger.error(f"Error comparing datasets: {str(e)}")
             return {"error": f"Comparison failed: {str(e)}"}
+
+    def append_change_events(self, events: List[Dict[str, Any]], filename: str = "access_changes.jsonl") -> str:
+        """
+        Append access-change events (see SnapshotDiff.to_events) to a JSON Lines audit feed.
+        The batch is written in one call under a lock, so concurrent snapshots never
+        interleave their lines.
+        """
+        try:
+            filepath = os.path.join(self.output_dir, filename)
+            payload = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+            with _CHANGE_FEED_LOCK, open(filepath, 'a', encoding='utf-8') as f:
+                f.write(payload)
+            self.logger.info(f"Appended {len(events)} access-change events to {filepath}")
+            return filepath
+        except Exception as e:
+            self.logger.error(f"Error writing access-change events: {str(e)}")
+            return ""
@@ -0,0 +1,163 @@
+"""
+Diff Engine for user snapshots
+Compares user records keyed by (source_saas, normalized email) and reports added, removed
+and field-level modified users. Stored records carry a 64-bit fingerprint of their fields,
+so unchanged users are skipped with a single integer comparison.
+"""
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from operator import attrgetter
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Sequence
+
+# Fields covered by the stored fingerprint and compared by default. last_login is left out:
+# it changes on every login and is noise for an access-change feed.
+FINGERPRINT_FIELDS = ("name", "role", "status")
+_fingerprint_values = attrgetter(*FINGERPRINT_FIELDS)
+
+RecordKey = Tuple[str, str]
+
+
+def normalize_email(email: Optional[str]) -> str:
+    return (email or "").strip().lower()
+
+
+def record_key(record) -> RecordKey:
+    """(source_saas, normalized email) of a UserRecord-like object"""
+    return (record.source_saas or "", normalize_email(record.email))
+
+
+def record_fingerprint(record) -> int:
+    """Stable signed 64-bit hash of a record's FINGERPRINT_FIELDS (fits a SQLite INTEGER)"""
+    # repr of a tuple of str/None is deterministic across processes, unlike hash()
+    payload = repr(_fingerprint_values(record)).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(payload, digest_size=8).digest(), "big", signed=True)
+
+
+@dataclass
+class SnapshotDiff:
+    """Result of comparing two snapshots"""
+    added: List[Any] = field(default_factory=list)
+    removed: List[Any] = field(default_factory=list)
+    modified: List[Dict[str, Any]] = field(default_factory=list)
+    unchanged_count: int = 0
+    compared_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "modified": len(self.modified),
+            "unchanged": self.unchanged_count,
+            "compared_at": self.compared_at
+        }
+
+    def to_events(self) -> List[Dict[str, Any]]:
+        """Flat access-change events (one per user) for an audit feed"""
+        events = []
+        for change_type, records in (("added", self.added), ("removed", self.removed)):
+            for record in records:
+                events.append({
+                    "type": change_type,
+                    "source_saas": record.source_saas,
+                    "email": record.email,
+                    "role": record.role,
+                    "status": record.status,
+                    "detected_at": self.compared_at
+                })
+        for modification in self.modified:
+            events.append({"type": "modified", **modification, "detected_at": self.compared_at})
+        return events
+
+
+class DiffEngine:
+    """
+    Snapshot comparison keyed by (source_saas, normalized email)
+    """
+
+    def __init__(self, compare_fields: Sequence[str] = FINGERPRINT_FIELDS):
+        self.compare_fields = tuple(compare_fields)
+        self._compared_values = attrgetter(*self.compare_fields)
+        # Stored fingerprints can only rule out changes in the fields they cover
+        self._fingerprint_sufficient = set(self.compare_fields) <= set(FINGERPRINT_FIELDS)
+        self.logger = logging.getLogger(__name__)
+
+    def field_changes(self, old, new) -> Dict[str, Dict[str, Optional[str]]]:
+        """{field: {"old": ..., "new": ...}} for the compared fields that differ"""
+        changes = {}
+        for name in self.compare_fields:
+            old_value, new_value = getattr(old, name), getattr(new, name)
+            if old_value != new_value:
+                changes[name] = {"old": old_value, "new": new_value}
+        return changes
+
+    def _modification(self, old, new) -> Optional[Dict[str, Any]]:
+        changes = self.field_changes(old, new)
+        if not changes:
+            return None
+        return {"source_saas": new.source_saas, "email": new.email, "changes": changes}
+
+    def diff(self, old_records: Iterable[Any], new_records: Iterable[Any]) -> SnapshotDiff:
+        """
+        Compare two in-memory snapshots (lists, UserBatch or any iterable of records).
+        A user listed twice in new_records is diffed once, using the last copy (as the
+        store's upsert keeps it).
+        """
+        # In memory the tuple of compared values serves as the fingerprint; no need to hash it
+        old_index: Dict[RecordKey, Tuple[Any, Any]] = {
+            record_key(record): (self._compared_values(record), record) for record in old_records
+        }
+        new_index: Dict[RecordKey, Any] = {record_key(record): record for record in new_records}
+        result = SnapshotDiff()
+        for key, record in new_index.items():
+            previous = old_index.pop(key, None)
+            if previous is None:
+                result.added.append(record)
+            elif previous[0] == self._compared_values(record):
+                result.unchanged_count += 1
+            else:
+                modification = self._modification(previous[1], record)
+                if modification:
+                    result.modified.append(modification)
+                else:
+                    result.unchanged_count += 1
+        result.removed = [record for _, record in old_index.values()]
+        return result
+
+    def diff_against_store(self, store, source_saas: str, new_records: Iterable[Any]) -> SnapshotDiff:
+        """
+        Incremental diff of a fresh scrape against the current users of source_saas in a
+        UserStore. Only stored fingerprints are loaded up front; full rows are fetched just
+        for users that changed or disappeared (or for every user when compare_fields go
+        beyond FINGERPRINT_FIELDS).
+        """
+        stored = store.fingerprints(source_saas)
+        # Duplicates in the scrape collapse to the last copy, as in diff()
+        new_index: Dict[str, Any] = {normalize_email(record.email): record for record in new_records}
+        result = SnapshotDiff()
+        changed: Dict[str, Any] = {}
+        for email_key, record in new_index.items():
+            previous = stored.pop(email_key, None)
+            if previous is None:
+                result.added.append(record)
+            elif self._fingerprint_sufficient and previous == record_fingerprint(record):
+                result.unchanged_count += 1
+            else:
+                changed[email_key] = record
+
+        old_rows = store.get_users_by_keys(source_saas, list(changed) + list(stored))
+        for email_key, record in changed.items():
+            modification = self._modification(old_rows[email_key], record) if email_key in old_rows else None
+            if modification:
+                result.modified.append(modification)
+            else:
+                result.unchanged_count += 1
+        result.removed = [old_rows[email_key] for email_key in stored if email_key in old_rows]
+
+        self.logger.info(f"Diff for {source_saas}: {result.summary()}")
+        return result
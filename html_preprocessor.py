@@ -0,0 +1,315 @@
+"""
+HTML Preprocessor for shrinking admin portal pages before they are sent to the LLM
+Strips non-semantic nodes and attributes, collapses whitespace and optionally keeps
+only the subtree matching a CSS selector (e.g. the user table)
+"""
+import html
+import re
+import logging
+from html.parser import HTMLParser
+from typing import Dict, List, Any, Optional, Tuple
+
+# Elements whose whole subtree carries no meaning for the LLM
+SKIPPED_ELEMENTS = {
+    "script", "style", "svg", "noscript", "template", "iframe", "canvas",
+    "object", "embed", "video", "audio", "picture"
+}
+
+# Void elements that are simply dropped
+DROPPED_VOID_ELEMENTS = {"link", "meta", "base", "source", "track", "wbr", "img"}
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "source", "track", "wbr"
+}
+
+# Attributes that help the LLM read the page or build CSS selectors
+KEPT_ATTRIBUTES = {
+    "id", "class", "name", "type", "role", "href", "value", "placeholder", "title",
+    "for", "alt", "colspan", "rowspan", "disabled", "checked", "selected",
+    "aria-label", "data-testid", "data-test", "data-qa", "data-cy"
+}
+
+# Elements closed implicitly when a sibling of the listed kind starts
+IMPLICITLY_CLOSED = {
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "tr": {"tr", "td", "th"},
+    "li": {"li"},
+    "option": {"option"},
+    "p": {"p"}
+}
+
+MAX_ATTRIBUTE_LENGTH = 200
+
+# Attributes that identify an element in a page structure signature
+SIGNATURE_ATTRIBUTES = (
+    "id", "class", "name", "type", "role", "aria-label",
+    "data-testid", "data-test", "data-qa", "data-cy"
+)
+
+# Data rows, whose contents change between visits without changing the page's layout
+ROW_ROLES = {"row"}
+
+# Rough chars-per-token ratio used for GPT-style tokenizers on HTML
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate for a piece of text"""
+    return len(text) // CHARS_PER_TOKEN + 1 if text else 0
+
+
+class SimpleSelector:
+    """
+    Matcher for a single compound CSS selector such as
+    ``table.member-list``, ``#users`` or ``div[data-testid='members-table']``.
+    Anything more complex (combinators, pseudo-classes) is not supported.
+    """
+    _PART_RE = re.compile(
+        r"(?P<tag>^[a-zA-Z][\w-]*)|\.(?P<cls>[\w-]+)|#(?P<id>[\w-]+)"
+        r"|\[(?P<attr>[\w-]+)(?:(?P<op>[~^$*|]?=)['\"]?(?P<val>[^'\"\]]*)['\"]?)?\]"
+    )
+
+    def __init__(self, selector: str):
+        self.selector = selector.strip()
+        self.tag: Optional[str] = None
+        self.classes: List[str] = []
+        self.id: Optional[str] = None
+        self.attributes: List[Tuple[str, Optional[str], Optional[str]]] = []
+        self.valid = self._parse()
+
+    def _parse(self) -> bool:
+        position = 0
+        while position < len(self.selector):
+            match = self._PART_RE.match(self.selector, position)
+            if not match or match.end() == position:
+                return False
+            if match.group("tag"):
+                self.tag = match.group("tag").lower()
+            elif match.group("cls"):
+                self.classes.append(match.group("cls"))
+            elif match.group("id"):
+                self.id = match.group("id")
+            else:
+                self.attributes.append((match.group("attr").lower(), match.group("op"), match.group("val")))
+            position = match.end()
+        return bool(self.selector)
+
+    def matches(self, tag: str, attrs: Dict[str, str]) -> bool:
+        if not self.valid:
+            return False
+        if self.tag and self.tag != tag:
+            return False
+        if self.id and attrs.get("id") != self.id:
+            return False
+        if self.classes:
+            element_classes = (attrs.get("class") or "").split()
+            if any(cls not in element_classes for cls in self.classes):
+                return False
+        for name, op, expected in self.attributes:
+            if name not in attrs:
+                return False
+            actual = attrs[name] or ""
+            if op is None:
+                continue
+            if op == "=" and actual != expected:
+                return False
+            if op == "~=" and expected not in actual.split():
+                return False
+            if op == "^=" and not actual.startswith(expected):
+                return False
+            if op == "$=" and not actual.endswith(expected):
+                return False
+            if op == "*=" and expected not in actual:
+                return False
+            if op == "|=" and actual != expected and not actual.startswith(f"{expected}-"):
+                return False
+        return True
+
+
+class _PruningParser(HTMLParser):
+    """Streaming parser that re-serializes only the semantic parts of a document"""
+
+    def __init__(self, root_selector: Optional[SimpleSelector] = None):
+        super().__init__(convert_charrefs=True)
+        self.root_selector = root_selector
+        self.output: List[str] = []
+        self.captured: List[str] = []
+        self.stack: List[str] = []
+        self.skip_tag: Optional[str] = None
+        self.skip_depth = 0
+        self.capture_depth: Optional[int] = None
+
+    def _emit(self, text: str):
+        self.output.append(text)
+        if self.capture_depth is not None:
+            self.captured.append(text)
+
+    def _serialize_start(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> str:
+        parts = [tag]
+        for name, value in attrs:
+            if name not in KEPT_ATTRIBUTES:
+                continue
+            if value is None:
+                parts.append(name)
+                continue
+            value = " ".join(value.split())[:MAX_ATTRIBUTE_LENGTH]
+            parts.append(f'{name}="{html.escape(value, quote=True)}"')
+        return "<" + " ".join(parts) + ">"
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_depth:
+            if tag == self.skip_tag:
+                self.skip_depth += 1
+            return
+        if tag in SKIPPED_ELEMENTS:
+            self.skip_tag = tag
+            self.skip_depth = 1
+            return
+        if tag in DROPPED_VOID_ELEMENTS:
+            return
+
+        closes = IMPLICITLY_CLOSED.get(tag)
+        while closes and self.stack and self.stack[-1] in closes:
+            self._close_top()
+
+        if (self.capture_depth is None and self.root_selector is not None
+                and self.root_selector.matches(tag, {k: v for k, v in attrs})):
+            self.capture_depth = len(self.stack)
+
+        self._emit(self._serialize_start(tag, attrs))
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skip_depth or tag in SKIPPED_ELEMENTS or tag in DROPPED_VOID_ELEMENTS:
+            return
+        self._emit(self._serialize_start(tag, attrs))
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            if tag == self.skip_tag:
+                self.skip_depth -= 1
+            return
+        if tag not in self.stack:
+            return
+
+        # Close any implicitly closed elements (e.g. <td> without </td>)
+        while self.stack:
+            if self._close_top() == tag:
+                break
+
+    def _close_top(self) -> str:
+        open_tag = self.stack.pop()
+        self._emit(f"</{open_tag}>")
+        if self.capture_depth is not None and len(self.stack) <= self.capture_depth:
+            self.capture_depth = None
+        return open_tag
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        text = " ".join(data.split())
+        if text:
+            self._emit(html.escape(text, quote=False))
+
+
+class _StructureParser(HTMLParser):
+    """Collects tags, identifying attributes and text outside table/grid rows"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.row_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.row_depth:
+            if tag not in VOID_ELEMENTS:
+                self.row_depth += 1
+            return
+        attributes = dict(attrs)
+        if tag == "tr" or attributes.get("role") in ROW_ROLES:
+            self.row_depth = 1
+            return
+        kept = "".join(f" {name}={attributes[name]}" for name in SIGNATURE_ATTRIBUTES if attributes.get(name))
+        self.parts.append(f"<{tag}{kept}>")
+
+    def handle_endtag(self, tag):
+        if self.row_depth:
+            self.row_depth -= 1
+
+    def handle_data(self, data):
+        if self.row_depth:
+            return
+        # Counters ("42 members") change with the data, labels don't
+        text = re.sub(r"\d+", "#", " ".join(data.split()))
+        if text:
+            self.parts.append(text)
+
+
+class HTMLPreprocessor:
+    """
+    Shared preprocessing pipeline applied to every page before it reaches the LLM
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.last_stats: Dict[str, Any] = {}
+
+    def process(self, html_content: str, root_selector: Optional[str] = None) -> str:
+        """
+        Prune the HTML and, when root_selector matches, keep only the matching subtree(s).
+        Falls back to the original HTML if pruning fails.
+        """
+        try:
+            if not html_content:
+                return html_content
+
+            selector = SimpleSelector(root_selector) if root_selector else None
+            parser = _PruningParser(selector if selector and selector.valid else None)
+            parser.feed(html_content)
+            parser.close()
+
+            pruned = "".join(parser.captured) if parser.captured else "".join(parser.output)
+            self.last_stats = self.compute_stats(html_content, pruned)
+            self.last_stats["root_selector_matched"] = bool(parser.captured)
+
+            self.logger.info(
+                f"Pruned HTML from {self.last_stats['bytes_before']} to {self.last_stats['bytes_after']} bytes "
+                f"(~{self.last_stats['tokens_before']} -> ~{self.last_stats['tokens_after']} tokens, "
+                f"{self.last_stats['reduction_ratio']}x)"
+            )
+            return pruned
+
+        except Exception as e:
+            self.logger.error(f"Error preprocessing HTML: {str(e)}")
+            return html_content
+
+    def structure_signature(self, html_content: str) -> str:
+        """
+        The page's layout without its data: tags, identifying attributes and text with table
+        and grid rows left out and numbers masked. Two visits to the same admin page give the
+        same signature even though the member list changed.
+        """
+        try:
+            parser = _StructureParser()
+            parser.feed(html_content)
+            parser.close()
+            return "".join(parser.parts)
+        except Exception as e:
+            self.logger.error(f"Error computing page structure signature: {str(e)}")
+            return html_content
+
+    @staticmethod
+    def compute_stats(before: str, after: str) -> Dict[str, Any]:
+        """Size statistics for a preprocessing run"""
+        bytes_before = len(before.encode("utf-8"))
+        bytes_after = len(after.encode("utf-8"))
+        return {
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "tokens_before": estimate_tokens(before),
+            "tokens_after": estimate_tokens(after),
+            "reduction_ratio": round(bytes_before / bytes_after, 1) if bytes_after else 0.0
+        }
@@ -0,0 +1,194 @@
+"""
+Cross-SaaS Identity Index
+Joins user records from every SaaS source into identities keyed by a canonical email
+(lowercased, plus-addressing stripped, domain aliases applied) and keeps the resulting
+sparse identity x SaaS x role matrix as integer-coded arrays for fast entitlement queries
+"""
+import logging
+from array import array
+from typing import Dict, List, Any, Optional, Iterable, Set
+
+
+def canonical_email(email: Optional[str], domain_aliases: Optional[Dict[str, str]] = None) -> str:
+    """
+    Canonical form of an email: lowercased, "+tag" removed from the local part and the
+    domain mapped through domain_aliases (e.g. {"acme.io": "acme.com"})
+    """
+    normalized = (email or "").strip().lower()
+    local, at, domain = normalized.rpartition("@")
+    if not at:
+        return normalized
+    local = local.split("+", 1)[0]
+    if domain_aliases:
+        domain = domain_aliases.get(domain, domain)
+    return f"{local}@{domain}"
+
+
+class _Codes:
+    """Dictionary encoding of labels to consecutive integers"""
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def code(self, label: str) -> int:
+        code = self.index.get(label)
+        if code is None:
+            code = len(self.labels)
+            self.index[label] = code
+            self.labels.append(label)
+        return code
+
+
+class IdentityIndex:
+    """
+    Sparse identity x SaaS x role matrix in coordinate form: three parallel array('I')
+    columns of identity, source and role codes, one entry per added (email, source, role).
+    Per-source identity sets and a role -> source -> identities inverted index are kept up
+    to date on add; per-identity lookups use CSR-style offsets into the entries sorted by
+    identity, rebuilt lazily after new entries arrive.
+    """
+
+    NO_ROLE = ""
+
+    def __init__(self, domain_aliases: Optional[Dict[str, str]] = None):
+        self.domain_aliases = {k.lower(): v.lower() for k, v in (domain_aliases or {}).items()}
+        self.logger = logging.getLogger(__name__)
+        self.identities = _Codes()
+        self.sources = _Codes()
+        self.roles = _Codes()
+        self.identity_ids = array('I')
+        self.source_ids = array('I')
+        self.role_ids = array('I')
+        # Raw emails that canonicalized to something else, per identity code
+        self.variants: Dict[int, Set[str]] = {}
+        self._members: Dict[int, Set[int]] = {}
+        self._role_members: Dict[int, Dict[int, Set[int]]] = {}
+        # Entry positions grouped by identity: entries of identity i are
+        # _entry_order[_offsets[i]:_offsets[i + 1]]
+        self._offsets = array('I')
+        self._entry_order = array('I')
+
+    def __len__(self) -> int:
+        return len(self.identities.labels)
+
+    def add(self, email: str, source: str, role: Optional[str] = None):
+        """Record that email has role (or just access) in source"""
+        key = canonical_email(email, self.domain_aliases)
+        if "@" not in key:
+            return
+        identity = self.identities.code(key)
+        source_id = self.sources.code(source)
+        role_id = self.roles.code((role or self.NO_ROLE).strip())
+        self.identity_ids.append(identity)
+        self.source_ids.append(source_id)
+        self.role_ids.append(role_id)
+        self._members.setdefault(source_id, set()).add(identity)
+        self._role_members.setdefault(role_id, {}).setdefault(source_id, set()).add(identity)
+        raw = email.strip()
+        if raw.lower() != key:
+            self.variants.setdefault(identity, set()).add(raw)
+
+    def add_records(self, records: Iterable[Any], source: Optional[str] = None):
+        """Add UserRecord-like objects (source defaults to each record's source_saas)"""
+        for record in records:
+            self.add(record.email, source or record.source_saas or "Unknown", record.role)
+
+    def add_emails(self, emails: Iterable[str], source: str):
+        """Add a plain list of emails as a source, e.g. the HR roster"""
+        for email in emails:
+            self.add(email, source)
+
+    def _source_members(self, source: str) -> Set[int]:
+        source_id = self.sources.index.get(source)
+        if source_id is None:
+            return set()
+        return self._members.get(source_id, set())
+
+    def _identity_entries(self, identity: int) -> array:
+        """Positions of an identity's entries, via the CSR offsets (rebuilt if entries were added)"""
+        if len(self._entry_order) != len(self.identity_ids):
+            # Counting sort of entry positions by identity code
+            counts = array('I', bytes(4 * (len(self.identities.labels) + 1)))
+            for entry_identity in self.identity_ids:
+                counts[entry_identity + 1] += 1
+            for index in range(1, len(counts)):
+                counts[index] += counts[index - 1]
+            self._offsets = array('I', counts)
+            order = array('I', bytes(4 * len(self.identity_ids)))
+            for position, entry_identity in enumerate(self.identity_ids):
+                order[counts[entry_identity]] = position
+                counts[entry_identity] += 1
+            self._entry_order = order
+        return self._entry_order[self._offsets[identity]:self._offsets[identity + 1]]
+
+    def _labels(self, identity_codes: Iterable[int]) -> List[str]:
+        labels = self.identities.labels
+        return sorted(labels[code] for code in identity_codes)
+
+    def with_role(self, role_substring: str, source: Optional[str] = None) -> List[str]:
+        """Identities holding a role containing role_substring (case-insensitive), anywhere or in one source"""
+        needle = role_substring.lower()
+        source_id = self.sources.index.get(source) if source is not None else None
+        if source is not None and source_id is None:
+            return []
+        identities: Set[int] = set()
+        for code, label in enumerate(self.roles.labels):
+            if needle not in label.lower():
+                continue
+            by_source = self._role_members.get(code, {})
+            if source_id is None:
+                for members in by_source.values():
+                    identities |= members
+            else:
+                identities |= by_source.get(source_id, set())
+        return self._labels(identities)
+
+    def present_in(self, source: str) -> List[str]:
+        return self._labels(self._source_members(source))
+
+    def in_source_not_in(self, source: str, other: str) -> List[str]:
+        """Identities present in source but missing from other (e.g. a SaaS app vs the HR roster)"""
+        return self._labels(self._source_members(source) - self._source_members(other))
+
+    def in_all(self, sources: List[str]) -> List[str]:
+        """Identities present in every listed source"""
+        if not sources:
+            return []
+        members = set(self._source_members(sources[0]))
+        for source in sources[1:]:
+            members &= self._source_members(source)
+        return self._labels(members)
+
+    def entitlements(self, email: str) -> Dict[str, List[str]]:
+        """source -> roles held by the identity behind an email (any alias of it)"""
+        identity = self.identities.index.get(canonical_email(email, self.domain_aliases))
+        if identity is None:
+            return {}
+        result: Dict[str, List[str]] = {}
+        for position in self._identity_entries(identity):
+            roles = result.setdefault(self.sources.labels[self.source_ids[position]], [])
+            role = self.roles.labels[self.role_ids[position]]
+            if role and role not in roles:
+                roles.append(role)
+        return result
+
+    def matrix(self) -> Dict[str, Any]:
+        """The coordinate arrays and their label tables"""
+        return {
+            "identity_ids": self.identity_ids,
+            "source_ids": self.source_ids,
+            "role_ids": self.role_ids,
+            "identities": self.identities.labels,
+            "sources": self.sources.labels,
+            "roles": self.roles.labels
+        }
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "identities": len(self.identities.labels),
+            "sources": len(self.sources.labels),
+            "roles": len(self.roles.labels),
+            "entitlements": len(self.identity_ids),
+            "merged_aliases": sum(len(variants) for variants in self.variants.values())
+        }
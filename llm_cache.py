@@ -0,0 +1,136 @@
+"""
+Content-addressed response cache for LLM calls
+Stores results in SQLite keyed by a hash of (method, model, temperature, normalized HTML, task prompt)
+with TTL expiry and size-bounded LRU eviction
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional
+
+
+class LLMResponseCache:
+    """
+    Persistent cache for AIAgent results, safe to share between threads
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int = 86400, max_entries: int = 5000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.logger = logging.getLogger(__name__)
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache(last_accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(method: str, model: str, temperature: float, html_content: str, prompt: str) -> str:
+        """Hash the inputs that determine an LLM response"""
+        normalized_html = " ".join((html_content or "").split())
+        payload = json.dumps([method, model, temperature, normalized_html, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET last_accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return json.loads(value)
+
+    def set(self, key: str, value: Any, method: str = ""):
+        """Store a JSON-serializable value and evict least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, method, value, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, method, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self.stats["writes"] += 1
+
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+            overflow = count - self.max_entries
+            if self.max_entries and overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_accessed ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.stats["evictions"] += overflow
+            self._conn.commit()
+
+    def delete(self, key: str) -> bool:
+        """Drop one entry, e.g. an answer that turned out to be wrong"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            if cursor.rowcount:
+                self.stats["invalidations"] += 1
+            return cursor.rowcount > 0
+
+    def purge_expired(self) -> int:
+        """Delete all entries older than the TTL"""
+        if not self.ttl_seconds:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            self.stats["expired"] += cursor.rowcount
+            return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current size"""
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": size,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
@@ -5,23 +5,45 @@ This is the main entry point for the application.
 import os
 import asyncio
 import json
+import time
 import argparse
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
 # Import from our modules
-from config import SAAS_CONFIGS, SETTINGS
-from browser_automation import BrowserAutomationHandler
-from ai_agent import AIAgent
+from config import SAAS_CONFIGS, SETTINGS, SaaSConfig
+from browser_automation import BrowserAutomationHandler, DIALOG_SELECTOR
+from ai_agent import AsyncAIAgent
 from data_processor import DataProcessor, UserRecord
+from api_response_mapper import APIResponseMapper
+from selector_store import SelectorStore
+from user_store import UserStore
+from diff_engine import DiffEngine
+from snapshot_archive import SnapshotArchive
+from pipeline import AsyncPipeline, StageStats
+
+# Fields of an already-seen user that a later duplicate may fill in
+MERGEABLE_FIELDS = ("name", "role", "last_login", "status")
+
+# run_scrape_pipeline streams here; persist_snapshot moves it over {saas_id}_users.jsonl
+PIPELINE_JSONL_TEMP = "{saas_id}_users.jsonl.tmp"
 
 class SaaSAutomationOrchestrator:
     def __init__(self, openai_api_key: str):
         """Initialize the orchestrator with required components"""
         self.browser_handler = BrowserAutomationHandler()
-        self.ai_agent = AIAgent(api_key=openai_api_key)
+        self.ai_agent = AsyncAIAgent(api_key=openai_api_key)
         self.data_processor = DataProcessor(output_dir=SETTINGS["data_output_dir"])
+        self.selector_store = SelectorStore(os.path.join(SETTINGS["data_output_dir"], "selector_store.json"))
+        self.api_mapper = APIResponseMapper()
+        self.user_store = UserStore(SETTINGS["user_store_path"])
+        self.diff_engine = DiffEngine()
+        self.snapshot_archive = SnapshotArchive(
+            SETTINGS["snapshot_archive_path"], rebase_every=SETTINGS["archive_rebase_every"]
+        )
+        # Per-stage counters of the scrape pipeline, accumulated over every tenant
+        self.stage_stats: Dict[str, StageStats] = {}
 
         # Setup logging
         self.setup_logging()
@@ -45,12 +67,90 @@ class SaaSAutomationOrchestrator:
 
     async def cleanup(self):
         """Clean up resources"""
+        cache_stats = self.ai_agent.get_cache_stats()
+        if cache_stats:
+            self.logger.info(f"LLM cache stats: {cache_stats}")
+        self.logger.info(f"OpenAI rate governor stats: {self.ai_agent.governor.get_stats()}")
+        if self.browser_handler.pool:
+            self.logger.info(f"Browser context pool stats: {self.browser_handler.pool.get_stats()}")
+        self.logger.info(f"Resource blocking stats: {self.browser_handler.resource_blocker.get_stats()}")
+        readiness_stats = self.browser_handler.readiness.get_stats()
+        if readiness_stats:
+            self.logger.info(f"Readiness wait stats: {readiness_stats}")
+        if self.stage_stats:
+            self.logger.info(f"Scrape pipeline stage stats: {self.get_pipeline_stats()}")
+        self.logger.info(f"User store stats: {self.user_store.get_stats()}")
+        self.user_store.close()
+        self.logger.info(f"Snapshot archive stats: {self.snapshot_archive.get_stats()}")
+        self.snapshot_archive.close()
+        await self.ai_agent.aclose()
         await self.browser_handler.cleanup()
 
-    async def scrape_users(self, saas_id: str, credentials: Dict[str, str]) -> List[UserRecord]:
+    async def click_learned_element(
+        self, browser_handler: BrowserAutomationHandler, saas_id: str, task: str, task_description: str,
+        fallback_selectors: Optional[List[str]] = None, context: Optional[Dict[str, str]] = None
+    ) -> Optional[str]:
+        """
+        Click the element for a task, trying stored selectors first and asking the AI only
+        when all of them fail. Every candidate is probed with a short timeout, so stale
+        selectors cost seconds rather than the full page timeout. Returns the selector that
+        worked, or None.
+        """
+        probe_timeout = SETTINGS["selector_probe_timeout"]
+        candidates = self.selector_store.get_selectors(saas_id, task, context)
+        for selector in fallback_selectors or []:
+            if selector and selector not in candidates:
+                candidates.append(selector)
+
+        for selector in candidates:
+            if await browser_handler.click_element(
+                selector, config=SAAS_CONFIGS.get(saas_id), timeout=probe_timeout
+            ):
+                self.selector_store.record_success(saas_id, task, selector, context)
+                return selector
+            self.selector_store.record_failure(saas_id, task, selector, context)
+
+        if candidates:
+            self.logger.warning(f"Stored selectors failed for '{task}', using AI")
+        page_content = await browser_handler.extract_page_content()
+        for _ in range(2):
+            ui_elements = await self.ai_agent.find_ui_elements(page_content, task_description)
+            if not ui_elements or "primary_selector" not in ui_elements:
+                return None
+
+            ai_selectors = [ui_elements["primary_selector"]] + list(ui_elements.get("alternative_selectors") or [])
+            ai_selectors = [selector for selector in ai_selectors if selector and selector not in candidates]
+            self.selector_store.add_candidates(saas_id, task, ai_selectors, context)
+
+            for selector in ai_selectors:
+                if await browser_handler.click_element(
+                    selector, config=SAAS_CONFIGS.get(saas_id), timeout=probe_timeout
+                ):
+                    self.selector_store.record_success(saas_id, task, selector, context)
+                    return selector
+                self.selector_store.record_failure(saas_id, task, selector, context)
+            candidates.extend(ai_selectors)
+
+            # None of the AI's selectors worked, so don't let its (cached) answer be reused
+            self.ai_agent.forget_ui_elements(page_content, task_description)
+            if ai_selectors:
+                break
+            # Every suggestion had already been tried: it was a stale cached answer, ask again
+
+        return None
+
+    async def scrape_users(
+        self, saas_id: str, credentials: Dict[str, str],
+        browser_handler: Optional[BrowserAutomationHandler] = None
+    ) -> List[UserRecord]:
         """
         Main workflow for scraping users from a SaaS portal
         """
+        if browser_handler is None:
+            # Borrow a pooled context/page for the duration of this workflow
+            async with self.browser_handler.borrow() as browser_handler:
+                return await self.scrape_users(saas_id, credentials, browser_handler)
+
         try:
             # Get SaaS configuration
             if saas_id not in SAAS_CONFIGS:
@@ -60,8 +160,9 @@ class SaaSAutomationOrchestrator:
             saas_config = SAAS_CONFIGS[saas_id]
             self.logger.info(f"Starting user scraping workflow for {saas_config.name}")
 
-            # Login to SaaS portal
-            login_success = await self.browser_handler.login_to_saas(
+            # Login to SaaS portal (reusing a saved session when possible)
+            login_success = await browser_handler.ensure_logged_in(
+                saas_id,
                 saas_config, 
                 credentials.get("username", ""),
                 credentials.get("password", "")
@@ -71,46 +172,257 @@ class SaaSAutomationOrchestrator:
                 self.logger.error(f"Login failed for {saas_config.name}")
                 return []
 
-            # Navigate to users page
-            nav_success = await self.browser_handler.navigate_to_users_page(saas_config)
+            # Listen for the portal's own member-list API responses while the page loads
+            use_api = bool(saas_config.user_api_response_pattern and saas_config.user_api_mapping)
+            if use_api:
+                browser_handler.start_api_capture(saas_config.user_api_response_pattern)
+
+            # Navigate to users page (reloading if needed so the API calls are seen)
+            nav_success = await browser_handler.navigate_to_users_page(saas_config, reload=use_api)
             if not nav_success:
                 self.logger.error(f"Failed to navigate to users page for {saas_config.name}")
-                return []
-
-            # Extract page content
-            html_content = await self.browser_handler.extract_page_content()
-            if not html_content:
-                self.logger.error("Failed to extract page content")
+                await browser_handler.stop_api_capture()
                 return []
 
             # Take screenshot for debugging
-            await self.browser_handler.take_screenshot(f"{saas_id}_users_page")
-
-            # Use AI to extract user data
-            raw_users = self.ai_agent.extract_users_from_html(html_content, saas_config.name)
-            if not raw_users:
+            await browser_handler.take_screenshot(f"{saas_id}_users_page")
+
+            raw_users, pages, extraction, failed_pages = [], 0, None, 0
+            if use_api:
+                raw_users, pages = await self.collect_api_users(browser_handler, saas_config)
+                if raw_users:
+                    extraction = {"path": "api_capture", "saas_name": saas_config.name, "users": len(raw_users)}
+                else:
+                    self.logger.warning(f"No users captured from the {saas_config.name} API, parsing the page instead")
+                    # Pagination was already driven, so start again from the first page
+                    await browser_handler.navigate_to_users_page(saas_config, reload=True)
+
+            if raw_users:
+                processed_users = self.data_processor.process_raw_user_data(raw_users, saas_config.name)
+            else:
+                # Fetch, prune, extract, normalize and persist pages as a pipeline
+                processed_users, pages, failed_pages = await self.run_scrape_pipeline(
+                    browser_handler, saas_id, saas_config
+                )
+                extraction = self.ai_agent.summarize_extractions(saas_config.name)
+            if not processed_users:
                 self.logger.error("AI failed to extract user data")
+                self.data_processor.discard_output(PIPELINE_JSONL_TEMP.format(saas_id=saas_id))
                 return []
 
-            # Process extracted data
-            processed_users = self.data_processor.process_raw_user_data(raw_users, saas_config.name)
+            # A page or LLM request that failed (or came back empty) means users may be missing,
+            # and storing that as a snapshot would report them all as removed
+            complete = not (failed_pages or extraction.get("failed_requests") or extraction.get("empty_pages"))
+            if not complete:
+                self.logger.warning(
+                    f"Scrape of {saas_config.name} is incomplete ({failed_pages} failed page(s), "
+                    f"extraction {extraction}), not recording it as a snapshot"
+                )
 
-            # Save data
-            self.data_processor.save_to_json(processed_users, f"{saas_id}_users.json")
-            self.data_processor.save_to_csv(processed_users, f"{saas_id}_users.csv")
+            # Snapshot-level writes run in a worker thread so other tenants' pipelines keep moving
+            await asyncio.to_thread(
+                self.persist_snapshot, saas_id, saas_config, processed_users,
+                {"extraction": extraction, "pages_harvested": pages, "failed_pages": failed_pages,
+                 "complete": complete}
+            )
 
             return processed_users
 
         except Exception as e:
             self.logger.error(f"Error in scrape_users workflow: {str(e)}")
+            await browser_handler.stop_api_capture()
             return []
 
+    async def collect_api_users(
+        self, browser_handler: BrowserAutomationHandler, saas_config: SaaSConfig
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Drive pagination so every page's API request fires, then map the captured JSON
+        payloads with the SaaS mapping spec. Returns the users (deduplicated by email)
+        and the number of pages visited.
+        """
+        started = time.perf_counter()
+        pages = 0
+        try:
+            async for _ in browser_handler.harvest_pages(saas_config):
+                pages += 1
+        except Exception as e:
+            self.logger.error(f"Error paging through {saas_config.name}: {str(e)}")
+        payloads = await browser_handler.stop_api_capture()
+
+        users = AsyncAIAgent.merge_user_lists(
+            [self.api_mapper.map_payloads(payloads, saas_config.user_api_mapping)]
+        )
+        self.logger.info(
+            f"Read {len(users)} users for {saas_config.name} from {len(payloads)} API response(s) "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return users, pages
+
+    async def run_scrape_pipeline(
+        self, browser_handler: BrowserAutomationHandler, saas_id: str, saas_config: SaaSConfig
+    ) -> Tuple[List[UserRecord], int, int]:
+        """
+        Staged pipeline over the member list: fetch -> prune -> extract -> normalize -> persist,
+        with bounded queues between stages so the browser keeps paging while earlier pages
+        are pruned, sent to the LLM and streamed to PIPELINE_JSONL_TEMP, which persist_snapshot
+        publishes once the scrape is done (the previous {saas_id}_users.jsonl stays intact until
+        then). While running, a later line for an email supersedes earlier ones; when done the
+        file holds exactly the merged users. Stage counters are accumulated in self.stage_stats. Returns the users
+        (deduplicated by email), the number of pages fetched and the number of pages dropped
+        by a failing stage (or 1 if the browser failed while paging).
+        """
+        pipeline = AsyncPipeline(saas_id, queue_size=SETTINGS["harvest_queue_size"], stats=self.stage_stats)
+        users: Dict[str, UserRecord] = {}
+        pages = 0
+        merged_after_write = False
+        # Start the per-page extraction log and failure count from scratch for this scrape
+        self.ai_agent.reset_extractions(saas_config.name)
+
+        async def fetch():
+            nonlocal pages
+            async for page_html in browser_handler.harvest_pages(saas_config):
+                pages += 1
+                yield page_html
+
+        async def prune(page_html: str) -> str:
+            # HTML parsing is CPU-bound, so it runs in a worker thread
+            return await asyncio.to_thread(
+                self.ai_agent.prepare_html, page_html, saas_config.user_table_selector
+            )
+
+        async def extract(page_html: str) -> List[Dict[str, Any]]:
+            return await self.ai_agent.extract_users_from_html(page_html, saas_config.name, prepruned=True)
+
+        async def normalize(raw_users: List[Dict[str, Any]]) -> Optional[List[UserRecord]]:
+            # First occurrence of an email wins; later duplicates only fill its missing fields,
+            # and a record that gained fields is emitted again so persist writes the merged values
+            nonlocal merged_after_write
+            changed_users = []
+            changed_keys = set()
+            for record in self.data_processor.process_raw_user_data(raw_users, saas_config.name):
+                key = record.email.strip().lower()
+                existing = users.get(key)
+                if existing is None:
+                    users[key] = record
+                    changed_users.append(record)
+                    changed_keys.add(key)
+                    continue
+                filled = False
+                for name in MERGEABLE_FIELDS:
+                    value = getattr(record, name)
+                    if getattr(existing, name) in (None, "Unknown") and value not in (None, "Unknown"):
+                        setattr(existing, name, value)
+                        filled = True
+                if filled and key not in changed_keys:
+                    changed_users.append(existing)
+                    changed_keys.add(key)
+                    merged_after_write = True
+            return changed_users or None
+
+        pipeline.add_stage("prune", prune, workers=SETTINGS["pipeline_prune_workers"])
+        pipeline.add_stage("extract", extract, workers=SETTINGS["harvest_extract_workers"])
+        pipeline.add_stage("normalize", normalize)
+
+        temp_name = PIPELINE_JSONL_TEMP.format(saas_id=saas_id)
+        try:
+            with self.data_processor.open_writer("jsonl", temp_name) as writer:
+                async def persist(changed_users: List[UserRecord]) -> int:
+                    return writer.write_all(changed_users)
+
+                pipeline.add_stage("persist", persist)
+                await pipeline.run(fetch())
+            if merged_after_write:
+                # Replace the superseded lines so the file matches the JSON/CSV exports and the store
+                await asyncio.to_thread(
+                    self.data_processor.stream_users, list(users.values()), "jsonl", temp_name
+                )
+        except BaseException:
+            self.data_processor.discard_output(temp_name)
+            raise
+
+        self.logger.info(
+            f"Extracted {len(users)} unique users from {pages} page(s) of {saas_config.name}"
+            + (f", {pipeline.failed} page(s) failed" if pipeline.failed else "")
+        )
+        return list(users.values()), pages, pipeline.failed
+
+    def persist_snapshot(
+        self, saas_id: str, saas_config: SaaSConfig, users: List[UserRecord], metadata: Dict[str, Any]
+    ):
+        """
+        Write the finished scrape: JSONL/JSON/CSV exports, access-change events since the previous
+        scrape, the user store snapshot and the history archive. An incomplete scrape
+        (metadata["complete"] is False) is only exported, to {saas_id}_users.partial.*, leaving
+        the previous exports, the change feed, the store and the archive untouched.
+        """
+        if not metadata.get("complete", True):
+            self.data_processor.publish_output(
+                PIPELINE_JSONL_TEMP.format(saas_id=saas_id), f"{saas_id}_users.partial.jsonl"
+            )
+            self.data_processor.save_to_json(users, f"{saas_id}_users.partial.json", extra_metadata=metadata)
+            self.data_processor.save_to_csv(users, f"{saas_id}_users.partial.csv")
+            return
+
+        # The pipeline's JSONL stream (no-op for an API capture scrape)
+        self.data_processor.publish_output(PIPELINE_JSONL_TEMP.format(saas_id=saas_id), f"{saas_id}_users.jsonl")
+
+        # Save data, recording which extraction path produced it
+        self.data_processor.save_to_json(users, f"{saas_id}_users.json", extra_metadata=metadata)
+        self.data_processor.save_to_csv(users, f"{saas_id}_users.csv")
+        # Record access changes since the previous scrape before storing this one
+        if self.user_store.latest_snapshot_id(saas_config.name) is not None:
+            diff = self.diff_engine.diff_against_store(self.user_store, saas_config.name, users)
+            if diff.has_changes:
+                self.data_processor.append_change_events(diff.to_events(), SETTINGS["access_change_feed"])
+        self.user_store.save_snapshot(users, saas_config.name, saas_id=saas_id, metadata=metadata)
+        self.snapshot_archive.append(saas_config.name, users)
+
+    def get_pipeline_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Throughput and queue depth of each scrape pipeline stage"""
+        return {name: stats.to_dict() for name, stats in self.stage_stats.items()}
+
+    async def scrape_many(
+        self, targets: Dict[str, Dict[str, str]], max_concurrency: Optional[int] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Scrape several SaaS portals concurrently. Each target runs in its own isolated
+        pooled BrowserContext on the shared browser; at most max_concurrency run at once.
+        Returns per-target users, timing and status.
+        """
+        max_concurrency = max_concurrency or SETTINGS["max_concurrent_scrapes"]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def scrape_target(saas_id: str, credentials: Dict[str, str]) -> Dict[str, Any]:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    async with self.browser_handler.borrow() as handler:
+                        users = await self.scrape_users(saas_id, credentials, browser_handler=handler)
+                except Exception as e:
+                    self.logger.error(f"Error scraping {saas_id}: {str(e)}")
+                    users = []
+                duration = round(time.perf_counter() - started, 2)
+                self.logger.info(f"Scraped {len(users)} users from {saas_id} in {duration}s")
+                return {"users": users, "duration_seconds": duration, "success": bool(users)}
+
+        self.logger.info(f"Scraping {len(targets)} SaaS targets with concurrency {max_concurrency}")
+        results = await asyncio.gather(
+            *(scrape_target(saas_id, credentials) for saas_id, credentials in targets.items())
+        )
+        return dict(zip(targets.keys(), results))
+
     async def provision_user(
-        self, saas_id: str, credentials: Dict[str, str], user_details: Dict[str, Any]
+        self, saas_id: str, credentials: Dict[str, str], user_details: Dict[str, Any],
+        browser_handler: Optional[BrowserAutomationHandler] = None
     ) -> bool:
         """
         Workflow for provisioning a new user
         """
+        if browser_handler is None:
+            async with self.browser_handler.borrow() as browser_handler:
+                return await self.provision_user(saas_id, credentials, user_details, browser_handler)
+
         try:
             if saas_id not in SAAS_CONFIGS:
                 self.logger.error(f"Unknown SaaS ID: {saas_id}")
@@ -119,8 +431,9 @@ class SaaSAutomationOrchestrator:
             saas_config = SAAS_CONFIGS[saas_id]
             self.logger.info(f"Starting user provisioning for {saas_config.name}")
 
-            # Login to SaaS portal
-            login_success = await self.browser_handler.login_to_saas(
+            # Login to SaaS portal (reusing a saved session when possible)
+            login_success = await browser_handler.ensure_logged_in(
+                saas_id,
                 saas_config, 
                 credentials.get("username", ""),
                 credentials.get("password", "")
@@ -131,37 +444,44 @@ class SaaSAutomationOrchestrator:
                 return False
 
             # Navigate to users page
-            nav_success = await self.browser_handler.navigate_to_users_page(saas_config)
+            nav_success = await browser_handler.navigate_to_users_page(saas_config)
             if not nav_success:
                 self.logger.error(f"Failed to navigate to users page for {saas_config.name}")
                 return False
 
+            return await self.add_user_on_users_page(browser_handler, saas_id, user_details)
+
+        except Exception as e:
+            self.logger.error(f"Error in provision_user workflow: {str(e)}")
+            return False
+
+    async def add_user_on_users_page(
+        self, browser_handler: BrowserAutomationHandler, saas_id: str, user_details: Dict[str, Any]
+    ) -> bool:
+        """
+        Provisioning steps run on an already open users page (shared by single and batch provisioning)
+        """
+        try:
+            saas_config = SAAS_CONFIGS[saas_id]
+
             # Get page state before action for later comparison
-            before_html = await self.browser_handler.extract_page_content()
+            before_html = await browser_handler.extract_page_content()
 
             # Find and click "Add User" button
-            # We first try the predefined selector, but if it fails, we use AI to find it
-            add_user_success = await self.browser_handler.click_element(saas_config.add_user_button)
-
-            if not add_user_success:
-                self.logger.warning("Failed to find add user button with predefined selector, using AI")
-                page_content = await self.browser_handler.extract_page_content()
-                ui_elements = self.ai_agent.find_ui_elements(
-                    page_content, 
-                    f"Find the button to add a new user in the {saas_config.name} admin portal"
-                )
-
-                if ui_elements and "primary_selector" in ui_elements:
-                    add_user_success = await self.browser_handler.click_element(
-                        ui_elements["primary_selector"]
-                    )
+            # Learned selectors and the predefined one are tried first, AI is the last resort
+            add_user_selector = await self.click_learned_element(
+                browser_handler, saas_id, "add_user_button",
+                f"Find the button to add a new user in the {saas_config.name} admin portal",
+                fallback_selectors=[saas_config.add_user_button]
+            )
 
-                if not add_user_success:
-                    self.logger.error("Failed to find and click add user button")
-                    return False
+            if not add_user_selector:
+                self.logger.error("Failed to find and click add user button")
+                return False
 
             # Wait for the form to appear
-            await asyncio.sleep(2)  # Simple wait to ensure form is loaded
+            form_selector = next(iter(saas_config.user_form_selectors.values()), None)
+            await browser_handler.wait_for_ready("user_form", selector=form_selector)
 
             # Generate form data
             form_data = {}
@@ -170,39 +490,42 @@ class SaaSAutomationOrchestrator:
                     form_data[selector] = user_details[field]
 
             # Fill the form
-            form_fill_success = await self.browser_handler.fill_form(form_data)
+            form_fill_success = await browser_handler.fill_form(form_data)
             if not form_fill_success:
                 self.logger.error("Failed to fill user form")
                 return False
 
+            # Remember the table size (and watch for the portal's API call) to detect completion
+            row_count = await browser_handler.count_rows(saas_config.user_table_selector)
+            response_future = None
+            if saas_config.user_mutation_response_pattern:
+                response_future = browser_handler.watch_response(saas_config.user_mutation_response_pattern)
+
             # Submit the form (find and click submit button)
-            # Using AI to find submit button
-            page_content = await self.browser_handler.extract_page_content()
-            submit_ui = self.ai_agent.find_ui_elements(
-                page_content, 
+            submit_selector = await self.click_learned_element(
+                browser_handler, saas_id, "submit_user_form",
                 "Find the submit or save button for the user form"
             )
 
-            if submit_ui and "primary_selector" in submit_ui:
-                submit_success = await self.browser_handler.click_element(
-                    submit_ui["primary_selector"]
-                )
-
-                if not submit_success:
-                    self.logger.error("Failed to click submit button")
-                    return False
-            else:
-                self.logger.error("Could not find submit button")
+            if not submit_selector:
+                if response_future:
+                    response_future.cancel()
+                self.logger.error("Could not find or click submit button")
                 return False
 
             # Wait for the action to complete
-            await asyncio.sleep(3)
+            await browser_handler.wait_for_ready(
+                "user_added",
+                table_selector=saas_config.user_table_selector,
+                previous_row_count=row_count,
+                response_future=response_future
+            )
 
             # Get page state after action
-            after_html = await self.browser_handler.extract_page_content()
+            after_html = await browser_handler.extract_page_content()
 
             # Validate if user was added successfully
-            success = self.ai_agent.validate_action_success(
+            success = await self.ai_agent.validate_action_success(
                 before_html, 
                 after_html, 
                 f"Adding user {user_details.get('email', 'unknown')}"
@@ -216,15 +539,20 @@ class SaaSAutomationOrchestrator:
             return success
 
         except Exception as e:
-            self.logger.error(f"Error in provision_user workflow: {str(e)}")
+            self.logger.error(f"Error in add_user_on_users_page: {str(e)}")
             return False
 
     async def deprovision_user(
-        self, saas_id: str, credentials: Dict[str, str], user_email: str
+        self, saas_id: str, credentials: Dict[str, str], user_email: str,
+        browser_handler: Optional[BrowserAutomationHandler] = None
     ) -> bool:
         """
         Workflow for deprovisioning/removing a user
         """
+        if browser_handler is None:
+            async with self.browser_handler.borrow() as browser_handler:
+                return await self.deprovision_user(saas_id, credentials, user_email, browser_handler)
+
         try:
             if saas_id not in SAAS_CONFIGS:
                 self.logger.error(f"Unknown SaaS ID: {saas_id}")
@@ -233,8 +561,9 @@ class SaaSAutomationOrchestrator:
             saas_config = SAAS_CONFIGS[saas_id]
             self.logger.info(f"Starting user deprovisioning for {user_email} in {saas_config.name}")
 
-            # Login to SaaS portal
-            login_success = await self.browser_handler.login_to_saas(
+            # Login to SaaS portal (reusing a saved session when possible)
+            login_success = await browser_handler.ensure_logged_in(
+                saas_id,
                 saas_config, 
                 credentials.get("username", ""),
                 credentials.get("password", "")
@@ -245,66 +574,81 @@ class SaaSAutomationOrchestrator:
                 return False
 
             # Navigate to users page
-            nav_success = await self.browser_handler.navigate_to_users_page(saas_config)
+            nav_success = await browser_handler.navigate_to_users_page(saas_config)
             if not nav_success:
                 self.logger.error(f"Failed to navigate to users page for {saas_config.name}")
                 return False
 
-            # Get page state before action for later comparison
-            before_html = await self.browser_handler.extract_page_content()
-
-            # Use AI to find the user row and delete button
-            user_row_info = self.ai_agent.find_ui_elements(
-                before_html,
-                f"Find the row or entry for user with email {user_email}"
-            )
+            return await self.remove_user_on_users_page(browser_handler, saas_id, user_email)
 
-            if not user_row_info or "primary_selector" not in user_row_info:
-                self.logger.error(f"Could not find user row for {user_email}")
-                return False
+        except Exception as e:
+            self.logger.error(f"Error in deprovision_user workflow: {str(e)}")
+            return False
 
-            # Click on the user row (if needed)
-            await self.browser_handler.click_element(user_row_info["primary_selector"])
+    async def remove_user_on_users_page(
+        self, browser_handler: BrowserAutomationHandler, saas_id: str, user_email: str
+    ) -> bool:
+        """
+        Deprovisioning steps run on an already open users page (shared by single and batch deprovisioning)
+        """
+        try:
+            saas_config = SAAS_CONFIGS[saas_id]
 
-            # Now find the delete/remove button for this user
-            updated_html = await self.browser_handler.extract_page_content()
-            delete_button_info = self.ai_agent.find_ui_elements(
-                updated_html,
-                f"Find the delete, remove, or deactivate button for user {user_email}"
+            # Get page state before action for later comparison
+            before_html = await browser_handler.extract_page_content()
+
+            # Find and click the user row, then its delete button
+            # (learned selectors first, AI only when they fail)
+            user_context = {"email": user_email}
+            user_row_selector = await self.click_learned_element(
+                browser_handler, saas_id, "user_row",
+                f"Find the row or entry for user with email {user_email}",
+                context=user_context
             )
 
-            if not delete_button_info or "primary_selector" not in delete_button_info:
-                self.logger.error(f"Could not find delete button for {user_email}")
+            if not user_row_selector:
+                self.logger.error(f"Could not find user row for {user_email}")
                 return False
 
-            # Click the delete button
-            delete_click_success = await self.browser_handler.click_element(
-                delete_button_info["primary_selector"]
+            # Remember the table size (and watch for the portal's API call) to detect completion
+            row_count = await browser_handler.count_rows(saas_config.user_table_selector)
+            response_future = None
+            if saas_config.user_mutation_response_pattern:
+                response_future = browser_handler.watch_response(saas_config.user_mutation_response_pattern)
+
+            delete_selector = await self.click_learned_element(
+                browser_handler, saas_id, "delete_user_button",
+                f"Find the delete, remove, or deactivate button for user {user_email}",
+                context=user_context
             )
 
-            if not delete_click_success:
-                self.logger.error(f"Failed to click delete button for {user_email}")
+            if not delete_selector:
+                if response_future:
+                    response_future.cancel()
+                self.logger.error(f"Could not find or click delete button for {user_email}")
                 return False
 
-            # Handle confirmation dialog if present
-            await asyncio.sleep(1)
-            dialog_html = await self.browser_handler.extract_page_content()
-            confirm_button_info = self.ai_agent.find_ui_elements(
-                dialog_html,
-                "Find the confirm, yes, or ok button in the confirmation dialog"
-            )
-
-            if confirm_button_info and "primary_selector" in confirm_button_info:
-                await self.browser_handler.click_element(confirm_button_info["primary_selector"])
+            # Handle confirmation dialog if one appeared (the wait also ends once the DOM settles)
+            await browser_handler.wait_for_ready("confirm_dialog", selector=DIALOG_SELECTOR, dom_quiet=True)
+            if await browser_handler.is_visible(DIALOG_SELECTOR):
+                await self.click_learned_element(
+                    browser_handler, saas_id, "confirm_dialog_button",
+                    "Find the confirm, yes, or ok button in the confirmation dialog"
+                )
 
             # Wait for the action to complete
-            await asyncio.sleep(3)
+            await browser_handler.wait_for_ready(
+                "user_removed",
+                table_selector=saas_config.user_table_selector,
+                previous_row_count=row_count,
+                response_future=response_future
+            )
 
             # Get page state after action
-            after_html = await self.browser_handler.extract_page_content()
+            after_html = await browser_handler.extract_page_content()
 
             # Validate if user was removed successfully
-            success = self.ai_agent.validate_action_success(
+            success = await self.ai_agent.validate_action_success(
                 before_html, 
                 after_html, 
                 f"Removing user {user_email}"
@@ -318,24 +662,113 @@ class SaaSAutomationOrchestrator:
             return success
 
         except Exception as e:
-            self.logger.error(f"Error in deprovision_user workflow: {str(e)}")
+            self.logger.error(f"Error in remove_user_on_users_page: {str(e)}")
             return False
 
+    async def run_batch(
+        self, action: str, saas_id: str, credentials: Dict[str, str], users: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Provision or deprovision many users with a single login, reusing the open users page.
+        action is "provision" or "deprovision". Returns one result entry per user.
+        """
+        results = []
+        if saas_id not in SAAS_CONFIGS:
+            self.logger.error(f"Unknown SaaS ID: {saas_id}")
+            return results
+
+        saas_config = SAAS_CONFIGS[saas_id]
+        self.logger.info(f"Starting batch {action} of {len(users)} users in {saas_config.name}")
+
+        async with self.browser_handler.borrow() as browser_handler:
+            login_success = await browser_handler.ensure_logged_in(
+                saas_id,
+                saas_config,
+                credentials.get("username", ""),
+                credentials.get("password", "")
+            )
+            if not login_success:
+                self.logger.error(f"Login failed for {saas_config.name}")
+
+            for user_details in users:
+                email = user_details.get("email", "")
+                started = time.perf_counter()
+                error = None
+                success = False
+                try:
+                    if not login_success:
+                        error = "login failed"
+                    elif not email:
+                        error = "missing email"
+                    # No-op when the previous user's steps left us on the users page
+                    elif not await browser_handler.navigate_to_users_page(saas_config):
+                        error = "failed to navigate to users page"
+                    elif action == "provision":
+                        success = await self.add_user_on_users_page(browser_handler, saas_id, user_details)
+                    else:
+                        success = await self.remove_user_on_users_page(browser_handler, saas_id, email)
+                except Exception as e:
+                    error = str(e)
+                    self.logger.error(f"Error in batch {action} for {email}: {error}")
+
+                results.append({
+                    "email": email,
+                    "action": action,
+                    "source_saas": saas_config.name,
+                    "success": success,
+                    "latency_seconds": round(time.perf_counter() - started, 2),
+                    "error": error or (None if success else f"{action} not confirmed")
+                })
+
+        succeeded = sum(1 for result in results if result["success"])
+        self.logger.info(f"Batch {action} finished: {succeeded}/{len(results)} succeeded")
+        return results
+
 async def main():
     """Main function to run the orchestrator"""
     parser = argparse.ArgumentParser(description="AI-Driven SaaS User Management")
-    parser.add_argument("--action", choices=["scrape", "provision", "deprovision"], 
+    parser.add_argument("--action", choices=["scrape", "scrape-all", "provision", "deprovision",
+                                             "provision-batch", "deprovision-batch"], 
                       required=True, help="Action to perform")
-    parser.add_argument("--saas", required=True, help="SaaS ID (e.g., 'dropbox', 'notion')")
-    parser.add_argument("--username", required=True, help="Admin username/email")
-    parser.add_argument("--password", required=True, help="Admin password")
+    parser.add_argument("--saas", nargs="+", help="SaaS ID(s) (e.g., 'dropbox', 'notion'); "
+                      "scrape-all defaults to every configured SaaS")
+    parser.add_argument("--username", help="Admin username/email")
+    parser.add_argument("--password", help="Admin password")
+    parser.add_argument("--credentials-file", help="JSON file mapping SaaS ID to "
+                      "{\"username\": ..., \"password\": ...} for multi-SaaS scrapes")
+    parser.add_argument("--max-concurrency", type=int, default=SETTINGS["max_concurrent_scrapes"],
+                      help="Maximum number of SaaS targets scraped at once")
     parser.add_argument("--user-email", help="User email for provision/deprovision actions")
     parser.add_argument("--user-name", help="User name for provisioning")
     parser.add_argument("--user-role", help="User role for provisioning")
+    parser.add_argument("--input", help="CSV or JSON file of users for provision-batch/deprovision-batch")
     parser.add_argument("--openai-key", required=True, help="OpenAI API Key")
 
     args = parser.parse_args()
 
+    saas_ids = args.saas or []
+    if args.action == "scrape-all" and not saas_ids:
+        saas_ids = list(SAAS_CONFIGS.keys())
+    if not saas_ids:
+        parser.error("--saas is required")
+    if args.action not in ("scrape", "scrape-all") and len(saas_ids) > 1:
+        parser.error(f"--action {args.action} takes a single --saas value")
+
+    file_credentials = {}
+    if args.credentials_file:
+        with open(args.credentials_file, 'r', encoding='utf-8') as f:
+            file_credentials = json.load(f)
+
+    targets = {}
+    for saas_id in saas_ids:
+        target_credentials = file_credentials.get(saas_id) or {
+            "username": args.username,
+            "password": args.password
+        }
+        if not target_credentials.get("username") or not target_credentials.get("password"):
+            parser.error(f"No credentials for {saas_id}: pass --username/--password or --credentials-file")
+        targets[saas_id] = target_credentials
+
     # Initialize orchestrator
     orchestrator = SaaSAutomationOrchestrator(openai_api_key=args.openai_key)
 
@@ -346,14 +779,34 @@ async def main():
             print("Failed to initialize browser. Exiting.")
             return
 
-        credentials = {
-            "username": args.username,
-            "password": args.password
-        }
+        saas_id = saas_ids[0]
+        credentials = targets[saas_id]
+
+        if args.action == "scrape-all" or (args.action == "scrape" and len(saas_ids) > 1):
+            # Scrape several SaaS portals concurrently
+            results = await orchestrator.scrape_many(targets, max_concurrency=args.max_concurrency)
+            all_users = []
+            print("Per-target results:")
+            for target_id, result in results.items():
+                status = "ok" if result["success"] else "FAILED"
+                print(f"  {target_id}: {len(result['users'])} users in {result['duration_seconds']}s [{status}]")
+                all_users.extend(result["users"])
+            if all_users:
+                report = orchestrator.data_processor.generate_report(all_users)
+                print("User Data Report:")
+                print(json.dumps(report, indent=2))
+                identities = orchestrator.data_processor.build_identity_index(
+                    all_users, domain_aliases=SETTINGS["domain_aliases"]
+                )
+                print(f"Cross-SaaS identities: {identities.get_stats()}")
+                print(f"Identities with an admin role anywhere: {len(identities.with_role('admin'))}")
+                print(f"Pipeline stages: {json.dumps(orchestrator.get_pipeline_stats())}")
+            else:
+                print("Failed to scrape users or no users found")
 
-        if args.action == "scrape":
+        elif args.action == "scrape":
             # Scrape users
-            users = await orchestrator.scrape_users(args.saas, credentials)
+            users = await orchestrator.scrape_users(saas_id, credentials)
             if users:
                 print(f"Successfully scraped {len(users)} users")
                 # Generate and print report
@@ -377,12 +830,33 @@ async def main():
             }
 
             # Provision user
-            success = await orchestrator.provision_user(args.saas, credentials, user_details)
+            success = await orchestrator.provision_user(saas_id, credentials, user_details)
             if success:
                 print(f"Successfully provisioned user: {args.user_email}")
             else:
                 print(f"Failed to provision user: {args.user_email}")
 
+        elif args.action in ("provision-batch", "deprovision-batch"):
+            # Check required args
+            if not args.input:
+                print(f"Error: --input is required for {args.action}")
+                return
+
+            batch_users = orchestrator.data_processor.load_user_requests(args.input)
+            if not batch_users:
+                print(f"No users found in {args.input}")
+                return
+
+            action = args.action.replace("-batch", "")
+            results = await orchestrator.run_batch(action, saas_id, credentials, batch_users)
+            report_path = orchestrator.data_processor.save_batch_report(
+                results, f"{saas_id}_{action}_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            )
+            succeeded = sum(1 for result in results if result["success"])
+            print(f"Batch {action}: {succeeded}/{len(results)} users succeeded")
+            if report_path:
+                print(f"Batch report saved: {report_path}")
+
         elif args.action == "deprovision":
             # Check required args
             if not args.user_email:
@@ -390,7 +864,7 @@ async def main():
                 return
 
             # Deprovision user
-            success = await orchestrator.deprovision_user(args.saas, credentials, args.user_email)
+            success = await orchestrator.deprovision_user(saas_id, credentials, args.user_email)
             if success:
                 print(f"Successfully deprovisioned user: {args.user_email}")
             else:
@@ -0,0 +1,142 @@
+"""
+Async staged pipeline
+Runs items from an async source through a chain of stages connected by bounded queues,
+so that different items can be in different stages at the same time (e.g. the browser
+fetching page 3 while page 2 is being extracted and page 1 persisted)
+"""
+import asyncio
+import time
+import logging
+from typing import Dict, List, Any, Optional, AsyncIterable, Awaitable, Callable, Tuple
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+
+class StageStats:
+    """Counters for one pipeline stage (shareable across pipeline runs on the same event loop)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.queue_depth = 0
+
+    def record(self, duration: float, success: bool = True):
+        self.busy_seconds += duration
+        if success:
+            self.processed += 1
+        else:
+            self.failed += 1
+
+    def observe_queue(self, depth: int):
+        self.queue_depth = depth
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            # Items per second of time actually spent working in the stage
+            "throughput_per_second": round(self.processed / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+
+class AsyncPipeline:
+    """
+    source -> stage 1 -> queue -> stage 2 -> ... -> stage N. Each stage is an async callable
+    taking one item and returning the item for the next stage (None drops it) and can run
+    several workers. Queues are bounded, so a slow stage applies backpressure to the source.
+    A failing item is logged, counted (see failed) and dropped without stopping the pipeline.
+    """
+
+    def __init__(self, name: str, queue_size: int = 4, stats: Optional[Dict[str, StageStats]] = None):
+        self.name = name
+        self.queue_size = queue_size
+        self.stages: List[Tuple[str, Callable[[Any], Awaitable[Any]], int]] = []
+        # Pass the same dict to several pipelines to aggregate their stats
+        self.stats = stats if stats is not None else {}
+        # Items dropped by a failing stage (or a failed source) during the last run
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+
+    def add_stage(self, name: str, func: Callable[[Any], Awaitable[Any]], workers: int = 1) -> "AsyncPipeline":
+        self.stages.append((name, func, max(1, workers)))
+        self.stats.setdefault(name, StageStats(name))
+        return self
+
+    def _stage_stats(self, name: str) -> StageStats:
+        return self.stats.setdefault(name, StageStats(name))
+
+    async def run(self, source: AsyncIterable[Any], source_name: str = "fetch") -> List[Any]:
+        """Drain the source through every stage; returns the non-None outputs of the last stage"""
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results: List[Any] = []
+        self.failed = 0
+
+        async def feed():
+            stats = self._stage_stats(source_name)
+            iterator = source.__aiter__()
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = await iterator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    stats.record(time.perf_counter() - started)
+                    await queues[0].put(item)
+                    self._stage_stats(self.stages[0][0]).observe_queue(queues[0].qsize())
+            except Exception as e:
+                stats.failed += 1
+                self.failed += 1
+                self.logger.error(f"Pipeline {self.name}: source failed: {str(e)}")
+            finally:
+                for _ in range(self.stages[0][2]):
+                    await queues[0].put(_DONE)
+
+        async def work(index: int):
+            name, func, _ = self.stages[index]
+            stats = self._stage_stats(name)
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            while True:
+                item = await inbox.get()
+                stats.observe_queue(inbox.qsize())
+                if item is _DONE:
+                    return
+                started = time.perf_counter()
+                try:
+                    output = await func(item)
+                    stats.record(time.perf_counter() - started)
+                except Exception as e:
+                    stats.record(time.perf_counter() - started, success=False)
+                    self.failed += 1
+                    self.logger.error(f"Pipeline {self.name}: stage '{name}' failed: {str(e)}")
+                    continue
+                if output is None:
+                    continue
+                if outbox is None:
+                    results.append(output)
+                else:
+                    await outbox.put(output)
+                    self._stage_stats(self.stages[index + 1][0]).observe_queue(outbox.qsize())
+
+        async def run_stage(index: int):
+            await asyncio.gather(*(work(index) for _ in range(self.stages[index][2])))
+            if index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1][2]):
+                    await queues[index + 1].put(_DONE)
+
+        if not self.stages:
+            return [item async for item in source]
+        await asyncio.gather(feed(), *(run_stage(index) for index in range(len(self.stages))))
+        return results
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
@@ -0,0 +1,256 @@
+"""
+Rate governor for OpenAI calls
+Token buckets for requests and tokens per minute shared by every AIAgent, a priority
+queue so interactive work is served ahead of bulk extraction, and retries of rate-limited
+(429) and transient failures that honor the retry-after header and pause all callers
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+import logging
+from typing import Dict, List, Any, Optional, Callable, Tuple, Type
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+# Status codes worth retrying (same set the OpenAI SDK retries)
+RETRYABLE_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+# How often a queued caller re-checks when it is waiting behind higher-priority callers
+QUEUE_POLL_SECONDS = 0.05
+
+
+class _TokenBucket:
+    """Holds up to capacity units, refilled continuously at capacity per minute"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (0 when it already is)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Return (positive) or charge (negative) units after the fact"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class OpenAIRateGovernor:
+    """
+    Admission control for OpenAI requests, safe to share between threads and event loops.
+    Callers wait in one priority queue (FIFO within a priority); the head is admitted once
+    both the request and the token bucket can cover it. A 0 limit disables that bucket.
+    Estimated tokens are reconciled with the usage reported in each response.
+    """
+
+    def __init__(
+        self, requests_per_minute: int = 0, tokens_per_minute: int = 0, chars_per_token: float = 4.0,
+        max_retries: int = 5, backoff_seconds: float = 1.0, max_backoff_seconds: float = 60.0,
+        retry_exceptions: Tuple[Type[BaseException], ...] = ()
+    ):
+        self.requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.chars_per_token = chars_per_token
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        # Exceptions without a status code that are still worth retrying (e.g. connection errors)
+        self.retry_exceptions = retry_exceptions
+        self.logger = logging.getLogger(__name__)
+        self.stats = {
+            "requests": 0, "rate_limited": 0, "retries": 0, "failures": 0,
+            "wait_seconds": 0.0, "estimated_tokens": 0, "used_tokens": 0
+        }
+        self._lock = threading.Lock()
+        self._waiting: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        # Set from retry-after on a 429; nobody is admitted before it
+        self._paused_until = 0.0
+
+    def estimate_tokens(self, request: Dict[str, Any]) -> int:
+        """Prompt tokens estimated from message/function text plus the completion budget"""
+        chars = sum(len(str(message.get("content") or "")) for message in request.get("messages", []))
+        chars += len(str(request.get("functions") or request.get("tools") or ""))
+        return int(chars / self.chars_per_token) + int(request.get("max_tokens") or 0)
+
+    # Admission
+
+    def _enqueue(self, priority: int) -> Tuple[int, int]:
+        ticket = (priority, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: Tuple[int, int]):
+        with self._lock:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+
+    def _try_admit(self, ticket: Tuple[int, int], tokens: int) -> float:
+        """Admit ticket and charge the buckets, or return how long to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            if self._waiting[0] != ticket:
+                return QUEUE_POLL_SECONDS
+            wait = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now) if self.requests else 0.0,
+                self.tokens.wait_time(tokens, now) if self.tokens else 0.0
+            )
+            if wait > 0:
+                return wait
+            heapq.heappop(self._waiting)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.stats["requests"] += 1
+            self.stats["estimated_tokens"] += tokens
+            return 0.0
+
+    def acquire(self, tokens: int, priority: int = PRIORITY_BULK):
+        """Block the calling thread until a request of this many tokens may be sent"""
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._try_admit(ticket, tokens)
+                if not wait:
+                    break
+                time.sleep(wait)
+        finally:
+            self._dequeue(ticket)
+            self._record_wait(time.monotonic() - started)
+
+    async def acquire_async(self, tokens: int, priority: int = PRIORITY_BULK):
+        """Wait (without blocking the event loop) until a request may be sent"""
+        started = time.monotonic()
+        ticket = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._try_admit(ticket, tokens)
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            self._dequeue(ticket)
+            self._record_wait(time.monotonic() - started)
+
+    def _record_wait(self, seconds: float):
+        with self._lock:
+            self.stats["wait_seconds"] += seconds
+
+    def record_usage(self, estimated: int, response: Any):
+        """Refund or charge the token bucket by the difference between estimate and actual usage"""
+        usage = getattr(response, "usage", None)
+        used = getattr(usage, "total_tokens", None)
+        if not isinstance(used, int):
+            return
+        with self._lock:
+            self.stats["used_tokens"] += used
+            if self.tokens:
+                self.tokens.adjust(estimated - used)
+
+    # Retries
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying error, or None if it should not be retried"""
+        status = getattr(error, "status_code", None)
+        if status not in RETRYABLE_STATUS_CODES and not isinstance(error, self.retry_exceptions):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        delay = self._retry_after(error)
+        if delay is None:
+            delay = min(self.backoff_seconds * 2 ** attempt, self.max_backoff_seconds)
+            delay *= 0.5 + random.random() / 2
+        if status == 429:
+            # Hold back every caller, not just this one, so the quota can recover
+            with self._lock:
+                self.stats["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self.logger.warning(f"OpenAI rate limit hit, pausing requests for {delay:.1f}s")
+        with self._lock:
+            self.stats["retries"] += 1
+        return delay
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if not headers:
+            return None
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            if headers.get("retry-after"):
+                return float(headers["retry-after"])
+        except (TypeError, ValueError):
+            return None
+        return None
+
+    def _give_up(self, error: Exception):
+        with self._lock:
+            self.stats["failures"] += 1
+        if getattr(error, "status_code", None) == 429:
+            self.logger.error(f"OpenAI rate limit still exceeded after {self.max_retries} retries")
+
+    def call(self, create: Callable[..., Any], request: Dict[str, Any], priority: int = PRIORITY_BULK) -> Any:
+        """create(**request) once admitted, retrying retryable failures"""
+        tokens = self.estimate_tokens(request)
+        for attempt in itertools.count():
+            self.acquire(tokens, priority)
+            try:
+                response = create(**request)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._give_up(e)
+                    raise
+                time.sleep(delay)
+                continue
+            self.record_usage(tokens, response)
+            return response
+
+    async def call_async(
+        self, create: Callable[..., Any], request: Dict[str, Any], priority: int = PRIORITY_BULK
+    ) -> Any:
+        """await create(**request) once admitted, retrying retryable failures"""
+        tokens = self.estimate_tokens(request)
+        for attempt in itertools.count():
+            await self.acquire_async(tokens, priority)
+            try:
+                response = await create(**request)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._give_up(e)
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.record_usage(tokens, response)
+            return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["queued"] = len(self._waiting)
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        return stats
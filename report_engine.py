@@ -0,0 +1,223 @@
+"""
+Report Engine for user data
+Computes group-by counts, cross-tabs, distinct counts and dormancy buckets over a
+dictionary-encoded (columnar) user batch, vectorized with NumPy when it is installed
+"""
+import re
+import logging
+from array import array
+from collections import Counter
+from datetime import datetime, timezone
+from operator import attrgetter
+from typing import Dict, List, Any, Optional, Tuple, Sequence, Iterable
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python fallback below
+    np = None
+
+# Label used for missing values in every breakdown
+UNKNOWN = "Unknown"
+
+# (max age in days, label); None means no upper bound
+DEFAULT_DORMANCY_BUCKETS: Tuple[Tuple[Optional[int], str], ...] = (
+    (7, "0-7d"),
+    (30, "8-30d"),
+    (90, "31-90d"),
+    (None, "90d+")
+)
+
+DORMANCY_FIELD = "dormancy"
+
+# Above this many possible group keys, counting switches from bincount to sorting
+MAX_BINCOUNT_KEYS = 1 << 24
+
+_RELATIVE_RE = re.compile(r"(\d+|an?|one)\s+(minute|hour|day|week|month|year)s?\s+ago")
+_UNIT_DAYS = {"minute": 1 / 1440, "hour": 1 / 24, "day": 1, "week": 7, "month": 30, "year": 365}
+_DATE_FORMATS = ("%b %d, %Y", "%B %d, %Y", "%d %b %Y", "%Y-%m-%d %H:%M", "%Y/%m/%d")
+
+
+class RecordColumns:
+    """
+    Read-only columnar view over a list of UserRecord-like objects for UserReportEngine.
+    Only the fields a report actually uses are pulled out (one map/attrgetter pass each)
+    and dictionary-encoded, instead of converting every record into a UserBatch first.
+    """
+
+    def __init__(self, records: Iterable[Any]):
+        self.records = records if isinstance(records, (list, tuple)) else list(records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def encoded(self, field: str) -> Tuple[array, List[Optional[str]]]:
+        column = list(map(attrgetter(field), self.records))
+        values = list(dict.fromkeys(column))
+        index = {value: code for code, value in enumerate(values)}
+        return array('I', map(index.__getitem__, column)), values
+
+    def distinct_values(self, field: str) -> set:
+        return set(map(attrgetter(field), self.records))
+
+
+class UserReportEngine:
+    """
+    Works on any batch exposing ``len()``, ``encoded(field) -> (codes, values)`` and
+    ``distinct_values(field)`` (see data_processor.UserBatch). Group keys are combined into
+    a single integer per record, so each group-by or cross-tab is one vectorized counting
+    pass over integer codes.
+    "dormancy" can be used like a field: it buckets records by last_login age.
+    """
+
+    def __init__(self, now: Optional[datetime] = None,
+                 dormancy_buckets: Sequence[Tuple[Optional[int], str]] = DEFAULT_DORMANCY_BUCKETS):
+        self.now = now or datetime.now()
+        self.dormancy_buckets = dormancy_buckets
+        self.logger = logging.getLogger(__name__)
+        self._columns: Dict[str, Tuple[Sequence[int], List[Optional[str]]]] = {}
+        self._distinct: Dict[str, int] = {}
+
+    def _column(self, batch, field: str) -> Tuple[Sequence[int], List[Optional[str]]]:
+        # Cached per engine so the same batch isn't re-encoded for every breakdown
+        if field not in self._columns:
+            if field == DORMANCY_FIELD:
+                self._columns[field] = self._dormancy_column(batch)
+            else:
+                self._columns[field] = batch.encoded(field)
+        return self._columns[field]
+
+    def group_counts(self, batch, fields: Sequence[str]) -> Dict[str, Any]:
+        """
+        Record counts for every combination of values of fields, nested in field order,
+        e.g. ["source_saas", "role"] -> {"Dropbox": {"Admin": 3, "Member": 40}, ...}
+        """
+        columns = [self._column(batch, field) for field in fields]
+        sizes = [max(len(values), 1) for _, values in columns]
+        key_space = 1
+        for size in sizes:
+            key_space *= size
+
+        if np is not None and key_space < 2 ** 62:
+            counts = self._count_numpy([codes for codes, _ in columns], sizes, key_space)
+        else:
+            counts = self._count_python([codes for codes, _ in columns])
+
+        result: Dict[str, Any] = {}
+        for key_codes, count in sorted(counts.items(), key=lambda item: -item[1]):
+            node = result
+            for depth, (code, (_, values)) in enumerate(zip(key_codes, columns)):
+                label = values[code] if values[code] not in (None, "") else UNKNOWN
+                if depth == len(columns) - 1:
+                    node[label] = node.get(label, 0) + count
+                else:
+                    node = node.setdefault(label, {})
+        return result
+
+    @staticmethod
+    def _count_numpy(code_arrays: List[Sequence[int]], sizes: List[int], key_space: int) -> Dict[tuple, int]:
+        keys = np.zeros(len(code_arrays[0]), dtype=np.int64)
+        for codes, size in zip(code_arrays, sizes):
+            keys *= size
+            keys += np.asarray(codes, dtype=np.int64)
+
+        if key_space <= MAX_BINCOUNT_KEYS:
+            bins = np.bincount(keys, minlength=0)
+            unique_keys = np.nonzero(bins)[0]
+            key_counts = bins[unique_keys]
+        else:
+            unique_keys, key_counts = np.unique(keys, return_counts=True)
+
+        counts = {}
+        for key, count in zip(unique_keys.tolist(), key_counts.tolist()):
+            key_codes = []
+            for size in reversed(sizes):
+                key, code = divmod(key, size)
+                key_codes.append(code)
+            counts[tuple(reversed(key_codes))] = count
+        return counts
+
+    @staticmethod
+    def _count_python(code_arrays: List[Sequence[int]]) -> Dict[tuple, int]:
+        # Counter's C fast path does the counting; zip builds the composite keys
+        if len(code_arrays) == 1:
+            return {(code,): count for code, count in Counter(code_arrays[0]).items()}
+        return dict(Counter(zip(*code_arrays)))
+
+    def distinct_count(self, batch, field: str) -> int:
+        """Number of distinct non-empty values of a field"""
+        if field not in self._distinct:
+            if field in self._columns:
+                values = set(self._columns[field][1])
+            else:
+                values = batch.distinct_values(field)
+            self._distinct[field] = len(values - {None, ""})
+        return self._distinct[field]
+
+    def _dormancy_column(self, batch) -> Tuple[Sequence[int], List[Optional[str]]]:
+        # Parse each distinct last_login once, then map record codes to bucket codes
+        codes, values = batch.encoded("last_login")
+        labels = [label for _, label in self.dormancy_buckets] + ["never", UNKNOWN]
+        label_codes = {label: index for index, label in enumerate(labels)}
+        value_to_bucket = [label_codes[self.dormancy_bucket(value)] for value in values]
+
+        if np is not None:
+            bucket_codes = np.asarray(value_to_bucket, dtype=np.int64)[np.asarray(codes, dtype=np.int64)]
+        else:
+            bucket_codes = [value_to_bucket[code] for code in codes]
+        return bucket_codes, labels
+
+    def dormancy_bucket(self, last_login: Optional[str]) -> str:
+        """Bucket label for a last_login value (ISO timestamps, common dates or "3 days ago")"""
+        age_days = self.age_in_days(last_login)
+        if age_days == "never":
+            return "never"
+        if age_days is None:
+            return UNKNOWN
+        for max_days, label in self.dormancy_buckets:
+            if max_days is None or age_days <= max_days:
+                return label
+        return self.dormancy_buckets[-1][1]
+
+    def age_in_days(self, last_login: Optional[str]) -> Any:
+        """Age in days, "never", or None when the value can't be interpreted"""
+        if not last_login:
+            return None
+        text = last_login.strip().lower()
+        if text in ("never", "n/a", "-", "never logged in", "not yet"):
+            return "never"
+        if text in ("just now", "today", "now", "online"):
+            return 0.0
+        if text == "yesterday":
+            return 1.0
+
+        match = _RELATIVE_RE.search(text)
+        if match:
+            amount = 1 if match.group(1) in ("a", "an", "one") else int(match.group(1))
+            return amount * _UNIT_DAYS[match.group(2)]
+
+        timestamp = self._parse_datetime(last_login.strip())
+        if timestamp is None:
+            return None
+        now = self.now
+        if timestamp.tzinfo is not None:
+            now = now.astimezone(timezone.utc) if now.tzinfo else now.astimezone().astimezone(timezone.utc)
+            timestamp = timestamp.astimezone(timezone.utc)
+        elif now.tzinfo is not None:
+            now = now.replace(tzinfo=None)
+        return max((now - timestamp).total_seconds() / 86400, 0.0)
+
+    @staticmethod
+    def _parse_datetime(value: str) -> Optional[datetime]:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            pass
+        for date_format in _DATE_FORMATS:
+            try:
+                return datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+        return None
@@ -0,0 +1,150 @@
+"""
+Learned Selector Store
+Remembers, per SaaS application and task, which CSS selectors actually worked so that
+later runs can skip the LLM. Entries carry success/failure counts and stale ones are demoted.
+"""
+import json
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+# Context values that are replaced by placeholders when a selector is stored
+TEMPLATE_KEYS = ("email",)
+
+
+class SelectorStore:
+    """
+    JSON-backed store of selectors keyed by saas_id and task
+    """
+
+    def __init__(self, filepath: str, max_failures: int = 3, min_score: float = 0.3):
+        self.filepath = filepath
+        # An entry is demoted (no longer offered) once it has failed max_failures times in
+        # a row, however often it worked before, or once it has failed max_failures times
+        # overall and its smoothed success rate drops below min_score
+        self.max_failures = max_failures
+        self.min_score = min_score
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.data: Dict[str, Dict[str, List[Dict[str, Any]]]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        try:
+            if os.path.exists(self.filepath):
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error loading selector store {self.filepath}: {str(e)}")
+        return {}
+
+    def save(self):
+        """Persist the store to disk"""
+        try:
+            directory = os.path.dirname(self.filepath)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._lock:
+                payload = json.dumps(self.data, indent=2, ensure_ascii=False)
+            tmp_path = f"{self.filepath}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.filepath)
+        except Exception as e:
+            self.logger.error(f"Error saving selector store: {str(e)}")
+
+    @staticmethod
+    def score(entry: Dict[str, Any]) -> float:
+        """Laplace-smoothed success rate of a selector"""
+        return (entry["successes"] + 1) / (entry["successes"] + entry["failures"] + 2)
+
+    def is_demoted(self, entry: Dict[str, Any]) -> bool:
+        if entry.get("consecutive_failures", 0) >= self.max_failures:
+            return True
+        return entry["failures"] >= self.max_failures and self.score(entry) < self.min_score
+
+    @staticmethod
+    def _to_template(selector: str, context: Optional[Dict[str, str]]) -> str:
+        # Store user-specific selectors (e.g. containing an email) as reusable templates
+        for key in TEMPLATE_KEYS:
+            value = (context or {}).get(key)
+            if value:
+                selector = selector.replace(value, "{" + key + "}")
+        return selector
+
+    @staticmethod
+    def _from_template(template: str, context: Optional[Dict[str, str]]) -> Optional[str]:
+        for key in TEMPLATE_KEYS:
+            placeholder = "{" + key + "}"
+            if placeholder in template:
+                value = (context or {}).get(key)
+                if not value:
+                    return None
+                template = template.replace(placeholder, value)
+        return template
+
+    def _entries(self, saas_id: str, task: str) -> List[Dict[str, Any]]:
+        return self.data.setdefault(saas_id, {}).setdefault(task, [])
+
+    def get_selectors(self, saas_id: str, task: str, context: Optional[Dict[str, str]] = None) -> List[str]:
+        """Stored selectors for a task, proven ones first (recent failures last), excluding demoted entries"""
+        with self._lock:
+            entries = [
+                entry for entry in self.data.get(saas_id, {}).get(task, [])
+                if not self.is_demoted(entry)
+            ]
+            entries.sort(
+                key=lambda entry: (-entry.get("consecutive_failures", 0), self.score(entry), entry["successes"]),
+                reverse=True
+            )
+            selectors = []
+            for entry in entries:
+                selector = self._from_template(entry["selector"], context)
+                if selector and selector not in selectors:
+                    selectors.append(selector)
+            return selectors
+
+    def _record(self, saas_id: str, task: str, selector: str, context: Optional[Dict[str, str]], success: bool):
+        template = self._to_template(selector, context)
+        with self._lock:
+            entries = self._entries(saas_id, task)
+            entry = next((e for e in entries if e["selector"] == template), None)
+            if entry is None:
+                entry = {"selector": template, "successes": 0, "failures": 0, "last_success": None}
+                entries.append(entry)
+            if success:
+                entry["successes"] += 1
+                entry["consecutive_failures"] = 0
+                entry["last_success"] = datetime.now().isoformat()
+            else:
+                entry["failures"] += 1
+                entry["consecutive_failures"] = entry.get("consecutive_failures", 0) + 1
+
+    def add_candidates(
+        self, saas_id: str, task: str, selectors: List[str], context: Optional[Dict[str, str]] = None
+    ):
+        """Remember untried selectors (e.g. the LLM's alternative_selectors) as fallbacks"""
+        with self._lock:
+            entries = self._entries(saas_id, task)
+            known = {e["selector"] for e in entries}
+            for selector in selectors:
+                template = self._to_template(selector, context)
+                if selector and template not in known:
+                    entries.append({"selector": template, "successes": 0, "failures": 0, "last_success": None})
+                    known.add(template)
+        self.save()
+
+    def record_success(self, saas_id: str, task: str, selector: str, context: Optional[Dict[str, str]] = None):
+        """Record that a selector worked for a task"""
+        self._record(saas_id, task, selector, context, success=True)
+        self.save()
+
+    def record_failure(self, saas_id: str, task: str, selector: str, context: Optional[Dict[str, str]] = None):
+        """Record that a selector failed for a task (only tracked for already-known selectors)"""
+        template = self._to_template(selector, context)
+        with self._lock:
+            known = any(e["selector"] == template for e in self.data.get(saas_id, {}).get(task, []))
+        if known:
+            self._record(saas_id, task, selector, context, success=False)
+            self.save()
@@ -0,0 +1,108 @@
+"""
+Encrypted store for authenticated browser sessions
+Persists Playwright storage_state per (saas_id, username) so later runs can skip login
+"""
+import hashlib
+import json
+import os
+import time
+import logging
+from typing import Dict, Any, Optional
+from cryptography.fernet import Fernet, InvalidToken
+
+
+class SessionStore:
+    """
+    Saves and restores Fernet-encrypted Playwright storage_state files
+    """
+
+    KEY_ENV_VAR = "SESSION_ENCRYPTION_KEY"
+
+    def __init__(self, session_dir: str, max_age_hours: float = 12, key_path: Optional[str] = None):
+        self.session_dir = session_dir
+        self.max_age_seconds = max_age_hours * 3600
+        # Fallback key file when KEY_ENV_VAR is unset; must live outside session_dir
+        self.key_path = os.path.abspath(os.path.expanduser(key_path)) if key_path else None
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(session_dir, exist_ok=True)
+        self.fernet = Fernet(self._load_key())
+
+    def _load_key(self) -> bytes:
+        """
+        Use the key from the environment, or a locally generated key file readable only by us.
+        The key file is never kept next to the ciphertexts it protects.
+        """
+        env_key = os.environ.get(self.KEY_ENV_VAR)
+        if env_key:
+            return env_key.encode("utf-8")
+
+        if not self.key_path:
+            raise ValueError(f"{self.KEY_ENV_VAR} is not set and no session key file is configured")
+        session_dir = os.path.abspath(self.session_dir)
+        if os.path.commonpath([session_dir, self.key_path]) == session_dir:
+            raise ValueError(f"Session key file {self.key_path} must not be inside {session_dir}")
+        self.logger.warning(
+            f"{self.KEY_ENV_VAR} is not set, using the session key file {self.key_path}; "
+            f"set the variable (e.g. from a secret manager) to keep the key off this disk"
+        )
+
+        key_path = self.key_path
+        if os.path.exists(key_path):
+            with open(key_path, 'rb') as f:
+                return f.read().strip()
+
+        os.makedirs(os.path.dirname(key_path), mode=0o700, exist_ok=True)
+        key = Fernet.generate_key()
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        self.logger.info(f"Generated new session encryption key: {key_path}")
+        return key
+
+    def _session_path(self, saas_id: str, username: str) -> str:
+        digest = hashlib.sha256(f"{saas_id}:{username}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.session_dir, f"{saas_id}_{digest}.session")
+
+    def load(self, saas_id: str, username: str) -> Optional[Dict[str, Any]]:
+        """Return the saved storage_state, or None if missing, expired or unreadable"""
+        path = self._session_path(saas_id, username)
+        try:
+            if not os.path.exists(path):
+                return None
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                self.logger.info(f"Saved session for {saas_id} is older than the max age, ignoring it")
+                self.delete(saas_id, username)
+                return None
+            with open(path, 'rb') as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except InvalidToken:
+            self.logger.warning(f"Saved session for {saas_id} could not be decrypted, ignoring it")
+            self.delete(saas_id, username)
+            return None
+        except Exception as e:
+            self.logger.error(f"Error loading session for {saas_id}: {str(e)}")
+            return None
+
+    def save(self, saas_id: str, username: str, storage_state: Dict[str, Any]) -> bool:
+        """Encrypt and persist a storage_state"""
+        path = self._session_path(saas_id, username)
+        try:
+            token = self.fernet.encrypt(json.dumps(storage_state).encode("utf-8"))
+            fd = os.open(f"{path}.tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(token)
+            os.replace(f"{path}.tmp", path)
+            self.logger.info(f"Saved session for {saas_id}")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving session for {saas_id}: {str(e)}")
+            return False
+
+    def delete(self, saas_id: str, username: str):
+        """Forget a saved session (e.g. after it expired on the vendor side)"""
+        path = self._session_path(saas_id, username)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            self.logger.error(f"Error deleting session for {saas_id}: {str(e)}")
@@ -0,0 +1,266 @@
+"""
+Snapshot Archive for user history
+Keeps every scrape of every SaaS source as a compressed base snapshot plus compressed
+deltas (re-based periodically), reconstructs the user list at any point in time and
+indexes per-user field changes so questions like "when did X gain admin" are a lookup
+"""
+import json
+import os
+import sqlite3
+import threading
+import zlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Union
+from data_processor import UserRecord
+from diff_engine import normalize_email
+
+# Per-record fields stored in the archive (extracted_at is the snapshot time)
+ARCHIVED_FIELDS = ("email", "name", "role", "last_login", "status")
+
+# Fields written to the change index; last_login changes daily and would only bloat it
+INDEXED_FIELDS = ("name", "role", "status")
+
+# Pseudo-field recording when a user appeared ("present") or disappeared ("absent")
+PRESENCE_FIELD = "_presence"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_saas TEXT NOT NULL,
+    taken_at TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    user_count INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS field_changes (
+    source_saas TEXT NOT NULL,
+    email_key TEXT NOT NULL,
+    field TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    taken_at TEXT NOT NULL,
+    entry_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archive_source_time ON archive_entries(source_saas, taken_at);
+CREATE INDEX IF NOT EXISTS idx_changes_user ON field_changes(email_key, field, taken_at);
+CREATE INDEX IF NOT EXISTS idx_changes_source ON field_changes(source_saas, taken_at);
+"""
+
+State = Dict[str, Tuple]
+
+
+def _compress(data: Any) -> bytes:
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _decompress(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def _timestamp(value: Union[str, datetime, None]) -> str:
+    if value is None:
+        return datetime.now().isoformat()
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class SnapshotArchive:
+    """
+    Time-series archive of user snapshots per SaaS source, safe to share between threads.
+    A base stores the full user list; each later run stores only added, removed and changed
+    users. A new base is written every rebase_every entries, or when a delta would be larger
+    than rebase_ratio times the base, so reconstruction never replays a long chain.
+    """
+
+    def __init__(self, db_path: str, rebase_every: int = 30, rebase_ratio: float = 0.5):
+        self.db_path = db_path
+        self.rebase_every = rebase_every
+        self.rebase_ratio = rebase_ratio
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # source_saas -> (deltas since base, base size in bytes, email_key -> archived values)
+        self._latest: Dict[str, Tuple[int, int, State]] = {}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def _state_from_records(records: Iterable[UserRecord]) -> State:
+        return {
+            normalize_email(record.email): tuple(getattr(record, name) for name in ARCHIVED_FIELDS)
+            for record in records
+        }
+
+    def append(
+        self, source_saas: str, records: Iterable[UserRecord], taken_at: Union[str, datetime, None] = None
+    ) -> int:
+        """Archive one scrape of a source (as a base or a delta). Returns the entry id."""
+        taken_at = _timestamp(taken_at)
+        state = self._state_from_records(records)
+        with self._lock:
+            deltas_since_base, base_size, previous = self._latest_state(source_saas)
+
+            delta = None if previous is None else self._delta(previous, state)
+            base_payload = None
+            if delta is not None and deltas_since_base < self.rebase_every:
+                payload = _compress(delta)
+                if len(payload) > self.rebase_ratio * base_size:
+                    base_payload = _compress(list(state.values()))
+            else:
+                base_payload = _compress(list(state.values()))
+
+            kind = "base" if base_payload is not None else "delta"
+            with self._conn:
+                entry_id = self._conn.execute(
+                    "INSERT INTO archive_entries (source_saas, taken_at, kind, user_count, payload) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (source_saas, taken_at, kind, len(state), base_payload if kind == "base" else payload)
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO field_changes (source_saas, email_key, field, old_value, new_value, taken_at, "
+                    "entry_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((source_saas, *change, taken_at, entry_id) for change in self._changes(previous or {}, state))
+                )
+
+            if kind == "base":
+                self._latest[source_saas] = (0, len(base_payload), state)
+            else:
+                self._latest[source_saas] = (deltas_since_base + 1, base_size, state)
+
+        self.logger.info(f"Archived {kind} #{entry_id} for {source_saas} ({len(state)} users)")
+        return entry_id
+
+    @staticmethod
+    def _delta(previous: State, current: State) -> Dict[str, Any]:
+        """Added users (full values), removed keys and changed fields (index -> new value)"""
+        added = [values for key, values in current.items() if key not in previous]
+        removed = [key for key in previous if key not in current]
+        changed = {}
+        for key, values in current.items():
+            old_values = previous.get(key)
+            if old_values is not None and old_values != values:
+                changed[key] = {
+                    str(index): value for index, (old, value) in enumerate(zip(old_values, values)) if old != value
+                }
+        return {"added": added, "removed": removed, "changed": changed}
+
+    @staticmethod
+    def _changes(previous: State, current: State) -> Iterable[Tuple[str, str, Optional[str], Optional[str]]]:
+        """(email_key, field, old, new) rows for the change index"""
+        indexes = [(name, ARCHIVED_FIELDS.index(name)) for name in INDEXED_FIELDS]
+        for key, values in current.items():
+            old_values = previous.get(key)
+            if old_values is None:
+                yield key, PRESENCE_FIELD, "absent", "present"
+            for name, index in indexes:
+                old = old_values[index] if old_values is not None else None
+                if old != values[index]:
+                    yield key, name, old, values[index]
+        for key in previous:
+            if key not in current:
+                yield key, PRESENCE_FIELD, "present", "absent"
+
+    def _latest_state(self, source_saas: str) -> Tuple[int, int, Optional[State]]:
+        if source_saas not in self._latest:
+            rows = self._conn.execute(
+                "SELECT id, kind, length(payload) FROM archive_entries WHERE source_saas = ? "
+                "AND id >= COALESCE((SELECT MAX(id) FROM archive_entries WHERE source_saas = ? "
+                "AND kind = 'base'), 0) ORDER BY id",
+                (source_saas, source_saas)
+            ).fetchall()
+            if not rows:
+                return 0, 0, None
+            state = self._replay(source_saas, rows[-1][0])
+            self._latest[source_saas] = (len(rows) - 1, rows[0][2], state)
+        return self._latest[source_saas]
+
+    def _replay(self, source_saas: str, until_id: int) -> State:
+        """State after entry until_id: its latest base plus the deltas that follow it"""
+        base = self._conn.execute(
+            "SELECT id, payload FROM archive_entries WHERE source_saas = ? AND kind = 'base' AND id <= ? "
+            "ORDER BY id DESC LIMIT 1",
+            (source_saas, until_id)
+        ).fetchone()
+        if base is None:
+            return {}
+        state = {normalize_email(values[0]): tuple(values) for values in _decompress(base[1])}
+        deltas = self._conn.execute(
+            "SELECT payload FROM archive_entries WHERE source_saas = ? AND kind = 'delta' AND id > ? AND id <= ? "
+            "ORDER BY id",
+            (source_saas, base[0], until_id)
+        ).fetchall()
+        for (payload,) in deltas:
+            delta = _decompress(payload)
+            for key in delta["removed"]:
+                state.pop(key, None)
+            for values in delta["added"]:
+                state[normalize_email(values[0])] = tuple(values)
+            for key, changes in delta["changed"].items():
+                values = list(state[key])
+                for index, value in changes.items():
+                    values[int(index)] = value
+                state[key] = tuple(values)
+        return state
+
+    def users_at(self, source_saas: str, at: Union[str, datetime, None] = None) -> List[UserRecord]:
+        """User list of a source as of a point in time (latest snapshot taken at or before it)"""
+        at = _timestamp(at)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, taken_at FROM archive_entries WHERE source_saas = ? AND taken_at <= ? "
+                "ORDER BY taken_at DESC, id DESC LIMIT 1",
+                (source_saas, at)
+            ).fetchone()
+            if row is None:
+                return []
+            state = self._replay(source_saas, row[0])
+        return [
+            UserRecord.compact(**dict(zip(ARCHIVED_FIELDS, values)), extracted_at=row[1], source_saas=source_saas)
+            for values in state.values()
+        ]
+
+    def field_history(
+        self, email: str, field: str, source_saas: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Every recorded change of one field (or PRESENCE_FIELD) for a user, oldest first"""
+        sql = ("SELECT source_saas, old_value, new_value, taken_at FROM field_changes "
+               "WHERE email_key = ? AND field = ?")
+        params: List[Any] = [normalize_email(email), field]
+        if source_saas is not None:
+            sql += " AND source_saas = ?"
+            params.append(source_saas)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY taken_at", params).fetchall()
+        return [{"source_saas": row[0], "old": row[1], "new": row[2], "taken_at": row[3]} for row in rows]
+
+    def when_gained(
+        self, email: str, field: str, value: str, source_saas: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Changes where a user's field started to contain value (case-insensitive), e.g.
+        when_gained("jane@acme.com", "role", "admin")
+        """
+        needle = value.lower()
+        return [
+            change for change in self.field_history(email, field, source_saas)
+            if needle in (change["new"] or "").lower() and needle not in (change["old"] or "").lower()
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(length(payload)), 0) FROM archive_entries GROUP BY kind"
+            ).fetchall()
+        return {f"{kind}_entries": count for kind, count, _ in rows} | {
+            "archived_bytes": sum(size for _, _, size in rows)
+        }
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
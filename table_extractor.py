@@ -0,0 +1,227 @@
+"""
+Deterministic Table Extractor for admin portal member lists
+Parses header-plus-rows tables (HTML tables and ARIA grids) locally and maps
+columns to UserRecord fields, so the LLM is only needed for unusual layouts
+"""
+import re
+import logging
+from html.parser import HTMLParser
+from typing import Dict, List, Any, Optional, Tuple
+
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+'-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+# Header keywords per field, checked in order so that e.g. "Last active" maps to
+# last_login before "active" could be mistaken for a status column
+HEADER_KEYWORDS = [
+    ("email", ["email", "e-mail", "mail"]),
+    ("last_login", ["last login", "last active", "last seen", "last activity", "last sign", "last access", "last used"]),
+    ("status", ["status", "state"]),
+    ("role", ["role", "permission", "access", "type", "admin", "seat"]),
+    ("name", ["name", "member", "user", "person"]),
+]
+
+TABLE_ROLES = {"table", "grid", "treegrid"}
+ROW_ROLES = {"row"}
+CELL_ROLES = {"cell", "gridcell", "columnheader", "rowheader"}
+HEADER_CELL_TAGS = {"th"}
+HEADER_CELL_ROLES = {"columnheader"}
+
+
+def map_header_to_field(header: str) -> Optional[str]:
+    """Map a column header to a UserRecord field name"""
+    normalized = " ".join(header.lower().replace("_", " ").split())
+    if not normalized:
+        return None
+    for field, keywords in HEADER_KEYWORDS:
+        if any(keyword in normalized for keyword in keywords):
+            return field
+    return None
+
+
+class _TableParser(HTMLParser):
+    """Collects the rows/cells of every table or ARIA grid in a document"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables: List[Dict[str, Any]] = []
+        self.stack: List[Tuple[str, Optional[str]]] = []
+        self.open_tables: List[Dict[str, Any]] = []
+        self.current_row: Optional[Dict[str, Any]] = None
+        self.current_cell: Optional[Dict[str, Any]] = None
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        role = (attributes.get("role") or "").lower()
+        kind = None
+
+        if tag == "table" or role in TABLE_ROLES:
+            kind = "table"
+            table = {"rows": []}
+            self.tables.append(table)
+            self.open_tables.append(table)
+        elif (tag == "tr" or role in ROW_ROLES) and self.open_tables:
+            kind = "row"
+            self.current_row = {"cells": [], "is_header": False}
+            self.open_tables[-1]["rows"].append(self.current_row)
+        elif (tag in ("td", "th") or role in CELL_ROLES) and self.current_row is not None:
+            kind = "cell"
+            self.current_cell = {"text": [], "is_header": tag in HEADER_CELL_TAGS or role in HEADER_CELL_ROLES}
+            self.current_row["cells"].append(self.current_cell)
+
+        if tag not in ("br", "hr", "img", "input", "meta", "link", "wbr", "col", "area", "source"):
+            self.stack.append((tag, kind))
+
+    def handle_endtag(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        while self.stack:
+            open_tag, kind = self.stack.pop()
+            if kind == "cell":
+                self.current_cell = None
+            elif kind == "row":
+                self.current_row = None
+            elif kind == "table":
+                self.open_tables.pop()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.current_cell is not None:
+            self.current_cell["text"].append(data)
+
+
+class TableExtractor:
+    """
+    LLM-free fast path for extracting users from header-plus-rows tables
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def extract(self, html_content: str) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Extract users from the best-scoring table in the HTML.
+        Returns the users and a confidence score between 0 and 1.
+        """
+        try:
+            parser = _TableParser()
+            parser.feed(html_content)
+            parser.close()
+
+            best_users: List[Dict[str, Any]] = []
+            best_confidence = 0.0
+            for table in parser.tables:
+                users, confidence = self.extract_from_rows(self._table_rows(table))
+                if confidence > best_confidence:
+                    best_users, best_confidence = users, confidence
+
+            self.logger.info(
+                f"Table extractor found {len(best_users)} users in {len(parser.tables)} tables "
+                f"(confidence {best_confidence:.2f})"
+            )
+            return best_users, best_confidence
+
+        except Exception as e:
+            self.logger.error(f"Error in table extraction: {str(e)}")
+            return [], 0.0
+
+    @staticmethod
+    def _table_rows(table: Dict[str, Any]) -> List[Tuple[List[str], bool]]:
+        rows = []
+        for row in table["rows"]:
+            cells = [" ".join("".join(cell["text"]).split()) for cell in row["cells"]]
+            if not any(cells):
+                continue
+            is_header = bool(row["cells"]) and all(cell["is_header"] for cell in row["cells"])
+            rows.append((cells, is_header))
+        return rows
+
+    def extract_from_rows(self, rows: List[Tuple[List[str], bool]]) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Map a list of (cells, is_header) rows to user dicts and score the result
+        """
+        if not rows:
+            return [], 0.0
+
+        # Use the first explicit header row, or the first row if its cells look like headers
+        header_index = next((i for i, (_, is_header) in enumerate(rows) if is_header), None)
+        if header_index is None:
+            first_cells = rows[0][0]
+            if sum(1 for cell in first_cells if map_header_to_field(cell)) >= 2:
+                header_index = 0
+
+        column_fields: Dict[int, str] = {}
+        if header_index is not None:
+            for index, header in enumerate(rows[header_index][0]):
+                field = map_header_to_field(header)
+                if field and field not in column_fields.values():
+                    column_fields[index] = field
+            data_rows = [cells for i, (cells, is_header) in enumerate(rows) if i != header_index and not is_header]
+        else:
+            data_rows = [cells for cells, _ in rows]
+
+        if not data_rows:
+            return [], 0.0
+
+        email_from_header = "email" in column_fields.values()
+        if not email_from_header:
+            email_column = self._detect_email_column(data_rows)
+            if email_column is not None and email_column not in column_fields:
+                column_fields[email_column] = "email"
+
+        users = []
+        for cells in data_rows:
+            user = self._map_row(cells, column_fields)
+            if user:
+                users.append(user)
+
+        mapped_fields = set(column_fields.values())
+        if users:
+            # Emails pulled out of combined cells still count as a mapped field
+            mapped_fields.add("email")
+        email_coverage = len(users) / len(data_rows)
+        confidence = (
+            0.6 * email_coverage
+            + 0.1 * (1.0 if email_from_header else 0.0)
+            + 0.3 * (len(mapped_fields) / len(HEADER_KEYWORDS))
+        )
+        return users, round(confidence, 3)
+
+    @staticmethod
+    def _detect_email_column(data_rows: List[List[str]]) -> Optional[int]:
+        counts: Dict[int, int] = {}
+        for cells in data_rows:
+            for index, cell in enumerate(cells):
+                if EMAIL_RE.search(cell):
+                    counts[index] = counts.get(index, 0) + 1
+        if not counts:
+            return None
+        column, count = max(counts.items(), key=lambda item: item[1])
+        return column if count >= len(data_rows) / 2 else None
+
+    @staticmethod
+    def _map_row(cells: List[str], column_fields: Dict[int, str]) -> Optional[Dict[str, Any]]:
+        user: Dict[str, Any] = {}
+        for index, field in column_fields.items():
+            if index < len(cells) and cells[index]:
+                user[field] = cells[index]
+
+        # Cells often combine name and email ("Jane Doe jane@acme.com")
+        email_match = EMAIL_RE.search(user.get("email", ""))
+        if not email_match:
+            for cell in cells:
+                email_match = EMAIL_RE.search(cell)
+                if email_match:
+                    break
+        if not email_match:
+            return None
+
+        email = email_match.group(0)
+        user["email"] = email
+        if "name" in user and email in user["name"]:
+            name = " ".join(user["name"].replace(email, " ").split())
+            if name:
+                user["name"] = name
+            else:
+                del user["name"]
+        return user
@@ -0,0 +1,126 @@
+"""
+Tests for the OpenAI rate governor (run with: python -m pytest test_rate_limiter.py)
+"""
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+
+from rate_limiter import OpenAIRateGovernor, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+class FakeStatusError(Exception):
+    """Stand-in for openai.APIStatusError: status_code plus a response with headers"""
+
+    def __init__(self, status_code: int, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+def fake_response(total_tokens: int = 10):
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+class RateGovernorRetryTest(unittest.TestCase):
+    def test_429_is_retried_after_retry_after_and_pauses_other_callers(self):
+        governor = OpenAIRateGovernor(max_retries=3)
+        calls = []
+
+        async def create(**request):
+            calls.append((request["tag"], time.monotonic()))
+            if request["tag"] == "first" and len(calls) == 1:
+                raise FakeStatusError(429, {"retry-after": "0.3"})
+            return fake_response()
+
+        async def scenario():
+            started = time.monotonic()
+            first = asyncio.create_task(governor.call_async(create, {"tag": "first", "messages": []}))
+            await asyncio.sleep(0.05)
+            # Issued while the 429 pause is in effect, so it must wait for it too
+            second = asyncio.create_task(governor.call_async(create, {"tag": "second", "messages": []}))
+            await asyncio.gather(first, second)
+            return started
+
+        started = asyncio.run(scenario())
+
+        self.assertEqual([tag for tag, _ in calls], ["first", "second", "first"])
+        self.assertGreaterEqual(calls[1][1] - started, 0.29)
+        self.assertGreaterEqual(calls[2][1] - started, 0.29)
+        stats = governor.get_stats()
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertEqual(stats["retries"], 1)
+        self.assertEqual(stats["failures"], 0)
+
+    def test_429_gives_up_after_max_retries(self):
+        governor = OpenAIRateGovernor(max_retries=2)
+        attempts = []
+
+        def create(**request):
+            attempts.append(request)
+            raise FakeStatusError(429, {"retry-after-ms": "10"})
+
+        with self.assertRaises(FakeStatusError):
+            governor.call(create, {"messages": []})
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(governor.get_stats()["failures"], 1)
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        governor = OpenAIRateGovernor(max_retries=3)
+        attempts = []
+
+        def create(**request):
+            attempts.append(request)
+            raise FakeStatusError(400)
+
+        with self.assertRaises(FakeStatusError):
+            governor.call(create, {"messages": []})
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(governor.get_stats()["retries"], 0)
+
+
+class RateGovernorAdmissionTest(unittest.TestCase):
+    def test_interactive_caller_is_admitted_ahead_of_queued_bulk_callers(self):
+        # 20 requests per second, starting with an empty bucket so every caller has to queue
+        governor = OpenAIRateGovernor(requests_per_minute=1200)
+        governor.requests.level = 0
+        order = []
+
+        async def create(**request):
+            order.append(request["tag"])
+            return fake_response()
+
+        async def scenario():
+            bulk = [
+                asyncio.create_task(governor.call_async(create, {"tag": f"bulk-{i}", "messages": []}, PRIORITY_BULK))
+                for i in range(3)
+            ]
+            await asyncio.sleep(0.01)
+            interactive = asyncio.create_task(
+                governor.call_async(create, {"tag": "interactive", "messages": []}, PRIORITY_INTERACTIVE)
+            )
+            await asyncio.gather(*bulk, interactive)
+
+        asyncio.run(scenario())
+
+        self.assertEqual(order, ["interactive", "bulk-0", "bulk-1", "bulk-2"])
+
+    def test_token_bucket_limits_throughput_and_refunds_unused_tokens(self):
+        # 100 tokens per second; each request is estimated at 50 tokens (200 chars / 4)
+        governor = OpenAIRateGovernor(tokens_per_minute=6000)
+        governor.tokens.level = 0
+        request = {"messages": [{"content": "x" * 200}]}
+        self.assertEqual(governor.estimate_tokens(request), 50)
+
+        started = time.monotonic()
+        for _ in range(2):
+            governor.call(lambda **kwargs: fake_response(total_tokens=50), request)
+        self.assertGreaterEqual(time.monotonic() - started, 0.95)
+
+        level = governor.tokens.level
+        governor.record_usage(50, fake_response(total_tokens=10))
+        self.assertAlmostEqual(governor.tokens.level - level, 40, delta=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,255 @@
+"""
+SQLite-backed store of scraped users
+Keeps every SaaS source, every scrape snapshot and the current users per source in one
+indexed database (WAL mode), so lookups such as "which SaaS apps can this email access"
+don't require loading every exported JSON/CSV file
+"""
+import json
+import os
+import sqlite3
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from data_processor import UserRecord, USER_FIELDNAMES
+from diff_engine import normalize_email, record_fingerprint
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source_saas TEXT PRIMARY KEY,
+    saas_id TEXT,
+    first_scraped_at TEXT NOT NULL,
+    last_scraped_at TEXT NOT NULL,
+    last_snapshot_id INTEGER,
+    user_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_saas TEXT NOT NULL REFERENCES sources(source_saas),
+    taken_at TEXT NOT NULL,
+    user_count INTEGER NOT NULL,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    source_saas TEXT NOT NULL,
+    email_key TEXT NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT,
+    role TEXT,
+    last_login TEXT,
+    status TEXT,
+    extracted_at TEXT,
+    first_seen_at TEXT NOT NULL,
+    last_snapshot_id INTEGER NOT NULL,
+    fingerprint INTEGER,
+    PRIMARY KEY (source_saas, email_key)
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email_key);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE INDEX IF NOT EXISTS idx_users_status ON users(status);
+CREATE INDEX IF NOT EXISTS idx_users_snapshot ON users(source_saas, last_snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_snapshots_source ON snapshots(source_saas, taken_at);
+"""
+
+UPSERT_USER_SQL = """
+INSERT INTO users (source_saas, email_key, email, name, role, last_login, status, extracted_at,
+                   first_seen_at, last_snapshot_id, fingerprint)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(source_saas, email_key) DO UPDATE SET
+    email = excluded.email,
+    name = excluded.name,
+    role = excluded.role,
+    last_login = excluded.last_login,
+    status = excluded.status,
+    extracted_at = excluded.extracted_at,
+    last_snapshot_id = excluded.last_snapshot_id,
+    fingerprint = excluded.fingerprint
+"""
+
+# Users that are in the latest snapshot of their source (i.e. currently present)
+CURRENT_USERS_SQL = (
+    "SELECT u.email, u.name, u.role, u.last_login, u.status, u.extracted_at, u.source_saas "
+    "FROM users u JOIN sources s ON s.source_saas = u.source_saas "
+    "AND u.last_snapshot_id = s.last_snapshot_id"
+)
+
+
+class UserStore:
+    """
+    Embedded database of users per SaaS source, safe to share between threads.
+    Users absent from a source's latest snapshot are kept (with their last snapshot id)
+    but no longer count as current.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+        if "fingerprint" not in columns:
+            # Stores created before fingerprints existed; NULL fingerprints are computed on read
+            self._conn.execute("ALTER TABLE users ADD COLUMN fingerprint INTEGER")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_email(email: str) -> str:
+        return normalize_email(email)
+
+    def save_snapshot(
+        self, users: List[UserRecord], source_saas: str, saas_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Record a scrape of one SaaS source: add a snapshot and bulk-upsert its users
+        in a single transaction. Returns the snapshot id.
+        """
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sources (source_saas, saas_id, first_scraped_at, last_scraped_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT(source_saas) DO UPDATE SET "
+                "saas_id = COALESCE(excluded.saas_id, saas_id), last_scraped_at = excluded.last_scraped_at",
+                (source_saas, saas_id, now, now)
+            )
+            snapshot_id = self._conn.execute(
+                "INSERT INTO snapshots (source_saas, taken_at, user_count, metadata) VALUES (?, ?, ?, ?)",
+                (source_saas, now, len(users), json.dumps(metadata or {}, ensure_ascii=False, default=str))
+            ).lastrowid
+            self._conn.executemany(UPSERT_USER_SQL, (
+                (source_saas, self.normalize_email(user.email), user.email, user.name, user.role,
+                 user.last_login, user.status, user.extracted_at, now, snapshot_id, record_fingerprint(user))
+                for user in users
+            ))
+            self._conn.execute(
+                "UPDATE sources SET last_snapshot_id = ?, user_count = "
+                "(SELECT COUNT(*) FROM users WHERE source_saas = ? AND last_snapshot_id = ?) "
+                "WHERE source_saas = ?",
+                (snapshot_id, source_saas, snapshot_id, source_saas)
+            )
+        self.logger.info(f"Stored snapshot {snapshot_id} with {len(users)} users for {source_saas}")
+        return snapshot_id
+
+    @staticmethod
+    def _to_record(row: tuple) -> UserRecord:
+        return UserRecord(**dict(zip(USER_FIELDNAMES, row)))
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def saas_for_email(self, email: str) -> List[str]:
+        """SaaS sources where this email is currently a user"""
+        rows = self._query(
+            "SELECT u.source_saas FROM users u JOIN sources s ON s.source_saas = u.source_saas "
+            "AND u.last_snapshot_id = s.last_snapshot_id WHERE u.email_key = ? ORDER BY u.source_saas",
+            (self.normalize_email(email),)
+        )
+        return [row[0] for row in rows]
+
+    def get_user(self, email: str, source_saas: str) -> Optional[UserRecord]:
+        """Latest known record for an email in one source (current or not)"""
+        rows = self._query(
+            "SELECT email, name, role, last_login, status, extracted_at, source_saas FROM users "
+            "WHERE source_saas = ? AND email_key = ?",
+            (source_saas, self.normalize_email(email))
+        )
+        return self._to_record(rows[0]) if rows else None
+
+    def find_users(
+        self, source_saas: Optional[str] = None, role: Optional[str] = None,
+        status: Optional[str] = None, include_removed: bool = False
+    ) -> List[UserRecord]:
+        """Users filtered by source, role and/or status (current users unless include_removed)"""
+        if include_removed:
+            sql = ("SELECT u.email, u.name, u.role, u.last_login, u.status, u.extracted_at, u.source_saas "
+                   "FROM users u")
+        else:
+            sql = CURRENT_USERS_SQL
+        conditions, params = [], []
+        for column, value in (("source_saas", source_saas), ("role", role), ("status", status)):
+            if value is not None:
+                conditions.append(f"u.{column} = ?")
+                params.append(value)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY u.source_saas, u.email_key"
+        return [self._to_record(row) for row in self._query(sql, tuple(params))]
+
+    def fingerprints(self, source_saas: str) -> Dict[str, int]:
+        """email_key -> fingerprint of the current users of a source"""
+        current = (
+            "FROM users u JOIN sources s ON s.source_saas = u.source_saas "
+            "AND u.last_snapshot_id = s.last_snapshot_id WHERE u.source_saas = ? "
+        )
+        rows = self._query(
+            f"SELECT u.email_key, u.fingerprint {current} AND u.fingerprint IS NOT NULL", (source_saas,)
+        )
+        fingerprints = dict(rows)
+        # Rows written before fingerprints existed
+        legacy_rows = self._query(
+            "SELECT u.email_key, u.email, u.name, u.role, u.last_login, u.status, u.extracted_at, u.source_saas "
+            f"{current} AND u.fingerprint IS NULL", (source_saas,)
+        )
+        for row in legacy_rows:
+            fingerprints[row[0]] = record_fingerprint(self._to_record(row[1:]))
+        return fingerprints
+
+    def get_users_by_keys(self, source_saas: str, email_keys: List[str]) -> Dict[str, UserRecord]:
+        """Stored records of a source for the given normalized emails, keyed by email_key"""
+        records = {}
+        for start in range(0, len(email_keys), 500):
+            chunk = email_keys[start:start + 500]
+            rows = self._query(
+                "SELECT email_key, email, name, role, last_login, status, extracted_at, source_saas FROM users "
+                f"WHERE source_saas = ? AND email_key IN ({','.join('?' * len(chunk))})",
+                (source_saas, *chunk)
+            )
+            for row in rows:
+                records[row[0]] = self._to_record(row[1:])
+        return records
+
+    def list_sources(self) -> List[Dict[str, Any]]:
+        """Known SaaS sources with their last scrape time and current user count"""
+        rows = self._query(
+            "SELECT source_saas, saas_id, first_scraped_at, last_scraped_at, last_snapshot_id, user_count "
+            "FROM sources ORDER BY source_saas"
+        )
+        keys = ("source_saas", "saas_id", "first_scraped_at", "last_scraped_at", "last_snapshot_id", "user_count")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def latest_snapshot_id(self, source_saas: str) -> Optional[int]:
+        """Id of the most recent snapshot of a source, or None if it was never scraped"""
+        rows = self._query("SELECT last_snapshot_id FROM sources WHERE source_saas = ?", (source_saas,))
+        return rows[0][0] if rows else None
+
+    def list_snapshots(self, source_saas: str) -> List[Dict[str, Any]]:
+        """Snapshots of one source, newest first"""
+        rows = self._query(
+            "SELECT id, taken_at, user_count, metadata FROM snapshots WHERE source_saas = ? "
+            "ORDER BY id DESC",
+            (source_saas,)
+        )
+        return [
+            {"id": row[0], "taken_at": row[1], "user_count": row[2], "metadata": json.loads(row[3] or "{}")}
+            for row in rows
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (users,) = self._conn.execute("SELECT COUNT(*) FROM users").fetchone()
+            (sources,) = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()
+            (snapshots,) = self._conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()
+        return {"users": users, "sources": sources, "snapshots": snapshots}
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()